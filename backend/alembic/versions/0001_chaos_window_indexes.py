@@ -0,0 +1,172 @@
+"""baseline schema and chaos window indexes
+
+Creates the tables as they were before Alembic was introduced (users, tasks,
+ideas, journal_entries, ai_conversations, chaos_metrics), so
+`alembic upgrade head` works on an empty database, then adds composite
+(user_id, <timestamp>) indexes for the chaos detection windows and a partial
+index for open MITs. Startup Base.metadata.create_all may already have built
+the tables, so everything here, and in every later revision, is created
+idempotently.
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-16 21:00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision = '0001'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+WINDOW_INDEXES = [
+    ("ix_tasks_user_id_created_at", "tasks", ["user_id", "created_at"]),
+    ("ix_tasks_user_id_updated_at", "tasks", ["user_id", "updated_at"]),
+    ("ix_tasks_user_id_completed_at", "tasks", ["user_id", "completed_at"]),
+    ("ix_ideas_user_id_created_at", "ideas", ["user_id", "created_at"]),
+    ("ix_ideas_user_id_updated_at", "ideas", ["user_id", "updated_at"]),
+]
+
+
+ENUMS = {
+    "taskstatus": ("NOT_STARTED", "DOING", "DONE", "BLOCKED", "PAUSED"),
+    "ideastatus": ("ACTIVE", "DORMANT", "ARCHIVED"),
+    "chaoslevel": ("FOCUSED", "SCATTERED", "SPINNING"),
+}
+
+
+def _enum(name):
+    if op.get_bind().dialect.name == "postgresql":
+        enum = postgresql.ENUM(*ENUMS[name], name=name, create_type=False)
+        enum.create(op.get_bind(), checkfirst=True)
+        return enum
+    return sa.Enum(*ENUMS[name], name=name)
+
+
+def _id():
+    return sa.Column("id", postgresql.UUID(as_uuid=True), primary_key=True)
+
+
+def _user_id():
+    return sa.Column("user_id", postgresql.UUID(as_uuid=True), sa.ForeignKey("users.id"), nullable=False)
+
+
+def _created_at():
+    return sa.Column("created_at", sa.DateTime(timezone=True), server_default=sa.func.now())
+
+
+def create_baseline_schema():
+    op.create_table(
+        "users",
+        _id(),
+        sa.Column("username", sa.String(50), nullable=False),
+        sa.Column("email", sa.String(100), nullable=False),
+        sa.Column("hashed_password", sa.String(100), nullable=False),
+        sa.Column("is_active", sa.Boolean()),
+        _created_at(),
+        if_not_exists=True,
+    )
+    op.create_index("ix_users_username", "users", ["username"], unique=True, if_not_exists=True)
+    op.create_index("ix_users_email", "users", ["email"], unique=True, if_not_exists=True)
+    op.create_table(
+        "tasks",
+        _id(),
+        sa.Column("title", sa.String(200), nullable=False),
+        sa.Column("description", sa.Text()),
+        sa.Column("status", _enum("taskstatus")),
+        sa.Column("priority", sa.Integer()),
+        sa.Column("is_mit", sa.Boolean()),
+        sa.Column("project", sa.String(100)),
+        sa.Column("tags", sa.JSON()),
+        sa.Column("estimated_minutes", sa.Integer()),
+        sa.Column("actual_minutes", sa.Integer()),
+        sa.Column("due_date", sa.DateTime(timezone=True)),
+        sa.Column("completed_at", sa.DateTime(timezone=True)),
+        _created_at(),
+        sa.Column("updated_at", sa.DateTime(timezone=True)),
+        _user_id(),
+        if_not_exists=True,
+    )
+    op.create_table(
+        "ideas",
+        _id(),
+        sa.Column("title", sa.String(200), nullable=False),
+        sa.Column("description", sa.Text()),
+        sa.Column("status", _enum("ideastatus")),
+        sa.Column("category", sa.String(50)),
+        sa.Column("tags", sa.JSON()),
+        sa.Column("ai_enriched", sa.Boolean()),
+        sa.Column("ai_enrichment_data", sa.JSON()),
+        sa.Column("origin", sa.String(100)),
+        sa.Column("next_step", sa.Text()),
+        _created_at(),
+        sa.Column("updated_at", sa.DateTime(timezone=True)),
+        _user_id(),
+        if_not_exists=True,
+    )
+    op.create_table(
+        "journal_entries",
+        _id(),
+        sa.Column("content", sa.Text(), nullable=False),
+        sa.Column("prompt", sa.String(200)),
+        sa.Column("mood", sa.String(20)),
+        sa.Column("focus_level", sa.Integer()),
+        sa.Column("roadblocks", sa.Text()),
+        sa.Column("project_tags", sa.JSON()),
+        _created_at(),
+        _user_id(),
+        if_not_exists=True,
+    )
+    op.create_table(
+        "ai_conversations",
+        _id(),
+        sa.Column("thread_title", sa.String(200)),
+        sa.Column("messages", sa.JSON()),
+        sa.Column("ai_participants", sa.JSON()),
+        sa.Column("context_data", sa.JSON()),
+        _created_at(),
+        sa.Column("updated_at", sa.DateTime(timezone=True)),
+        _user_id(),
+        if_not_exists=True,
+    )
+    op.create_table(
+        "chaos_metrics",
+        _id(),
+        sa.Column("chaos_level", _enum("chaoslevel"), nullable=False),
+        sa.Column("capture_velocity", sa.Integer()),
+        sa.Column("task_switches", sa.Integer()),
+        sa.Column("urgency_keywords", sa.Integer()),
+        sa.Column("completion_ratio", sa.Integer()),
+        sa.Column("detection_reason", sa.String(200)),
+        sa.Column("intervention_triggered", sa.Boolean()),
+        _created_at(),
+        _user_id(),
+        if_not_exists=True,
+    )
+
+
+def upgrade():
+    create_baseline_schema()
+    for name, table, columns in WINDOW_INDEXES:
+        op.create_index(name, table, columns, if_not_exists=True)
+
+    op.create_index(
+        "ix_tasks_user_id_open_mits",
+        "tasks",
+        ["user_id"],
+        postgresql_where=sa.text("is_mit AND status != 'DONE'"),
+        sqlite_where=sa.text("is_mit = 1 AND status != 'DONE'"),
+        if_not_exists=True,
+    )
+
+
+def downgrade():
+    op.drop_index("ix_tasks_user_id_open_mits", table_name="tasks", if_exists=True)
+    for name, table, _ in reversed(WINDOW_INDEXES):
+        op.drop_index(name, table_name=table, if_exists=True)
+    # the baseline tables are left in place: they predate this revision
@@ -0,0 +1,57 @@
+"""urgency score columns
+
+Adds tasks.urgency_score / ideas.urgency_score (scored at write time by the
+ORM listeners in services.urgency) and rebuilds the (user_id, updated_at)
+indexes on Postgres to INCLUDE the score, so the chaos urgency SUM is an
+index-only scan. Startup create_all may already have created the columns and
+covering indexes, so both steps are skipped when present. Existing rows start
+at 0; fill them with
+
+    python -m scripts.backfill_urgency
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-16 22:00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0002'
+down_revision = '0001'
+branch_labels = None
+depends_on = None
+
+
+def _columns(table):
+    return {column["name"] for column in sa.inspect(op.get_bind()).get_columns(table)}
+
+
+def _includes_urgency_score(table, index_name):
+    for index in sa.inspect(op.get_bind()).get_indexes(table):
+        if index["name"] == index_name:
+            return "urgency_score" in index.get("dialect_options", {}).get("postgresql_include", [])
+    return False
+
+
+def upgrade():
+    for table in ("tasks", "ideas"):
+        if "urgency_score" not in _columns(table):
+            op.add_column(table, sa.Column("urgency_score", sa.Integer(), server_default="0", nullable=False))
+
+        index_name = f"ix_{table}_user_id_updated_at"
+        if op.get_bind().dialect.name == "postgresql" and not _includes_urgency_score(table, index_name):
+            op.drop_index(index_name, table_name=table, if_exists=True)
+            op.create_index(index_name, table, ["user_id", "updated_at"], postgresql_include=["urgency_score"])
+
+
+def downgrade():
+    for table in ("ideas", "tasks"):
+        if op.get_bind().dialect.name == "postgresql":
+            index_name = f"ix_{table}_user_id_updated_at"
+            op.drop_index(index_name, table_name=table, if_exists=True)
+            op.create_index(index_name, table, ["user_id", "updated_at"])
+
+        op.drop_column(table, "urgency_score")
@@ -0,0 +1,31 @@
+"""chaos_metrics (user_id, created_at) index
+
+Change-only ChaosMetric persistence looks up each user's latest row.
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-16 23:00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0003'
+down_revision = '0002'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index(
+        "ix_chaos_metrics_user_id_created_at",
+        "chaos_metrics",
+        ["user_id", "created_at"],
+        if_not_exists=True,
+    )
+
+
+def downgrade():
+    op.drop_index("ix_chaos_metrics_user_id_created_at", table_name="chaos_metrics", if_exists=True)
@@ -0,0 +1,45 @@
+"""chaos metric hourly/daily rollups
+
+Adds chaos_metrics_hourly and chaos_metrics_daily, maintained incrementally
+whenever a ChaosMetric is written. Fill them from existing raw rows with
+
+    python -m scripts.chaos_retention --rebuild
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-17 00:00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision = '0004'
+down_revision = '0003'
+branch_labels = None
+depends_on = None
+
+ROLLUP_TABLES = ("chaos_metrics_hourly", "chaos_metrics_daily")
+VALUE_COLUMNS = (
+    "samples", "focused_count", "scattered_count", "spinning_count",
+    "capture_velocity_sum", "task_switches_sum", "urgency_keywords_sum", "completion_ratio_sum",
+)
+
+
+def upgrade():
+    for table in ROLLUP_TABLES:
+        op.create_table(
+            table,
+            sa.Column("user_id", postgresql.UUID(as_uuid=True), sa.ForeignKey("users.id"), nullable=False),
+            sa.Column("bucket_start", sa.DateTime(timezone=True), nullable=False),
+            *(sa.Column(name, sa.Integer(), nullable=False) for name in VALUE_COLUMNS),
+            sa.PrimaryKeyConstraint("user_id", "bucket_start"),
+            if_not_exists=True,
+        )
+
+
+def downgrade():
+    for table in ROLLUP_TABLES:
+        op.drop_table(table, if_exists=True)
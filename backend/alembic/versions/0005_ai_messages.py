@@ -0,0 +1,118 @@
+"""normalized ai_messages table
+
+Moves AIConversation.messages (one JSON array rewritten on every turn) into
+ai_messages rows keyed by (conversation_id, seq). Existing arrays are
+exploded in order, message_count is set to their length and the JSON column
+is dropped. Startup create_all may already have created ai_messages, so the
+table is created idempotently.
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-17 01:00:00
+
+"""
+import json
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision = '0005'
+down_revision = '0004'
+branch_labels = None
+depends_on = None
+
+BATCH_SIZE = 1000
+
+conversations = sa.table(
+    "ai_conversations",
+    sa.column("id", postgresql.UUID(as_uuid=True)),
+    sa.column("messages", sa.JSON()),
+    sa.column("message_count", sa.Integer()),
+)
+messages = sa.table(
+    "ai_messages",
+    sa.column("conversation_id", postgresql.UUID(as_uuid=True)),
+    sa.column("seq", sa.Integer()),
+    sa.column("role", sa.String()),
+    sa.column("ai", sa.String()),
+    sa.column("content", sa.Text()),
+    sa.column("model", sa.String()),
+    sa.column("tokens_used", sa.Integer()),
+)
+
+
+def _columns(table):
+    return {column["name"] for column in sa.inspect(op.get_bind()).get_columns(table)}
+
+
+def upgrade():
+    bind = op.get_bind()
+    op.create_table(
+        "ai_messages",
+        sa.Column("conversation_id", postgresql.UUID(as_uuid=True),
+                  sa.ForeignKey("ai_conversations.id", ondelete="CASCADE"), nullable=False),
+        sa.Column("seq", sa.Integer(), autoincrement=False, nullable=False),
+        sa.Column("role", sa.String(20), nullable=False),
+        sa.Column("ai", sa.String(20)),
+        sa.Column("content", sa.Text(), nullable=False),
+        sa.Column("model", sa.String(50)),
+        sa.Column("tokens_used", sa.Integer()),
+        sa.Column("created_at", sa.DateTime(timezone=True), server_default=sa.func.now()),
+        sa.PrimaryKeyConstraint("conversation_id", "seq"),
+        if_not_exists=True,
+    )
+
+    existing = _columns("ai_conversations")
+    if "message_count" not in existing:
+        op.add_column("ai_conversations", sa.Column("message_count", sa.Integer(), server_default="0", nullable=False))
+    if "messages" not in existing:
+        return
+
+    rows = []
+    for conversation_id, thread in bind.execute(sa.select(conversations.c.id, conversations.c.messages)):
+        if isinstance(thread, str):
+            thread = json.loads(thread)
+        thread = thread or []
+        for seq, message in enumerate(thread, start=1):
+            rows.append({
+                "conversation_id": conversation_id,
+                "seq": seq,
+                "role": message.get("role", "user"),
+                "ai": message.get("ai"),
+                "content": message.get("content") or "",
+                "model": message.get("model"),
+                "tokens_used": message.get("tokens_used"),
+            })
+        bind.execute(
+            conversations.update().where(conversations.c.id == conversation_id).values(message_count=len(thread))
+        )
+        if len(rows) >= BATCH_SIZE:
+            bind.execute(messages.insert(), rows)
+            rows = []
+    if rows:
+        bind.execute(messages.insert(), rows)
+
+    with op.batch_alter_table("ai_conversations") as batch_op:
+        batch_op.drop_column("messages")
+
+
+def downgrade():
+    bind = op.get_bind()
+    with op.batch_alter_table("ai_conversations") as batch_op:
+        batch_op.add_column(sa.Column("messages", sa.JSON()))
+
+    threads = {}
+    for row in bind.execute(sa.select(messages).order_by(messages.c.conversation_id, messages.c.seq)):
+        message = {"role": row.role, "content": row.content}
+        if row.role == "assistant":
+            message.update(ai=row.ai, model=row.model, tokens_used=row.tokens_used)
+        threads.setdefault(row.conversation_id, []).append(message)
+    for conversation_id, thread in threads.items():
+        bind.execute(conversations.update().where(conversations.c.id == conversation_id).values(messages=thread))
+
+    with op.batch_alter_table("ai_conversations") as batch_op:
+        batch_op.drop_column("message_count")
+    op.drop_table("ai_messages")
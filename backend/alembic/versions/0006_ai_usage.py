@@ -0,0 +1,47 @@
+"""ai_usage metering table
+
+One row per AI provider call (provider, model, token split, latency and
+outcome), written in batches by services.ai_usage.AIUsageRecorder.
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2026-10-17 02:00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision = '0006'
+down_revision = '0005'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "ai_usage",
+        sa.Column("id", postgresql.UUID(as_uuid=True), primary_key=True),
+        sa.Column("user_id", postgresql.UUID(as_uuid=True), sa.ForeignKey("users.id"), nullable=False),
+        sa.Column("provider", sa.String(20), nullable=False),
+        sa.Column("model", sa.String(50), nullable=False),
+        sa.Column("outcome", sa.String(20), nullable=False),
+        sa.Column("streamed", sa.Boolean(), nullable=False),
+        sa.Column("input_tokens", sa.Integer(), nullable=False),
+        sa.Column("cached_input_tokens", sa.Integer(), nullable=False),
+        sa.Column("cache_write_tokens", sa.Integer(), nullable=False),
+        sa.Column("output_tokens", sa.Integer(), nullable=False),
+        sa.Column("latency_ms", sa.Integer(), nullable=False),
+        sa.Column("created_at", sa.DateTime(timezone=True), nullable=False),
+        if_not_exists=True,
+    )
+    op.create_index("ix_ai_usage_created_at", "ai_usage", ["created_at"], if_not_exists=True)
+    op.create_index("ix_ai_usage_user_id_created_at", "ai_usage", ["user_id", "created_at"], if_not_exists=True)
+
+
+def downgrade():
+    op.drop_index("ix_ai_usage_user_id_created_at", table_name="ai_usage", if_exists=True)
+    op.drop_index("ix_ai_usage_created_at", table_name="ai_usage", if_exists=True)
+    op.drop_table("ai_usage", if_exists=True)
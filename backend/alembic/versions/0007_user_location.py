@@ -0,0 +1,45 @@
+"""user weather location
+
+Adds users.latitude / longitude / location_name, set through
+PUT /weather/location. Users without one get the DEFAULT_* location.
+Startup create_all may already have created the columns, so each is only
+added when missing.
+
+Revision ID: 0007
+Revises: 0006
+Create Date: 2026-10-17 03:00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0007'
+down_revision = '0006'
+branch_labels = None
+depends_on = None
+
+
+LOCATION_COLUMNS = [
+    sa.Column("latitude", sa.Float(), nullable=True),
+    sa.Column("longitude", sa.Float(), nullable=True),
+    sa.Column("location_name", sa.String(100), nullable=True),
+]
+
+
+def _columns(table):
+    return {column["name"] for column in sa.inspect(op.get_bind()).get_columns(table)}
+
+
+def upgrade():
+    existing = _columns("users")
+    for column in LOCATION_COLUMNS:
+        if column.name not in existing:
+            op.add_column("users", column)
+
+
+def downgrade():
+    op.drop_column("users", "location_name")
+    op.drop_column("users", "longitude")
+    op.drop_column("users", "latitude")
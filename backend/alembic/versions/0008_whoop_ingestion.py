@@ -0,0 +1,78 @@
+"""whoop webhook outbox and record tables
+
+Adds whoop_webhook_events (the queue POST /webhooks/whoop appends to) and
+whoop_recoveries / whoop_sleeps / whoop_workouts / whoop_cycles, upserted
+from it by
+
+    python -m scripts.ingest_whoop --watch
+
+Revision ID: 0008
+Revises: 0007
+Create Date: 2026-10-17 04:00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0008'
+down_revision = '0007'
+branch_labels = None
+depends_on = None
+
+RECORD_TABLES = {
+    "whoop_recoveries": [
+        sa.Column("recovery_score", sa.Float()),
+        sa.Column("hrv_rmssd", sa.Float()),
+        sa.Column("resting_heart_rate", sa.Float()),
+    ],
+    "whoop_sleeps": [
+        sa.Column("sleep_duration_ms", sa.Integer()),
+        sa.Column("sleep_efficiency", sa.Float()),
+    ],
+    "whoop_workouts": [
+        sa.Column("strain_score", sa.Float()),
+        sa.Column("duration_ms", sa.Integer()),
+    ],
+    "whoop_cycles": [
+        sa.Column("strain", sa.Float()),
+    ],
+}
+
+
+def upgrade():
+    op.create_table(
+        "whoop_webhook_events",
+        sa.Column("id", sa.Integer(), primary_key=True, autoincrement=True),
+        sa.Column("event_type", sa.String(50), nullable=False),
+        sa.Column("payload", sa.JSON(), nullable=False),
+        sa.Column("received_at", sa.DateTime(timezone=True), nullable=False),
+        sa.Column("processed_at", sa.DateTime(timezone=True)),
+        sa.Column("attempts", sa.Integer(), nullable=False),
+        sa.Column("last_error", sa.String(500)),
+        if_not_exists=True,
+    )
+    op.create_index(
+        "ix_whoop_webhook_events_pending", "whoop_webhook_events", ["id"],
+        postgresql_where=sa.text("processed_at IS NULL"), if_not_exists=True,
+    )
+
+    for table, columns in RECORD_TABLES.items():
+        op.create_table(
+            table,
+            sa.Column("whoop_user_id", sa.String(50), nullable=False),
+            sa.Column("record_id", sa.String(50), nullable=False),
+            sa.Column("data", sa.JSON(), nullable=False),
+            sa.Column("updated_at", sa.DateTime(timezone=True), nullable=False),
+            *columns,
+            sa.PrimaryKeyConstraint("whoop_user_id", "record_id"),
+            if_not_exists=True,
+        )
+
+
+def downgrade():
+    for table in RECORD_TABLES:
+        op.drop_table(table, if_exists=True)
+    op.drop_index("ix_whoop_webhook_events_pending", table_name="whoop_webhook_events", if_exists=True)
+    op.drop_table("whoop_webhook_events", if_exists=True)
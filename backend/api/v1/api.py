@@ -55,9 +55,33 @@ except ImportError:
     # Webhooks endpoint not ready yet
     pass
 
+try:
+    from api.v1.endpoints.chaos import router as chaos_router
+    api_router.include_router(chaos_router, prefix="/chaos", tags=["chaos-detection"])
+except ImportError:
+    # Chaos endpoint not ready yet
+    pass
+
+try:
+    from api.v1.endpoints.ai_chat import router as ai_chat_router
+    api_router.include_router(ai_chat_router, prefix="/ai", tags=["ai"])
+except ImportError:
+    # AI chat endpoint not ready yet
+    pass
+
+try:
+    from api.v1.endpoints.dashboard import router as dashboard_router
+    api_router.include_router(dashboard_router, prefix="/dashboard", tags=["dashboard"])
+except ImportError:
+    # Dashboard endpoint not ready yet
+    pass
+
+try:
+    from api.v1.endpoints.ideas import router as ideas_router
+    api_router.include_router(ideas_router, prefix="/ideas", tags=["ideas"])
+except ImportError:
+    # Ideas endpoint not ready yet
+    pass
+
 # TODO: Include other endpoint routers when they're created
-# api_router.include_router(ideas.router, prefix="/ideas", tags=["ideas"])
 # api_router.include_router(journal.router, prefix="/journal", tags=["journal"])
-# api_router.include_router(ai_chat.router, prefix="/ai", tags=["ai"])
-# api_router.include_router(dashboard.router, prefix="/dashboard", tags=["dashboard"])
-# api_router.include_router(chaos.router, prefix="/chaos", tags=["chaos-detection"])
\ No newline at end of file
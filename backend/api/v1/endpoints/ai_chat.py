@@ -0,0 +1,105 @@
+# backend/api/v1/endpoints/ai_chat.py
+import json
+from datetime import datetime, timedelta
+from typing import Literal, Optional
+from uuid import UUID
+
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from core.ai_scheduler import ProviderBusy, scheduler_stats
+from core.cache import cache_stats
+from core.circuit_breaker import breaker_stats
+from core.database import AsyncSessionLocal, get_db
+from services.ai_routing import AIRoutingService
+from services.ai_usage import AIUsageReportService
+from services.chaos_history import as_utc
+from services.conversation_store import ConversationStore
+
+router = APIRouter()
+
+
+class ChatRequest(BaseModel):
+    user_id: UUID
+    message: str
+    thread_id: Optional[UUID] = None
+    bypass_cache: bool = False  # force fresh answers instead of the response cache
+    hedge: Optional[bool] = None  # race both AIs for un-mentioned messages (default AI_HEDGE_UNMENTIONED)
+
+
+def format_sse(event: dict) -> str:
+    return f"event: {event['event']}\ndata: {json.dumps(event, default=str)}\n\n"
+
+
+@router.post("/chat")
+async def chat(request: ChatRequest, db: AsyncSession = Depends(get_db)):
+    """Route a message to the AI(s) and return the complete answers"""
+    service = AIRoutingService(db, request.user_id)
+    try:
+        return await service.process_message(request.message, request.thread_id, request.bypass_cache, request.hedge)
+    except ProviderBusy as e:
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": str(e.retry_after)})
+
+
+@router.post("/chat/stream")
+async def stream_chat(request: ChatRequest):
+    """Server-Sent Events: token deltas from every routed AI as they arrive"""
+
+    async def events():
+        # The session lives as long as the stream, not the request handler
+        async with AsyncSessionLocal() as db:
+            service = AIRoutingService(db, request.user_id)
+            async for event in service.stream_message(request.message, request.thread_id, request.bypass_cache):
+                yield format_sse(event)
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@router.get("/threads/{thread_id}/messages")
+async def get_thread_messages(
+    thread_id: UUID,
+    user_id: UUID,
+    before: Optional[int] = Query(None, ge=1, description="next_before from the previous page"),
+    limit: int = Query(50, ge=1, le=200),
+    db: AsyncSession = Depends(get_db),
+):
+    """Most recent messages of a thread, paged backwards with `before`"""
+    store = ConversationStore(db)
+    if await store.get_conversation(thread_id, user_id) is None:
+        raise HTTPException(status_code=404, detail="Thread not found")
+    return await store.recent(thread_id, limit, before)
+
+
+@router.get("/cache-stats")
+async def get_ai_cache_stats():
+    """Hit/miss counters of this worker's caches (AI responses included)"""
+    return {"caches": cache_stats()}
+
+
+@router.get("/providers")
+async def get_provider_health():
+    """Circuit breaker state and scheduler load of each AI provider in this worker"""
+    return {"providers": breaker_stats(), "schedulers": scheduler_stats()}
+
+
+@router.get("/usage")
+async def get_ai_usage(
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    user_id: Optional[UUID] = None,
+    provider: Optional[Literal["claude", "chatgpt"]] = None,
+    db: AsyncSession = Depends(get_db),
+):
+    """Calls, errors, token spend and p50/p95 latency per day, user and provider"""
+    # query-string datetimes may carry an offset; compare them as naive UTC
+    end = as_utc(end) if end else datetime.utcnow()
+    start = as_utc(start) if start else end - timedelta(days=7)
+    if start >= end:
+        raise HTTPException(status_code=400, detail="start must be before end")
+    return {"usage": await AIUsageReportService(db).report(start, end, user_id, provider)}
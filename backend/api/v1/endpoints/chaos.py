@@ -0,0 +1,30 @@
+# backend/api/v1/endpoints/chaos.py
+from datetime import datetime, timedelta
+from typing import Literal, Optional
+from uuid import UUID
+
+from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from core.database import get_db
+from services.chaos_history import ChaosHistoryService, as_utc
+
+router = APIRouter()
+
+
+@router.get("/history")
+async def get_chaos_history(
+    user_id: UUID,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    resolution: Literal["auto", "raw", "hour", "day"] = "auto",
+    db: AsyncSession = Depends(get_db),
+):
+    """Chaos level history; "auto" picks raw, hourly or daily points from the range"""
+    service = ChaosHistoryService(db, user_id)
+    # query-string datetimes may carry an offset; compare them as naive UTC
+    end = as_utc(end) if end else service.now
+    start = as_utc(start) if start else end - timedelta(days=7)
+    if start >= end:
+        raise HTTPException(status_code=400, detail="start must be before end")
+    return await service.get_history(start, end, resolution)
@@ -0,0 +1,16 @@
+# backend/api/v1/endpoints/dashboard.py
+from uuid import UUID
+
+from fastapi import APIRouter, Depends
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from core.database import get_db
+from services.context_snapshot import ContextSnapshotService
+
+router = APIRouter()
+
+
+@router.get("/context")
+async def get_dashboard_context(user_id: UUID, refresh: bool = False, db: AsyncSession = Depends(get_db)):
+    """Current MITs, recent ideas and chaos level: the same snapshot AI chat uses"""
+    return await ContextSnapshotService(db, user_id).get_snapshot(refresh=refresh)
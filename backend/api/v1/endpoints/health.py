@@ -1,12 +1,13 @@
 # backend/api/v1/endpoints/health.py
 from fastapi import APIRouter, HTTPException, Depends
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import text
-import redis
 import httpx
 import os
 from core.database import get_db
 from core.config import settings
+from core.http_clients import get_http_client, http_client, http_client_stats
+from core.redis import get_redis
 import time
 
 router = APIRouter()
@@ -22,12 +23,12 @@ async def health_check():
     }
 
 @router.get("/database")
-async def health_check_database(db: Session = Depends(get_db)):
+async def health_check_database(db: AsyncSession = Depends(get_db)):
     """Check database connectivity"""
     start_time = time.time()
     try:
         # Simple query to test database connectivity
-        result = db.execute(text("SELECT 1"))
+        result = await db.execute(text("SELECT 1"))
         result.fetchone()
         response_time = round((time.time() - start_time) * 1000, 2)
         
@@ -49,9 +50,8 @@ async def health_check_redis():
     """Check Redis connectivity"""
     start_time = time.time()
     try:
-        # Connect to Redis using the same URL as the app
-        redis_client = redis.from_url(settings.REDIS_URL)
-        redis_client.ping()
+        # Ping through the app's shared async client
+        await get_redis().ping()
         response_time = round((time.time() - start_time) * 1000, 2)
         
         return {
@@ -145,26 +145,25 @@ async def health_check_whoop():
         }
 
 @router.get("/n8n")
-async def health_check_n8n():
+async def health_check_n8n(client: httpx.AsyncClient = Depends(http_client("n8n"))):
     """Check n8n connectivity"""
     start_time = time.time()
     try:
-        async with httpx.AsyncClient() as client:
-            response = await client.get("http://n8n:5678/healthz", timeout=5.0)
-            response_time = round((time.time() - start_time) * 1000, 2)
-            
-            if response.status_code == 200:
-                return {
-                    "status": "connected",
-                    "response_time_ms": response_time,
-                    "n8n_url": "http://localhost:5678"
-                }
-            else:
-                return {
-                    "status": "error",
-                    "response_time_ms": response_time,
-                    "status_code": response.status_code
-                }
+        response = await client.get("/healthz")
+        response_time = round((time.time() - start_time) * 1000, 2)
+        
+        if response.status_code == 200:
+            return {
+                "status": "connected",
+                "response_time_ms": response_time,
+                "n8n_url": "http://localhost:5678"
+            }
+        else:
+            return {
+                "status": "error",
+                "response_time_ms": response_time,
+                "status_code": response.status_code
+            }
     except Exception as e:
         response_time = round((time.time() - start_time) * 1000, 2)
         return {
@@ -174,7 +173,7 @@ async def health_check_n8n():
         }
 
 @router.get("/whoop")
-async def check_whoop_health():
+async def check_whoop_health(client: httpx.AsyncClient = Depends(http_client("whoop"))):
     """Check WHOOP integration health"""
     
     # Check if WHOOP is configured
@@ -187,9 +186,8 @@ async def check_whoop_health():
     
     try:
         # Test WHOOP API connectivity
-        async with httpx.AsyncClient(timeout=10.0) as client:
-            response = await client.get(f"{settings.WHOOP_BASE_URL}/")
-            
+        response = await client.get("/")
+        
         if response.status_code < 500:
             return {
                 "status": "connected",
@@ -210,8 +208,13 @@ async def check_whoop_health():
             "message": f"WHOOP API unreachable: {str(e)}"
         }
 
+@router.get("/upstreams")
+async def get_upstream_connections():
+    """Connection reuse of this worker's pooled weather, WHOOP and n8n clients"""
+    return {"upstreams": http_client_stats()}
+
 @router.get("/summary")
-async def get_health_summary(db: Session = Depends(get_db)):
+async def get_health_summary(db: AsyncSession = Depends(get_db)):
     """Get comprehensive health summary including WHOOP data"""
     
     # For now, return mock data
@@ -234,7 +237,7 @@ async def get_health_summary(db: Session = Depends(get_db)):
     }
     
 @router.get("/all")
-async def health_check_all(db: Session = Depends(get_db)):
+async def health_check_all(db: AsyncSession = Depends(get_db)):
     """Comprehensive health check of all services"""
     start_time = time.time()
     
@@ -266,7 +269,7 @@ async def health_check_all(db: Session = Depends(get_db)):
     
     # External services
     try:
-        n8n_health = await health_check_n8n()
+        n8n_health = await health_check_n8n(get_http_client("n8n"))
         results["services"]["n8n"] = n8n_health
     except Exception as e:
         results["services"]["n8n"] = {"status": "error", "error": str(e)}
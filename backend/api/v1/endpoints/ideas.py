@@ -0,0 +1,17 @@
+# backend/api/v1/endpoints/ideas.py
+from typing import Optional
+from uuid import UUID
+
+from fastapi import APIRouter, Depends
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from core.database import get_db
+from services.idea_enrichment import enrichment_progress
+
+router = APIRouter()
+
+
+@router.get("/enrichment")
+async def get_enrichment_progress(user_id: Optional[UUID] = None, db: AsyncSession = Depends(get_db)):
+    """Enriched vs pending ideas (scripts.enrich_ideas fills them in the background)"""
+    return await enrichment_progress(db, user_id)
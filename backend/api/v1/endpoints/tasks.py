@@ -1,6 +1,6 @@
 # backend/api/v1/endpoints/tasks.py
 from fastapi import APIRouter, Depends
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List
 from core.database import get_db
 
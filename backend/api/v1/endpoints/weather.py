@@ -1,119 +1,63 @@
 # backend/api/v1/endpoints/weather.py - Updated to use One Call API 3.0
 
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query
 import httpx
-from datetime import datetime, timedelta
+from datetime import datetime
 from typing import Optional
+from uuid import UUID
 import logging
+from pydantic import BaseModel, Field
+from sqlalchemy.ext.asyncio import AsyncSession
 from core.config import get_settings
-
-# Simple in-memory cache (use Redis in production)
-weather_cache = {}
-CACHE_DURATION_MINUTES = 10  # Cache for 10 minutes
+from core.database import get_db
+from core.http_clients import http_client
+from models.database import User
+from services import weather as weather_service
+from services.weather import WeatherLocation, get_weather_prefetcher, get_weather_snapshot, resolve_location
 
 router = APIRouter(prefix="/weather", tags=["weather"])
 settings = get_settings()
 logger = logging.getLogger(__name__)
 
+class LocationUpdate(BaseModel):
+    user_id: UUID
+    latitude: float = Field(ge=-90, le=90)
+    longitude: float = Field(ge=-180, le=180)
+    name: Optional[str] = Field(None, max_length=100)
+
+async def weather_location(
+    user_id: Optional[UUID] = None,
+    lat: Optional[float] = Query(None, ge=-90, le=90),
+    lon: Optional[float] = Query(None, ge=-180, le=180),
+    db: AsyncSession = Depends(get_db),
+) -> WeatherLocation:
+    """Where to report weather for: lat/lon, else the user's saved location, else the default"""
+    if (lat is None) != (lon is None):
+        raise HTTPException(status_code=400, detail="lat and lon must be given together")
+    location = await resolve_location(db, user_id, lat, lon)
+    if location is None:
+        raise HTTPException(status_code=404, detail="User not found")
+    return location
+
 @router.get("/current")
-async def get_current_weather():
+async def get_current_weather(
+    location: WeatherLocation = Depends(weather_location),
+    client: httpx.AsyncClient = Depends(http_client("openweather")),
+):
     """Get current weather with intelligent caching using One Call API 3.0"""
     
     if not settings.OPENWEATHER_API_KEY:
         raise HTTPException(status_code=500, detail="OpenWeather API key not configured")
     
-    cache_key = f"current_weather_{settings.DEFAULT_LOCATION.lower().replace(' ', '_').replace(',', '')}"
-    now = datetime.utcnow()
-    
-    # Check if we have valid cached data
-    if cache_key in weather_cache:
-        cached_data = weather_cache[cache_key]
-        cache_time = datetime.fromisoformat(cached_data["cached_at"])
-        
-        # Return cached data if less than 10 minutes old
-        if now - cache_time < timedelta(minutes=CACHE_DURATION_MINUTES):
-            logger.info("Returning cached weather data")
-            return cached_data["data"]
-    
-    # Make API call only if no valid cache
     try:
-        logger.info("Fetching fresh weather data from OpenWeather One Call API 3.0")
-        
-        async with httpx.AsyncClient(timeout=10.0) as client:
-            response = await client.get(
-                "https://api.openweathermap.org/data/3.0/onecall",
-                params={
-                    "lat": settings.DEFAULT_LATITUDE,
-                    "lon": settings.DEFAULT_LONGITUDE,
-                    "exclude": "minutely,alerts",  # Exclude minutely forecasts and alerts to save data
-                    "appid": settings.OPENWEATHER_API_KEY,
-                    "units": "imperial"
-                }
-            )
-            
-        if response.status_code != 200:
-            logger.error(f"OpenWeather One Call API error: {response.status_code} - {response.text}")
-            raise HTTPException(status_code=500, detail="Weather API unavailable")
-            
-        weather_data = response.json()
-        
-        # Extract current weather from One Call API response
-        current = weather_data["current"]
-        daily_forecast = weather_data["daily"][0] if weather_data.get("daily") else {}
-        
-        # Calculate air quality impact based on UV index and weather conditions
-        uv_index = current.get("uvi", 0)
-        weather_id = current["weather"][0]["id"]
-        
-        air_quality_impact = calculate_air_quality_impact(uv_index, weather_id)
-        
-        # Format response with richer data from One Call API
-        formatted_data = {
-            "temperature": round(current["temp"]),
-            "feels_like": round(current["feels_like"]),
-            "description": current["weather"][0]["description"].title(),
-            "humidity": current["humidity"],
-            "pressure": round(current["pressure"] * 0.02953, 2),  # Convert hPa to inHg
-            "wind_speed": round(current.get("wind_speed", 0)),
-            "wind_direction": current.get("wind_deg", 0),
-            "uv_index": round(current.get("uvi", 0), 1),
-            "visibility": round(current.get("visibility", 10000) * 0.000621371, 1),  # Convert m to miles
-            "dew_point": round(current.get("dew_point", 0)),
-            "clouds": current.get("clouds", 0),
-            "sunrise": datetime.fromtimestamp(current["sunrise"]).strftime("%H:%M"),
-            "sunset": datetime.fromtimestamp(current["sunset"]).strftime("%H:%M"),
-            "daily_high": round(daily_forecast.get("temp", {}).get("max", current["temp"])),
-            "daily_low": round(daily_forecast.get("temp", {}).get("min", current["temp"])),
-            "location": settings.DEFAULT_LOCATION,
-            "last_updated": now.isoformat(),
-            "air_quality_impact": air_quality_impact,
-            "weather_icon": current["weather"][0]["icon"]
-        }
-        
-        # Cache the result
-        weather_cache[cache_key] = {
-            "data": formatted_data,
-            "cached_at": now.isoformat()
-        }
-        
-        logger.info(f"Weather data cached successfully for {settings.DEFAULT_LOCATION}")
-        return formatted_data
+        return current_weather(await get_weather_snapshot(location.bucket, client), location)
         
     except httpx.TimeoutException:
         logger.error("OpenWeather One Call API timeout")
-        # Return stale cache if available
-        if cache_key in weather_cache:
-            logger.warning("Returning stale cached data due to timeout")
-            return weather_cache[cache_key]["data"]
         raise HTTPException(status_code=504, detail="Weather service timeout")
         
     except Exception as e:
         logger.error(f"Weather API error: {str(e)}")
-        
-        # Return stale cache if available during error
-        if cache_key in weather_cache:
-            logger.warning("Returning stale cached data due to API error")
-            return weather_cache[cache_key]["data"]
             
         # Fallback data if no cache available
         return {
@@ -132,12 +76,43 @@ async def get_current_weather():
             "sunset": "19:30",
             "daily_high": 75,
             "daily_low": 65,
-            "location": settings.DEFAULT_LOCATION,
-            "last_updated": now.isoformat(),
+            "location": location.name,
+            "last_updated": datetime.utcnow().isoformat(),
             "air_quality_impact": "Unable to determine",
             "weather_icon": "01d"
         }
 
+def current_weather(snapshot: dict, location: WeatherLocation) -> dict:
+    """The /current view of a weather snapshot"""
+    current = snapshot["current"]
+    today = snapshot["daily"][0] if snapshot["daily"] else {}
+    
+    # Calculate air quality impact based on UV index and weather conditions
+    air_quality_impact = calculate_air_quality_impact(current["uvi"], current["weather_id"])
+    
+    # Format response with richer data from One Call API
+    return {
+        "temperature": round(current["temp"]),
+        "feels_like": round(current["feels_like"]),
+        "description": current["description"],
+        "humidity": current["humidity"],
+        "pressure": round(current["pressure"] * 0.02953, 2),  # Convert hPa to inHg
+        "wind_speed": round(current["wind_speed"]),
+        "wind_direction": current["wind_deg"],
+        "uv_index": round(current["uvi"], 1),
+        "visibility": round(current["visibility"] * 0.000621371, 1),  # Convert m to miles
+        "dew_point": round(current["dew_point"]),
+        "clouds": current["clouds"],
+        "sunrise": datetime.fromtimestamp(current["sunrise"]).strftime("%H:%M"),
+        "sunset": datetime.fromtimestamp(current["sunset"]).strftime("%H:%M"),
+        "daily_high": round(today.get("max", current["temp"])),
+        "daily_low": round(today.get("min", current["temp"])),
+        "location": location.name,
+        "last_updated": snapshot["fetched_at"],
+        "air_quality_impact": air_quality_impact,
+        "weather_icon": current["icon"]
+    }
+
 def calculate_air_quality_impact(uv_index: float, weather_id: int) -> str:
     """Calculate air quality impact based on UV index and weather conditions"""
     
@@ -164,86 +139,63 @@ def calculate_air_quality_impact(uv_index: float, weather_id: int) -> str:
 async def get_cache_stats():
     """Debug endpoint to check cache status"""
     return {
-        "cached_items": len(weather_cache),
-        "cache_keys": list(weather_cache.keys()),
-        "cache_ages_minutes": {
-            key: round((datetime.utcnow() - datetime.fromisoformat(data["cached_at"])).total_seconds() / 60, 2)
-            for key, data in weather_cache.items()
-        },
-        "cache_duration_minutes": CACHE_DURATION_MINUTES,
+        **weather_service.weather_cache.stats(),
+        "prefetch": get_weather_prefetcher().stats(),
+        "cache_duration_minutes": settings.WEATHER_CACHE_TTL / 60,
         "api_key_configured": bool(settings.OPENWEATHER_API_KEY),
         "api_endpoint": "One Call API 3.0"
     }
 
+@router.put("/location")
+async def set_weather_location(update: LocationUpdate, db: AsyncSession = Depends(get_db)):
+    """Save the location a user's weather is reported for"""
+    user = await db.get(User, update.user_id)
+    if user is None:
+        raise HTTPException(status_code=404, detail="User not found")
+    user.latitude, user.longitude, user.location_name = update.latitude, update.longitude, update.name
+    await db.commit()
+    location = weather_service.locate(update.latitude, update.longitude, update.name)
+    return {"location": location.name, "bucket": location.bucket}
+
 @router.get("/forecast")
-async def get_weather_forecast():
+async def get_weather_forecast(
+    location: WeatherLocation = Depends(weather_location),
+    client: httpx.AsyncClient = Depends(http_client("openweather")),
+):
     """Get hourly and daily forecast data"""
     
     if not settings.OPENWEATHER_API_KEY:
         raise HTTPException(status_code=500, detail="OpenWeather API key not configured")
     
-    cache_key = f"forecast_{settings.DEFAULT_LOCATION.lower().replace(' ', '_').replace(',', '')}"
-    now = datetime.utcnow()
-    
-    # Check cache first
-    if cache_key in weather_cache:
-        cached_data = weather_cache[cache_key]
-        cache_time = datetime.fromisoformat(cached_data["cached_at"])
-        
-        if now - cache_time < timedelta(minutes=CACHE_DURATION_MINUTES):
-            return cached_data["data"]
-    
     try:
-        async with httpx.AsyncClient(timeout=10.0) as client:
-            response = await client.get(
-                "https://api.openweathermap.org/data/3.0/onecall",
-                params={
-                    "lat": settings.DEFAULT_LATITUDE,
-                    "lon": settings.DEFAULT_LONGITUDE,
-                    "exclude": "current,minutely,alerts",
-                    "appid": settings.OPENWEATHER_API_KEY,
-                    "units": "imperial"
-                }
-            )
-            
-        if response.status_code != 200:
-            raise HTTPException(status_code=500, detail="Weather forecast API unavailable")
-            
-        weather_data = response.json()
-        
-        # Format forecast data
-        forecast_data = {
-            "hourly": [
-                {
-                    "time": datetime.fromtimestamp(hour["dt"]).strftime("%H:%M"),
-                    "temperature": round(hour["temp"]),
-                    "description": hour["weather"][0]["description"].title(),
-                    "icon": hour["weather"][0]["icon"],
-                    "pop": round(hour.get("pop", 0) * 100)  # Probability of precipitation
-                }
-                for hour in weather_data["hourly"][:12]  # Next 12 hours
-            ],
-            "daily": [
-                {
-                    "date": datetime.fromtimestamp(day["dt"]).strftime("%A"),
-                    "high": round(day["temp"]["max"]),
-                    "low": round(day["temp"]["min"]),
-                    "description": day["weather"][0]["description"].title(),
-                    "icon": day["weather"][0]["icon"],
-                    "pop": round(day.get("pop", 0) * 100)
-                }
-                for day in weather_data["daily"][:7]  # Next 7 days
-            ]
-        }
-        
-        # Cache forecast data
-        weather_cache[cache_key] = {
-            "data": forecast_data,
-            "cached_at": now.isoformat()
-        }
-        
-        return forecast_data
+        return weather_forecast(await get_weather_snapshot(location.bucket, client))
         
     except Exception as e:
         logger.error(f"Weather forecast API error: {str(e)}")
-        raise HTTPException(status_code=500, detail="Failed to fetch weather forecast")
\ No newline at end of file
+        raise HTTPException(status_code=500, detail="Failed to fetch weather forecast")
+
+def weather_forecast(snapshot: dict) -> dict:
+    """The /forecast view of a weather snapshot"""
+    return {
+        "hourly": [
+            {
+                "time": datetime.fromtimestamp(hour["dt"]).strftime("%H:%M"),
+                "temperature": round(hour["temp"]),
+                "description": hour["description"],
+                "icon": hour["icon"],
+                "pop": round(hour["pop"] * 100)  # Probability of precipitation
+            }
+            for hour in snapshot["hourly"]
+        ],
+        "daily": [
+            {
+                "date": datetime.fromtimestamp(day["dt"]).strftime("%A"),
+                "high": round(day["max"]),
+                "low": round(day["min"]),
+                "description": day["description"],
+                "icon": day["icon"],
+                "pop": round(day["pop"] * 100)
+            }
+            for day in snapshot["daily"]
+        ]
+    }
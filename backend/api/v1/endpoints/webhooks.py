@@ -1,27 +1,26 @@
 # backend/api/v1/endpoints/webhooks.py
 
-from fastapi import APIRouter, Request, HTTPException, Depends, BackgroundTasks
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Request, HTTPException, Depends
+from sqlalchemy.ext.asyncio import AsyncSession
 import hmac
 import hashlib
 import json
 import logging
-from datetime import datetime
 
 from core.config import get_settings
 from core.database import get_db
+from services.whoop_ingest import enqueue_whoop_webhooks, ingest_backlog
 
 router = APIRouter(prefix="/webhooks", tags=["webhooks"])
 settings = get_settings()
 logger = logging.getLogger(__name__)
 
-@router.post("/whoop")
+@router.post("/whoop", status_code=202)
 async def whoop_webhook(
     request: Request,
-    background_tasks: BackgroundTasks,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
-    """Handle WHOOP webhook notifications"""
+    """Handle WHOOP webhook notifications: queue them for scripts.ingest_whoop"""
     
     try:
         # Get raw body and headers
@@ -38,19 +37,26 @@ async def whoop_webhook(
             payload = json.loads(body.decode())
         except json.JSONDecodeError:
             raise HTTPException(status_code=400, detail="Invalid JSON payload")
+        if not isinstance(payload, dict):
+            raise HTTPException(status_code=400, detail="Invalid JSON payload")
         
-        # Log webhook received
-        logger.info(f"WHOOP webhook received: {payload.get('type', 'unknown')}")
-        
-        # Process webhook in background
-        background_tasks.add_task(process_whoop_webhook, payload, db)
+        # Append to the durable queue; the ingest worker stores it with its own sessions
+        [event_id] = await enqueue_whoop_webhooks(db, [payload])
+        logger.info(f"WHOOP webhook queued: {payload.get('type', 'unknown')} as event {event_id}")
         
-        return {"status": "received"}
+        return {"status": "queued", "event_id": event_id}
         
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"WHOOP webhook error: {str(e)}")
         raise HTTPException(status_code=500, detail="Internal server error")
 
+@router.get("/whoop/queue")
+async def whoop_webhook_queue(db: AsyncSession = Depends(get_db)):
+    """Webhooks waiting for (or given up on by) the ingest worker"""
+    return await ingest_backlog(db)
+
 def verify_whoop_signature(body: bytes, signature: str, secret: str) -> bool:
     """Verify WHOOP webhook signature"""
     try:
@@ -67,77 +73,3 @@ def verify_whoop_signature(body: bytes, signature: str, secret: str) -> bool:
         return hmac.compare_digest(expected_signature, signature_value)
     except Exception:
         return False
-
-async def process_whoop_webhook(payload: dict, db: Session):
-    """Process WHOOP webhook data in background"""
-    
-    try:
-        webhook_type = payload.get("type")
-        user_id = payload.get("user_id")
-        data = payload.get("data", {})
-        
-        logger.info(f"Processing WHOOP webhook: {webhook_type} for user {user_id}")
-        
-        if webhook_type == "recovery.updated":
-            await process_recovery_update(user_id, data, db)
-        elif webhook_type == "sleep.updated":
-            await process_sleep_update(user_id, data, db)
-        elif webhook_type == "workout.updated":
-            await process_workout_update(user_id, data, db)
-        elif webhook_type == "cycle.updated":
-            await process_cycle_update(user_id, data, db)
-        else:
-            logger.warning(f"Unknown WHOOP webhook type: {webhook_type}")
-            
-    except Exception as e:
-        logger.error(f"Error processing WHOOP webhook: {str(e)}")
-
-async def process_recovery_update(user_id: str, data: dict, db: Session):
-    """Process recovery data update"""
-    try:
-        recovery_score = data.get("recovery_score")
-        hrv_rmssd = data.get("hrv_rmssd")
-        resting_heart_rate = data.get("resting_heart_rate")
-        
-        # TODO: Store in database
-        logger.info(f"Recovery update for {user_id}: score={recovery_score}, hrv={hrv_rmssd}")
-        
-        # TODO: Update real-time dashboard if user is online
-        
-    except Exception as e:
-        logger.error(f"Error processing recovery update: {str(e)}")
-
-async def process_sleep_update(user_id: str, data: dict, db: Session):
-    """Process sleep data update"""
-    try:
-        sleep_duration = data.get("sleep_duration_ms", 0) / (1000 * 60 * 60)  # Convert to hours
-        sleep_efficiency = data.get("sleep_efficiency")
-        
-        # TODO: Store in database
-        logger.info(f"Sleep update for {user_id}: duration={sleep_duration}h, efficiency={sleep_efficiency}")
-        
-    except Exception as e:
-        logger.error(f"Error processing sleep update: {str(e)}")
-
-async def process_workout_update(user_id: str, data: dict, db: Session):
-    """Process workout data update"""
-    try:
-        strain_score = data.get("strain_score")
-        duration = data.get("duration_ms", 0) / (1000 * 60)  # Convert to minutes
-        
-        # TODO: Store in database
-        logger.info(f"Workout update for {user_id}: strain={strain_score}, duration={duration}min")
-        
-    except Exception as e:
-        logger.error(f"Error processing workout update: {str(e)}")
-
-async def process_cycle_update(user_id: str, data: dict, db: Session):
-    """Process physiological cycle update"""
-    try:
-        cycle_id = data.get("cycle_id")
-        
-        # TODO: Store in database
-        logger.info(f"Cycle update for {user_id}: cycle_id={cycle_id}")
-        
-    except Exception as e:
-        logger.error(f"Error processing cycle update: {str(e)}")
\ No newline at end of file
@@ -9,8 +9,10 @@ from typing import Optional
 import logging
 
 from core.config import get_settings
-from core.database import get_db
-from sqlalchemy.orm import Session
+from core.database import AsyncSessionLocal, get_db
+from core.http_clients import http_client
+from sqlalchemy.ext.asyncio import AsyncSession
+from services.whoop_ingest import enqueue_whoop_webhooks
 
 router = APIRouter(prefix="/whoop", tags=["whoop"])
 settings = get_settings()
@@ -48,8 +50,9 @@ async def initiate_whoop_oauth():
 async def whoop_oauth_callback(
     code: str,
     state: str,
-    db: Session = Depends(get_db),
-    background_tasks: BackgroundTasks = BackgroundTasks()
+    db: AsyncSession = Depends(get_db),
+    background_tasks: BackgroundTasks = BackgroundTasks(),
+    client: httpx.AsyncClient = Depends(http_client("whoop"))
 ):
     """Handle WHOOP OAuth callback"""
     
@@ -62,60 +65,59 @@ async def whoop_oauth_callback(
     
     try:
         # Exchange code for tokens
-        async with httpx.AsyncClient() as client:
-            token_response = await client.post(
-                f"{settings.WHOOP_BASE_URL}/oauth/token",
-                data={
-                    "grant_type": "authorization_code",
-                    "client_id": settings.WHOOP_CLIENT_ID,
-                    "client_secret": settings.WHOOP_CLIENT_SECRET,
-                    "code": code,
-                    "redirect_uri": settings.WHOOP_REDIRECT_URI
-                },
-                headers={"Content-Type": "application/x-www-form-urlencoded"}
-            )
-            
-            if token_response.status_code != 200:
-                logger.error(f"WHOOP token exchange failed: {token_response.text}")
-                raise HTTPException(status_code=400, detail="Failed to exchange code for tokens")
-            
-            tokens = token_response.json()
-            
-            # Get user profile to store user mapping
-            user_response = await client.get(
-                f"{settings.WHOOP_BASE_URL}/developer/v1/user/profile/basic",
-                headers={"Authorization": f"Bearer {tokens['access_token']}"}
-            )
-            
-            if user_response.status_code != 200:
-                logger.error(f"WHOOP profile fetch failed: {user_response.text}")
-                raise HTTPException(status_code=400, detail="Failed to fetch user profile")
-            
-            user_profile = user_response.json()
-            
-            # Store tokens in database (you'll need to create this table)
-            # For now, we'll just log success
-            logger.info(f"WHOOP connected for user {user_profile.get('user_id')}")
-            
-            # Schedule background task to fetch initial data
-            background_tasks.add_task(fetch_initial_whoop_data, tokens['access_token'])
-            
-            # Redirect to frontend with success
-            return RedirectResponse(url="http://localhost:3000/?whoop=connected")
+        token_response = await client.post(
+            "/oauth/token",
+            data={
+                "grant_type": "authorization_code",
+                "client_id": settings.WHOOP_CLIENT_ID,
+                "client_secret": settings.WHOOP_CLIENT_SECRET,
+                "code": code,
+                "redirect_uri": settings.WHOOP_REDIRECT_URI
+            },
+            headers={"Content-Type": "application/x-www-form-urlencoded"}
+        )
+        
+        if token_response.status_code != 200:
+            logger.error(f"WHOOP token exchange failed: {token_response.text}")
+            raise HTTPException(status_code=400, detail="Failed to exchange code for tokens")
+        
+        tokens = token_response.json()
+        
+        # Get user profile to store user mapping
+        user_response = await client.get(
+            "/developer/v1/user/profile/basic",
+            headers={"Authorization": f"Bearer {tokens['access_token']}"}
+        )
+        
+        if user_response.status_code != 200:
+            logger.error(f"WHOOP profile fetch failed: {user_response.text}")
+            raise HTTPException(status_code=400, detail="Failed to fetch user profile")
+        
+        user_profile = user_response.json()
+        
+        # Store tokens in database (you'll need to create this table)
+        # For now, we'll just log success
+        logger.info(f"WHOOP connected for user {user_profile.get('user_id')}")
+        
+        # Schedule background task to fetch initial data
+        background_tasks.add_task(fetch_initial_whoop_data, tokens['access_token'], client)
+        
+        # Redirect to frontend with success
+        return RedirectResponse(url="http://localhost:3000/?whoop=connected")
     
     except Exception as e:
         logger.error(f"WHOOP OAuth callback error: {str(e)}")
         return RedirectResponse(url="http://localhost:3000/?whoop=error")
 
 @router.post("/disconnect")
-async def disconnect_whoop(db: Session = Depends(get_db)):
+async def disconnect_whoop(db: AsyncSession = Depends(get_db)):
     """Disconnect WHOOP integration"""
     # TODO: Remove tokens from database
     # TODO: Revoke tokens with WHOOP if possible
     return {"message": "WHOOP disconnected successfully"}
 
 @router.get("/status")
-async def whoop_status(db: Session = Depends(get_db)):
+async def whoop_status(db: AsyncSession = Depends(get_db)):
     """Check WHOOP connection status"""
     # TODO: Check if user has valid WHOOP tokens
     # For now, return mock status
@@ -126,7 +128,7 @@ async def whoop_status(db: Session = Depends(get_db)):
     }
 
 @router.get("/health")
-async def get_health_data(db: Session = Depends(get_db)):
+async def get_health_data(db: AsyncSession = Depends(get_db)):
     """Get latest health data from WHOOP"""
     # TODO: Fetch from database or WHOOP API
     # For now, return mock data
@@ -141,33 +143,37 @@ async def get_health_data(db: Session = Depends(get_db)):
         "whoop_connected": False
     }
 
-async def fetch_initial_whoop_data(access_token: str):
-    """Background task to fetch initial WHOOP data"""
+async def fetch_initial_whoop_data(access_token: str, client: httpx.AsyncClient):
+    """Background task to fetch initial WHOOP data.
+
+    The records are queued like webhooks, so scripts.ingest_whoop stores
+    them; the task uses its own session (the request's is closed by now).
+    """
     try:
-        async with httpx.AsyncClient() as client:
-            # Fetch recovery data
-            recovery_response = await client.get(
-                f"{settings.WHOOP_BASE_URL}/developer/v1/recovery",
-                headers={"Authorization": f"Bearer {access_token}"},
-                params={"limit": 7}  # Last 7 days
-            )
-            
-            if recovery_response.status_code == 200:
-                recovery_data = recovery_response.json()
-                logger.info(f"Fetched {len(recovery_data.get('records', []))} recovery records")
-                # TODO: Store in database
-            
-            # Fetch sleep data
-            sleep_response = await client.get(
-                f"{settings.WHOOP_BASE_URL}/developer/v1/activity/sleep",
+        payloads = []
+        for path, event_type in (
+            ("/developer/v1/recovery", "recovery.updated"),  # Last 7 days of each
+            ("/developer/v1/activity/sleep", "sleep.updated"),
+        ):
+            response = await client.get(
+                path,
                 headers={"Authorization": f"Bearer {access_token}"},
                 params={"limit": 7}
             )
-            
-            if sleep_response.status_code == 200:
-                sleep_data = sleep_response.json()
-                logger.info(f"Fetched {len(sleep_data.get('records', []))} sleep records")
-                # TODO: Store in database
+            if response.status_code != 200:
+                logger.warning(f"WHOOP {path} fetch failed: {response.status_code}")
+                continue
+            records = response.json().get("records", [])
+            logger.info(f"Fetched {len(records)} {event_type.split('.')[0]} records")
+            payloads += [
+                # scores (recovery_score, sleep_efficiency...) next to the ids, like webhook data
+                {"type": event_type, "user_id": record.get("user_id"), "data": {**(record.get("score") or {}), **record}}
+                for record in records
+            ]
+        
+        if payloads:
+            async with AsyncSessionLocal() as db:
+                await enqueue_whoop_webhooks(db, payloads)
                 
     except Exception as e:
         logger.error(f"Failed to fetch initial WHOOP data: {str(e)}")
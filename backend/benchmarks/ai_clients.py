@@ -0,0 +1,105 @@
+# backend/benchmarks/ai_clients.py
+"""
+Sequential chat latency with a new OpenAI/Anthropic client per request (the
+old AIRoutingService.__init__) vs the process-wide pooled clients, against
+the local fake providers over HTTPS, so every new client pays a TCP + TLS
+handshake that the pooled keep-alive connections skip.
+
+    python -m benchmarks.ai_clients --turns 30
+    python -m benchmarks.ai_clients --no-tls
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import tempfile
+import time
+
+from benchmarks.fake_providers import serve_fake_providers
+
+
+def summarize(name, samples):
+    return (
+        f"{name:<28} n={len(samples):<4} p50={statistics.median(samples) * 1000:7.1f}ms "
+        f"mean={statistics.mean(samples) * 1000:7.1f}ms max={max(samples) * 1000:7.1f}ms"
+    )
+
+
+async def main(args):
+    os.environ.setdefault("DEBUG", "false")
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'ai.db')}"
+    os.environ["CACHE_BACKEND"] = "memory"
+    os.environ["CHAOS_COUNTERS_ENABLED"] = "false"
+
+    import anthropic
+    import openai
+    from anthropic import AsyncAnthropic
+    from openai import AsyncOpenAI
+    from core.ai_clients import create_ai_http_client
+    from core.database import AsyncSessionLocal, Base, engine
+    from models.database import User
+    from services.ai_routing import AIRoutingService
+
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    async with AsyncSessionLocal() as db:
+        user = User(username="bench", email="bench@bench.local", hashed_password="x")
+        db.add(user)
+        await db.commit()
+        user_id = user.id
+
+    delays = dict(first_token_delay=args.provider_latency, claude_token_delay=0, chatgpt_token_delay=0)
+    async with serve_fake_providers(tls=args.tls, **delays) as fake:
+
+        async def per_request_turn():
+            # what every chat request used to do: fresh clients, fresh pools
+            openai_client = AsyncOpenAI(api_key="fake", base_url=f"{fake.url}/v1",
+                                        http_client=openai.DefaultAsyncHttpxClient(verify=fake.verify))
+            anthropic_client = AsyncAnthropic(api_key="fake", base_url=fake.url,
+                                              http_client=anthropic.DefaultAsyncHttpxClient(verify=fake.verify))
+            try:
+                async with AsyncSessionLocal() as db:
+                    service = AIRoutingService(db, user_id, openai_client, anthropic_client)
+                    await service.process_message(args.message, bypass_cache=True)
+            finally:
+                await openai_client.close()
+                await anthropic_client.close()
+
+        pooled_openai = AsyncOpenAI(api_key="fake", base_url=f"{fake.url}/v1",
+                                    http_client=create_ai_http_client(openai, verify=fake.verify))
+        pooled_anthropic = AsyncAnthropic(api_key="fake", base_url=fake.url,
+                                          http_client=create_ai_http_client(anthropic, verify=fake.verify))
+
+        async def pooled_turn():
+            async with AsyncSessionLocal() as db:
+                service = AIRoutingService(db, user_id, pooled_openai, pooled_anthropic)
+                await service.process_message(args.message, bypass_cache=True)
+
+        results = {}
+        for label, turn in (("per-request clients", per_request_turn), ("pooled clients", pooled_turn)):
+            await turn()  # warm up imports, DB and (for pooled) the connections
+            samples = []
+            for _ in range(args.turns):
+                start = time.perf_counter()
+                await turn()
+                samples.append(time.perf_counter() - start)
+            results[label] = samples
+
+        await pooled_openai.close()
+        await pooled_anthropic.close()
+
+    print(f"{'https' if args.tls else 'http'} message={args.message!r} provider_latency={args.provider_latency}s")
+    for label, samples in results.items():
+        print(summarize(label, samples))
+    saved = statistics.mean(results["per-request clients"]) - statistics.mean(results["pooled clients"])
+    print(f"saved per turn: {saved * 1000:.1f}ms")
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--message", default="@all what should I focus on next?")
+    parser.add_argument("--turns", type=int, default=30)
+    parser.add_argument("--provider-latency", type=float, default=0.02)
+    parser.add_argument("--no-tls", dest="tls", action="store_false")
+    asyncio.run(main(parser.parse_args()))
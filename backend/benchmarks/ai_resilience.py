@@ -0,0 +1,105 @@
+# backend/benchmarks/ai_resilience.py
+"""
+Deadlines, circuit breakers and hedging in AIRoutingService against the local
+fake providers with injected stalls and errors.
+
+  slow claude     - Claude stalls on every call; an un-mentioned technical
+                    message goes to Claude. Deadline + breaker vs neither.
+  failing claude  - Claude returns HTTP 500 (the SDK retries with backoff).
+                    With the breaker open, un-mentioned messages fall back
+                    to ChatGPT instead of waiting out the retries.
+  tail latency    - both providers stall on 20% of calls; single-provider
+                    routing vs hedged (first good answer wins).
+
+    python -m benchmarks.ai_resilience --turns 20
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import tempfile
+import time
+
+from benchmarks.fake_providers import serve_fake_providers
+
+TECHNICAL = "debug this python error in the api"
+GENERAL = "what should I focus on this afternoon"
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+async def main(args):
+    os.environ.setdefault("DEBUG", "false")
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'ai.db')}"
+    os.environ["CACHE_BACKEND"] = "memory"
+    os.environ["CHAOS_COUNTERS_ENABLED"] = "false"
+
+    from anthropic import AsyncAnthropic
+    from openai import AsyncOpenAI
+    from core import circuit_breaker
+    from core.config import settings
+    from core.database import AsyncSessionLocal, Base, engine
+    from models.database import User
+    from services.ai_routing import AIRoutingService
+
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    async with AsyncSessionLocal() as db:
+        user = User(username="bench", email="bench@bench.local", hashed_password="x")
+        db.add(user)
+        await db.commit()
+        user_id = user.id
+
+    async def run(label, provider_faults, message, deadline, breaker, hedge):
+        settings.AI_PROVIDER_DEADLINE = deadline
+        settings.CIRCUIT_BREAKER_FAILURE_THRESHOLD = 3 if breaker else 10 ** 9
+        circuit_breaker._breakers.clear()
+        delays = dict(first_token_delay=0.05, claude_token_delay=0, chatgpt_token_delay=0, **provider_faults)
+
+        async with serve_fake_providers(**delays) as fake:
+            openai_client = AsyncOpenAI(api_key="fake", base_url=f"{fake.url}/v1")
+            anthropic_client = AsyncAnthropic(api_key="fake", base_url=fake.url)
+            latencies, answered, by_ai = [], 0, {}
+            for _ in range(args.turns):
+                async with AsyncSessionLocal() as db:
+                    service = AIRoutingService(db, user_id, openai_client, anthropic_client)
+                    start = time.perf_counter()
+                    result = await service.process_message(message, bypass_cache=True, hedge=hedge)
+                    latencies.append(time.perf_counter() - start)
+                for response in result["responses"]:
+                    if not response.get("error"):
+                        answered += 1
+                        by_ai[response["ai"]] = by_ai.get(response["ai"], 0) + 1
+            await openai_client.close()
+            await anthropic_client.close()
+
+        print(
+            f"  {label:<34} p50={statistics.median(latencies) * 1000:7.0f}ms "
+            f"p99={percentile(latencies, 99) * 1000:7.0f}ms answered={answered}/{args.turns} {by_ai}"
+        )
+
+    print(f"turns={args.turns}")
+    print("slow claude (3s stall):")
+    slow = dict(claude_stall_rate=1.0, stall_delay=3.0)
+    await run("no deadline, no breaker", slow, TECHNICAL, 60, False, False)
+    await run("1s deadline + breaker", slow, TECHNICAL, 1.0, True, False)
+
+    print("failing claude (HTTP 500):")
+    failing = dict(claude_error_rate=1.0)
+    await run("no breaker", failing, TECHNICAL, 60, False, False)
+    await run("breaker", failing, TECHNICAL, 60, True, False)
+
+    print("tail latency (20% of calls stall 1.5s):")
+    tail = dict(claude_stall_rate=0.2, chatgpt_stall_rate=0.2, stall_delay=1.5)
+    await run("single provider", tail, GENERAL, 60, True, False)
+    await run("hedged", tail, GENERAL, 60, True, True)
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--turns", type=int, default=20)
+    asyncio.run(main(parser.parse_args()))
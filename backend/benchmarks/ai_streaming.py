@@ -0,0 +1,95 @@
+# backend/benchmarks/ai_streaming.py
+"""
+Time-to-first-token of streaming chat vs the blocking process_message, against
+the local fake providers (no API keys or network needed).
+
+For "@all" the blocking path returns once the slower provider has finished;
+the streaming path shows the first token as soon as either provider sends one.
+
+    python -m benchmarks.ai_streaming --rounds 10
+    python -m benchmarks.ai_streaming --first-token-delay 0.5 --claude-token-delay 0.05
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import tempfile
+import time
+
+from benchmarks.fake_providers import serve_fake_providers
+
+
+def summarize(name, samples):
+    return f"{name:<36} p50={statistics.median(samples) * 1000:8.1f}ms max={max(samples) * 1000:8.1f}ms"
+
+
+async def main(args):
+    os.environ.setdefault("DEBUG", "false")
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'ai.db')}"
+    os.environ["CACHE_BACKEND"] = "memory"
+    os.environ["CHAOS_COUNTERS_ENABLED"] = "false"
+
+    from anthropic import AsyncAnthropic
+    from openai import AsyncOpenAI
+    from core.database import AsyncSessionLocal, Base, engine
+    from models.database import User
+    from services.ai_routing import AIRoutingService
+
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    async with AsyncSessionLocal() as db:
+        user = User(username="bench", email="bench@bench.local", hashed_password="x")
+        db.add(user)
+        await db.commit()
+        user_id = user.id
+
+    delays = dict(
+        first_token_delay=args.first_token_delay,
+        claude_token_delay=args.claude_token_delay,
+        chatgpt_token_delay=args.chatgpt_token_delay,
+    )
+    async with serve_fake_providers(**delays) as fake:
+        openai_client = AsyncOpenAI(api_key="fake", base_url=f"{fake.url}/v1")
+        anthropic_client = AsyncAnthropic(api_key="fake", base_url=fake.url)
+
+        def service(db):
+            return AIRoutingService(db, user_id, openai_client, anthropic_client)
+
+        blocking, first_token, first_per_ai, stream_total = [], [], {"claude": [], "chatgpt": []}, []
+        for _ in range(args.rounds):
+            async with AsyncSessionLocal() as db:
+                start = time.perf_counter()
+                await service(db).process_message(args.message, bypass_cache=True)
+                blocking.append(time.perf_counter() - start)
+
+            async with AsyncSessionLocal() as db:
+                start, seen = time.perf_counter(), set()
+                async for event in service(db).stream_message(args.message, bypass_cache=True):
+                    if event["event"] == "delta" and event["ai"] not in seen:
+                        seen.add(event["ai"])
+                        first_per_ai[event["ai"]].append(time.perf_counter() - start)
+                        if len(seen) == 1:
+                            first_token.append(time.perf_counter() - start)
+                stream_total.append(time.perf_counter() - start)
+
+        await openai_client.close()
+        await anthropic_client.close()
+
+    print(f"message={args.message!r} rounds={args.rounds} {delays}")
+    print(summarize("blocking: full response", blocking))
+    print(summarize("streaming: first token (any AI)", first_token))
+    for ai, samples in first_per_ai.items():
+        if samples:
+            print(summarize(f"streaming: first token ({ai})", samples))
+    print(summarize("streaming: stored turn", stream_total))
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--message", default="@all what should I focus on next?")
+    parser.add_argument("--rounds", type=int, default=10)
+    parser.add_argument("--first-token-delay", type=float, default=0.3)
+    parser.add_argument("--claude-token-delay", type=float, default=0.02)
+    parser.add_argument("--chatgpt-token-delay", type=float, default=0.01)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,112 @@
+# backend/benchmarks/chaos_batch.py
+"""
+Batch chaos sweep vs per-user ChaosDetectionService at 10k and 100k users.
+
+Seeds a SQLite file (or --database-url) with synthetic users, roughly a third
+of them active in the window, then times:
+  * classification only: per-user _determine_chaos_level vs classify_levels
+  * full sweep: BatchChaosEvaluator.evaluate() vs the per-user aggregate query
+    (measured on --per-user-sample users and extrapolated)
+
+    python -m benchmarks.chaos_batch --users 10000 100000
+"""
+import argparse
+import asyncio
+import os
+import random
+import tempfile
+import time
+import uuid
+
+
+async def seed(engine, users):
+    from sqlalchemy import insert
+    from models.database import Idea, Task, User
+    from services.urgency import get_urgency_matcher
+
+    rng = random.Random(users)
+    matcher = get_urgency_matcher()
+    user_rows, task_rows, idea_rows = [], [], []
+    for i in range(users):
+        user_id = uuid.uuid4()
+        user_rows.append({"id": user_id, "username": f"u{i}", "email": f"u{i}@bench.local", "hashed_password": "x"})
+        if rng.random() < 0.33:
+            for _ in range(rng.randint(1, 6)):
+                title = rng.choice(["plan trip", "urgent fix", "need to call", "write draft"])
+                task_rows.append({"id": uuid.uuid4(), "title": title, "user_id": user_id, "urgency_score": matcher.count(title)})
+            for _ in range(rng.randint(0, 4)):
+                idea_rows.append({"id": uuid.uuid4(), "title": "idea asap", "user_id": user_id, "urgency_score": 1})
+
+    async with engine.begin() as conn:
+        for table, rows in ((User, user_rows), (Task, task_rows), (Idea, idea_rows)):
+            for start in range(0, len(rows), 5000):
+                await conn.execute(insert(table), rows[start:start + 5000])
+    return len(task_rows), len(idea_rows)
+
+
+async def run_size(users, args):
+    url = args.database_url or f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'batch.db')}"
+    from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+    from core.database import Base, get_async_database_url
+    from services.chaos_batch import BatchChaosEvaluator, classify_levels
+    from services.chaos_detection import ChaosDetectionService
+
+    engine = create_async_engine(get_async_database_url(url))
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.drop_all)
+        await conn.run_sync(Base.metadata.create_all)
+    tasks, ideas = await seed(engine, users)
+    sessions = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+    print(f"\nusers={users} tasks={tasks} ideas={ideas}")
+
+    async with sessions() as db:
+        evaluator = BatchChaosEvaluator(db)
+
+        start = time.perf_counter()
+        metrics = await evaluator.compute_metrics()
+        aggregate_s = time.perf_counter() - start
+
+        per_user = ChaosDetectionService(db, None)
+        start = time.perf_counter()
+        for i in range(len(metrics)):
+            await per_user._determine_chaos_level({
+                "capture_velocity": metrics.capture_velocity[i],
+                "task_switches": metrics.task_switches[i],
+                "urgency_keywords": metrics.urgency_keywords[i],
+                "completion_ratio": metrics.completion_ratio[i],
+            })
+        dict_s = time.perf_counter() - start
+
+        start = time.perf_counter()
+        classify_levels(metrics)
+        numpy_s = time.perf_counter() - start
+        print(f"  classify   per-user dicts {dict_s * 1000:9.1f}ms   numpy {numpy_s * 1000:7.2f}ms  ({dict_s / numpy_s:.0f}x)")
+
+        start = time.perf_counter()
+        levels = await evaluator.evaluate(persist=True)
+        sweep_s = time.perf_counter() - start
+
+        sample = metrics.user_ids[: args.per_user_sample].tolist()
+        start = time.perf_counter()
+        for user_id in sample:
+            await ChaosDetectionService(db, user_id)._aggregate_window_counts()
+        per_user_s = (time.perf_counter() - start) / len(sample) * users
+
+    print(f"  grouped aggregates {aggregate_s * 1000:9.1f}ms")
+    print(f"  full sweep (aggregate + classify + bulk insert) {sweep_s * 1000:9.1f}ms  {levels}")
+    print(f"  per-user queries (extrapolated from {len(sample)}) {per_user_s * 1000:9.1f}ms  ({per_user_s / sweep_s:.0f}x)")
+    await engine.dispose()
+
+
+async def main(args):
+    os.environ.setdefault("DEBUG", "false")
+    for users in args.users:
+        await run_size(users, args)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, nargs="+", default=[10000, 100000])
+    parser.add_argument("--per-user-sample", type=int, default=500)
+    parser.add_argument("--database-url", default=None)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,147 @@
+# backend/benchmarks/chaos_db_concurrency.py
+"""
+p99 latency of concurrent chaos checks: blocking Session vs AsyncSession.
+
+"before" runs the old query pattern (sync Session inside async handlers),
+"after" runs ChaosDetectionService on the AsyncSession. Alongside the chaos
+calls a cheap "ping" coroutine measures how long the event loop is stalled,
+which is what every other request on the worker experiences.
+
+The default SQLite file only shows the loop-lag side (aiosqlite funnels every
+connection through a thread); point --database-url at Postgres for chaos p99.
+
+    python -m benchmarks.chaos_db_concurrency --concurrency 50 --rounds 20
+    python -m benchmarks.chaos_db_concurrency --database-url postgresql://...
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import and_, create_engine, func, select
+from sqlalchemy.orm import sessionmaker
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def summarize(name, samples):
+    return (
+        f"{name:<32} n={len(samples):<5} "
+        f"p50={statistics.median(samples):8.2f}ms "
+        f"p99={percentile(samples, 99):8.2f}ms "
+        f"max={max(samples):8.2f}ms"
+    )
+
+
+async def run_load(chaos_call, concurrency, rounds):
+    """Fire `concurrency` chaos checks per round while pinging the loop every 1ms"""
+    chaos_latencies, ping_latencies = [], []
+    done = asyncio.Event()
+
+    async def pinger():
+        while not done.is_set():
+            start = time.perf_counter()
+            await asyncio.sleep(0.001)
+            ping_latencies.append((time.perf_counter() - start) * 1000 - 1)
+
+    async def timed_call(arrived):
+        # measured from arrival, so time spent queued behind a blocked loop counts
+        await chaos_call()
+        chaos_latencies.append((time.perf_counter() - arrived) * 1000)
+
+    ping_task = asyncio.create_task(pinger())
+    for _ in range(rounds):
+        arrived = time.perf_counter()
+        await asyncio.gather(*(timed_call(arrived) for _ in range(concurrency)))
+    done.set()
+    await ping_task
+    return chaos_latencies, ping_latencies
+
+
+def make_blocking_chaos_call(sync_session_factory, user_id, window_start, today_start):
+    """The pre-async query pattern: six blocking COUNTs issued from a coroutine"""
+    from models.database import Idea, Task
+
+    def count(db, model, *criteria):
+        return db.execute(
+            select(func.count()).select_from(model).where(and_(model.user_id == user_id, *criteria))
+        ).scalar_one()
+
+    async def chaos_call():
+        db = sync_session_factory()
+        try:
+            count(db, Idea, Idea.created_at >= window_start)
+            count(db, Task, Task.created_at >= window_start)
+            count(db, Task, Task.updated_at >= window_start)
+            db.execute(select(Task.title, Task.description).where(
+                and_(Task.user_id == user_id, Task.updated_at >= window_start)
+            )).all()
+            count(db, Task, Task.completed_at >= today_start)
+            count(db, Task, Task.created_at >= today_start)
+        finally:
+            db.close()
+
+    return chaos_call
+
+
+async def main(args):
+    os.environ.setdefault("DEBUG", "false")
+    if not args.database_url:
+        args.database_url = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'bench.db')}"
+    os.environ["DATABASE_URL"] = args.database_url
+
+    from core.database import AsyncSessionLocal, Base, engine
+    from models.database import Idea, Task, User
+    from services.chaos_detection import ChaosDetectionService
+
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+
+    async with AsyncSessionLocal() as db:
+        user = User(username=f"bench-{time.time_ns()}", email=f"{time.time_ns()}@bench.local", hashed_password="x")
+        db.add(user)
+        await db.commit()
+        db.add_all(
+            [Task(title=f"task {i} urgent", description="need to ship", user_id=user.id) for i in range(args.rows)]
+            + [Idea(title=f"idea {i}", user_id=user.id) for i in range(args.rows)]
+        )
+        await db.commit()
+        user_id = user.id
+
+    now = datetime.utcnow()
+    window_start = now - timedelta(minutes=10)
+    today_start = now.replace(hour=0, minute=0, second=0, microsecond=0)
+
+    sync_engine = create_engine(args.database_url)
+    blocking_call = make_blocking_chaos_call(sessionmaker(bind=sync_engine), user_id, window_start, today_start)
+
+    async def async_call():
+        async with AsyncSessionLocal() as db:
+            service = ChaosDetectionService(db, user_id)
+            await service._calculate_metrics()
+
+    print(f"database={engine.url.render_as_string(hide_password=True)} rows={args.rows} "
+          f"concurrency={args.concurrency} rounds={args.rounds}")
+    for label, call in (("before (sync Session)", blocking_call), ("after (AsyncSession)", async_call)):
+        chaos, ping = await run_load(call, args.concurrency, args.rounds)
+        print(summarize(f"{label} chaos", chaos))
+        print(summarize(f"{label} loop lag", ping or [0.0]))
+
+    sync_engine.dispose()
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database-url", default=None)
+    parser.add_argument("--rows", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--rounds", type=int, default=10)
+    asyncio.run(main(parser.parse_args()))
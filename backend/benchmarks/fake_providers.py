@@ -0,0 +1,225 @@
+# backend/benchmarks/fake_providers.py
+"""
+Local stand-ins for the OpenAI chat completions and Anthropic messages APIs,
+streaming and non-streaming, with configurable latency, stalls and injected
+errors (HTTP 500) per provider. JSON-mode chat completions answer idea
+enrichment requests (services.idea_enrichment). GET /data/3.0/onecall
+stands in for OpenWeather's One Call API (OPENWEATHER_BASE_URL =
+f"{fake.url}/data/3.0"), with `weather_temp` as the current temperature.
+Point the SDK clients
+at it with base_url=f"{fake.url}/v1" (OpenAI) and base_url=fake.url
+(Anthropic); with tls=True it serves HTTPS with a throwaway self-signed
+certificate, trusted through fake.verify.
+
+    async with serve_fake_providers(claude_token_delay=0.02) as fake:
+        ...
+"""
+import asyncio
+import datetime
+import json
+import os
+import random
+import socket
+import ssl
+import tempfile
+from contextlib import asynccontextmanager
+from types import SimpleNamespace
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+REPLY = "Here is a focused next step for your current MIT, broken into small pieces you can start now."
+
+
+def create_app(
+    first_token_delay: float = 0.3,
+    claude_token_delay: float = 0.02,
+    chatgpt_token_delay: float = 0.01,
+    claude_error_rate: float = 0.0,
+    chatgpt_error_rate: float = 0.0,
+    claude_stall_rate: float = 0.0,
+    chatgpt_stall_rate: float = 0.0,
+    stall_delay: float = 2.0,
+    weather_delay: float = 0.1,
+    weather_temp: float = 68.0,
+    seed: int = 0,
+) -> FastAPI:
+    app = FastAPI()
+    tokens = REPLY.split(" ")
+    tokens = [token + " " for token in tokens[:-1]] + tokens[-1:]
+    app.state.requests = 0
+    rng = random.Random(seed)
+    error_rates = {"claude": claude_error_rate, "chatgpt": chatgpt_error_rate}
+    stall_rates = {"claude": claude_stall_rate, "chatgpt": chatgpt_stall_rate}
+
+    async def misbehave(provider):
+        """An error response to return instead of answering, after an optional stall"""
+        if rng.random() < stall_rates[provider]:
+            await asyncio.sleep(stall_delay)
+        if rng.random() < error_rates[provider]:
+            return JSONResponse({"error": {"type": "api_error", "message": "injected failure"}}, status_code=500)
+        return None
+
+    def enrichment(ideas):
+        """Answer to an idea enrichment request (a JSON list of ideas)"""
+        return json.dumps({"ideas": [
+            {"id": idea["id"], "keywords": idea["title"].lower().split()[:3], "summary": idea["title"],
+             "category": "other", "next_step": f"Spend ten minutes on {idea['title']}"}
+            for idea in ideas
+        ]})
+
+    def sse(data, event=None):
+        prefix = f"event: {event}\n" if event else ""
+        return f"{prefix}data: {json.dumps(data)}\n\n"
+
+    async def chatgpt_chunks():
+        await asyncio.sleep(first_token_delay)
+        for token in tokens:
+            yield sse({"id": "fake", "object": "chat.completion.chunk", "created": 0, "model": "fake",
+                       "choices": [{"index": 0, "delta": {"content": token}, "finish_reason": None}]})
+            await asyncio.sleep(chatgpt_token_delay)
+        yield sse({"id": "fake", "object": "chat.completion.chunk", "created": 0, "model": "fake", "choices": [],
+                   "usage": {"prompt_tokens": 50, "completion_tokens": len(tokens), "total_tokens": 50 + len(tokens)}})
+        yield "data: [DONE]\n\n"
+
+    async def claude_events():
+        await asyncio.sleep(first_token_delay)
+        yield sse({"type": "message_start", "message": {
+            "id": "fake", "type": "message", "role": "assistant", "content": [], "model": "fake",
+            "stop_reason": None, "stop_sequence": None, "usage": {"input_tokens": 50, "output_tokens": 0}}},
+            "message_start")
+        yield sse({"type": "content_block_start", "index": 0, "content_block": {"type": "text", "text": ""}},
+                  "content_block_start")
+        for token in tokens:
+            yield sse({"type": "content_block_delta", "index": 0, "delta": {"type": "text_delta", "text": token}},
+                      "content_block_delta")
+            await asyncio.sleep(claude_token_delay)
+        yield sse({"type": "content_block_stop", "index": 0}, "content_block_stop")
+        yield sse({"type": "message_delta", "delta": {"stop_reason": "end_turn", "stop_sequence": None},
+                   "usage": {"output_tokens": len(tokens)}}, "message_delta")
+        yield sse({"type": "message_stop"}, "message_stop")
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        app.state.requests += 1
+        body = await request.json()
+        error = await misbehave("chatgpt")
+        if error is not None:
+            return error
+        if body.get("stream"):
+            return StreamingResponse(chatgpt_chunks(), media_type="text/event-stream")
+        await asyncio.sleep(first_token_delay + chatgpt_token_delay * len(tokens))
+        reply = REPLY
+        if body.get("response_format", {}).get("type") == "json_object":
+            reply = enrichment(json.loads(body["messages"][-1]["content"]))
+        return JSONResponse({
+            "id": "fake", "object": "chat.completion", "created": 0, "model": "fake",
+            "choices": [{"index": 0, "finish_reason": "stop", "message": {"role": "assistant", "content": reply}}],
+            "usage": {"prompt_tokens": 50, "completion_tokens": len(tokens), "total_tokens": 50 + len(tokens)},
+        })
+
+    @app.post("/v1/messages")
+    async def messages(request: Request):
+        app.state.requests += 1
+        body = await request.json()
+        error = await misbehave("claude")
+        if error is not None:
+            return error
+        if body.get("stream"):
+            return StreamingResponse(claude_events(), media_type="text/event-stream")
+        await asyncio.sleep(first_token_delay + claude_token_delay * len(tokens))
+        return JSONResponse({
+            "id": "fake", "type": "message", "role": "assistant", "model": "fake",
+            "content": [{"type": "text", "text": REPLY}], "stop_reason": "end_turn", "stop_sequence": None,
+            "usage": {"input_tokens": 50, "output_tokens": len(tokens)},
+        })
+
+    @app.get("/data/3.0/onecall")
+    async def one_call(lat: float, lon: float, appid: str, exclude: str = "", units: str = "standard"):
+        app.state.requests += 1
+        await asyncio.sleep(weather_delay)
+        now = int(datetime.datetime.now(datetime.timezone.utc).timestamp())
+        clear = [{"id": 800, "main": "Clear", "description": "clear sky", "icon": "01d"}]
+        return JSONResponse({
+            "lat": lat, "lon": lon, "timezone": "UTC", "timezone_offset": 0,
+            "current": {
+                "dt": now, "sunrise": now - 6 * 3600, "sunset": now + 6 * 3600, "temp": weather_temp,
+                "feels_like": weather_temp, "pressure": 1015, "humidity": 50, "dew_point": 50.0, "uvi": 4.2,
+                "clouds": 0, "visibility": 10000, "wind_speed": 5.0, "wind_deg": 180, "weather": clear,
+            },
+            "hourly": [
+                {"dt": now + hour * 3600, "temp": weather_temp + hour % 5, "pop": 0.1, "weather": clear}
+                for hour in range(48)
+            ],
+            "daily": [
+                {"dt": now + day * 86400, "temp": {"min": weather_temp - 8, "max": weather_temp + 6},
+                 "pop": 0.2, "weather": clear}
+                for day in range(8)
+            ],
+        })
+
+    return app
+
+
+def write_self_signed_cert(directory: str):
+    """Throwaway certificate for 127.0.0.1; returns (certfile, keyfile)"""
+    import ipaddress
+    from cryptography import x509
+    from cryptography.hazmat.primitives import hashes, serialization
+    from cryptography.hazmat.primitives.asymmetric import ec
+    from cryptography.x509.oid import NameOID
+
+    key = ec.generate_private_key(ec.SECP256R1())
+    name = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, "127.0.0.1")])
+    now = datetime.datetime.now(datetime.timezone.utc)
+    cert = (
+        x509.CertificateBuilder()
+        .subject_name(name)
+        .issuer_name(name)
+        .public_key(key.public_key())
+        .serial_number(x509.random_serial_number())
+        .not_valid_before(now - datetime.timedelta(minutes=5))
+        .not_valid_after(now + datetime.timedelta(days=1))
+        .add_extension(x509.SubjectAlternativeName([x509.IPAddress(ipaddress.ip_address("127.0.0.1"))]), critical=False)
+        .add_extension(x509.BasicConstraints(ca=True, path_length=None), critical=True)
+        .sign(key, hashes.SHA256())
+    )
+    certfile, keyfile = os.path.join(directory, "cert.pem"), os.path.join(directory, "key.pem")
+    with open(certfile, "wb") as f:
+        f.write(cert.public_bytes(serialization.Encoding.PEM))
+    with open(keyfile, "wb") as f:
+        f.write(key.private_bytes(
+            serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8, serialization.NoEncryption()
+        ))
+    return certfile, keyfile
+
+
+@asynccontextmanager
+async def serve_fake_providers(tls: bool = False, **delays):
+    """Run the fake providers on a free local port for the duration of the block.
+
+    Yields a namespace with `url`, `verify` (the httpx verify argument that
+    trusts the server) and `app` (app.state.requests counts calls).
+    """
+    with socket.socket() as probe:
+        probe.bind(("127.0.0.1", 0))
+        port = probe.getsockname()[1]
+
+    app = create_app(**delays)
+    config = dict(host="127.0.0.1", port=port, log_level="warning")
+    verify = True
+    if tls:
+        certfile, keyfile = write_self_signed_cert(tempfile.mkdtemp())
+        config.update(ssl_certfile=certfile, ssl_keyfile=keyfile)
+        verify = ssl.create_default_context(cafile=certfile)
+
+    server = uvicorn.Server(uvicorn.Config(app, **config))
+    task = asyncio.create_task(server.serve())
+    while not server.started:
+        await asyncio.sleep(0.01)
+    try:
+        yield SimpleNamespace(url=f"{'https' if tls else 'http'}://127.0.0.1:{port}", verify=verify, app=app)
+    finally:
+        server.should_exit = True
+        await task
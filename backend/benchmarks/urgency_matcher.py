@@ -0,0 +1,70 @@
+# backend/benchmarks/urgency_matcher.py
+"""
+Urgency keyword counting: per-keyword re.findall vs the precompiled UrgencyMatcher.
+
+    python -m benchmarks.urgency_matcher --texts 5000 --repeat 5
+"""
+import argparse
+import random
+import re
+import time
+
+from core.config import settings
+from services.urgency import UrgencyMatcher
+
+FILLER = (
+    "refactor the sync job before the demo and write notes on the draft outline "
+    "call the vet review budget plan garden shed idea for the weekend"
+).split()
+
+
+def synthetic_texts(count, seed=42):
+    """Task/idea sized texts with a sprinkling of urgency keywords"""
+    rng = random.Random(seed)
+    keywords = settings.CHAOS_URGENCY_KEYWORDS
+    texts = []
+    for _ in range(count):
+        words = rng.choices(FILLER, k=rng.randint(4, 60))
+        for _ in range(rng.randint(0, 3)):
+            words.insert(rng.randrange(len(words) + 1), rng.choice(keywords).upper() if rng.random() < 0.2 else rng.choice(keywords))
+        texts.append(" ".join(words))
+    return texts
+
+
+def count_per_keyword(texts, keywords):
+    """The original implementation: compile and scan once per keyword per text"""
+    count = 0
+    for text in texts:
+        lower = text.lower()
+        for kw in keywords:
+            count += len(re.findall(r"\b" + re.escape(kw) + r"\b", lower))
+    return count
+
+
+def best_of(repeat, fn):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        timings.append((time.perf_counter() - start) * 1000)
+    return result, min(timings)
+
+
+def main(args):
+    texts = synthetic_texts(args.texts)
+    keywords = settings.CHAOS_URGENCY_KEYWORDS
+
+    baseline, baseline_ms = best_of(args.repeat, lambda: count_per_keyword(texts, keywords))
+    matcher = UrgencyMatcher(keywords)
+    matched, matcher_ms = best_of(args.repeat, lambda: matcher.count_all(texts))
+
+    print(f"texts={len(texts)} keywords={len(keywords)} repeat={args.repeat}")
+    print(f"per-keyword findall  count={baseline:<7} best={baseline_ms:8.2f}ms")
+    print(f"UrgencyMatcher       count={matched:<7} best={matcher_ms:8.2f}ms  ({baseline_ms / matcher_ms:.1f}x)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--texts", type=int, default=5000)
+    parser.add_argument("--repeat", type=int, default=5)
+    main(parser.parse_args())
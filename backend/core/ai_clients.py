@@ -0,0 +1,52 @@
+import anthropic
+import openai
+from anthropic import AsyncAnthropic
+from openai import AsyncOpenAI
+
+from core.config import settings
+
+_openai_client = None
+_anthropic_client = None
+
+
+def create_ai_http_client(sdk, **kwargs):
+    """The SDK's own async HTTP client with a keep-alive pool sized for concurrent chat turns.
+
+    `sdk` is the openai or anthropic module; each SDK pins its own httpx
+    flavour, so the pool limits are built from its default limits' type.
+    """
+    limits = type(sdk.DEFAULT_CONNECTION_LIMITS)(
+        max_connections=settings.AI_HTTP_MAX_CONNECTIONS,
+        max_keepalive_connections=settings.AI_HTTP_MAX_KEEPALIVE,
+        keepalive_expiry=settings.AI_HTTP_KEEPALIVE_EXPIRY,
+    )
+    timeout = sdk.Timeout(settings.AI_HTTP_TIMEOUT, connect=settings.AI_HTTP_CONNECT_TIMEOUT)
+    return sdk.DefaultAsyncHttpxClient(limits=limits, timeout=timeout, **kwargs)
+
+
+def get_openai_client() -> AsyncOpenAI:
+    """Process-wide OpenAI client (created in the app lifespan, or lazily by scripts)"""
+    global _openai_client
+    if _openai_client is None:
+        _openai_client = AsyncOpenAI(api_key=settings.OPENAI_API_KEY, http_client=create_ai_http_client(openai))
+    return _openai_client
+
+
+def get_anthropic_client() -> AsyncAnthropic:
+    """Process-wide Anthropic client (created in the app lifespan, or lazily by scripts)"""
+    global _anthropic_client
+    if _anthropic_client is None:
+        _anthropic_client = AsyncAnthropic(
+            api_key=settings.ANTHROPIC_API_KEY, http_client=create_ai_http_client(anthropic)
+        )
+    return _anthropic_client
+
+
+async def close_ai_clients():
+    global _openai_client, _anthropic_client
+    if _openai_client is not None:
+        await _openai_client.close()
+        _openai_client = None
+    if _anthropic_client is not None:
+        await _anthropic_client.close()
+        _anthropic_client = None
@@ -0,0 +1,163 @@
+import asyncio
+import heapq
+import itertools
+import math
+import time
+from contextlib import asynccontextmanager
+from typing import Any, Dict, List
+
+from core.config import settings
+
+# Queue priorities: lower runs first
+INTERACTIVE = 0  # chat a user is waiting on
+BACKGROUND = 1  # enrichment and other work nobody is watching
+
+
+class ProviderBusy(Exception):
+    """The provider's queue is full; try again after `retry_after` seconds"""
+
+    def __init__(self, name: str, retry_after: int):
+        super().__init__(f"{name} is at capacity, retry after {retry_after}s")
+        self.name = name
+        self.retry_after = retry_after
+
+
+class Slot:
+    """A granted call; set `tokens` to what the call actually used before it ends"""
+
+    def __init__(self, tokens: int):
+        self.tokens = tokens
+
+
+class ProviderScheduler:
+    """Concurrency and tokens-per-minute budget for one upstream, per process.
+
+    At most `max_concurrency` calls run at once, and each call reserves its
+    estimated tokens from a bucket refilling at `tokens_per_minute`; the
+    reservation is corrected to the real usage when the call ends. Callers
+    that cannot start wait in a priority queue (interactive before
+    background, then first come first served) of at most `max_waiting`;
+    beyond that they are rejected at once with ProviderBusy.
+    """
+
+    def __init__(self, name: str, max_concurrency: int, tokens_per_minute: int, max_waiting: int):
+        self.name = name
+        self.max_concurrency = max_concurrency
+        self.tokens_per_minute = tokens_per_minute
+        self.max_waiting = max_waiting
+        self.active = 0
+        self.tokens = float(tokens_per_minute)
+        self.refilled_at = time.monotonic()
+        self.waiting: List[tuple] = []  # heap of (priority, seq, tokens, future)
+        self.rejected = 0
+        self.avg_call_seconds = 5.0  # moving average, for Retry-After
+        self._seq = itertools.count()
+        self._timer = None
+
+    @asynccontextmanager
+    async def slot(self, priority: int, estimated_tokens: int):
+        # a single call bigger than the whole bucket would otherwise never start
+        reserved = min(estimated_tokens, self.tokens_per_minute)
+        await self._acquire(priority, reserved)
+        slot, started = Slot(reserved), time.monotonic()
+        try:
+            yield slot
+        finally:
+            self.active -= 1
+            self.tokens = min(self.tokens_per_minute, self.tokens + reserved - slot.tokens)
+            self.avg_call_seconds += 0.2 * (time.monotonic() - started - self.avg_call_seconds)
+            self._dispatch()
+
+    async def _acquire(self, priority: int, tokens: int):
+        self._refill()
+        if not self.waiting and self.active < self.max_concurrency and self.tokens >= tokens:
+            self._grant(tokens)
+            return
+        if len(self.waiting) >= self.max_waiting:
+            self.rejected += 1
+            raise ProviderBusy(self.name, self.retry_after())
+
+        future = asyncio.get_running_loop().create_future()
+        entry = (priority, next(self._seq), tokens, future)
+        heapq.heappush(self.waiting, entry)
+        self._dispatch()
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.cancelled() and entry in self.waiting:
+                self.waiting.remove(entry)
+                heapq.heapify(self.waiting)
+            elif not future.cancelled():
+                # granted just as the caller went away: hand it back
+                self.active -= 1
+                self.tokens += tokens
+            self._dispatch()
+            raise
+
+    def _grant(self, tokens: int):
+        self.active += 1
+        self.tokens -= tokens
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(
+            self.tokens_per_minute, self.tokens + (now - self.refilled_at) * self.tokens_per_minute / 60
+        )
+        self.refilled_at = now
+
+    def _dispatch(self):
+        self._refill()
+        while self.waiting and self.active < self.max_concurrency:
+            priority, seq, tokens, future = self.waiting[0]
+            if future.done():
+                heapq.heappop(self.waiting)
+                continue
+            if self.tokens < tokens:
+                # wake up once the bucket has refilled enough for the head of the queue
+                if self._timer is None:
+                    delay = (tokens - self.tokens) * 60 / self.tokens_per_minute
+                    self._timer = asyncio.get_running_loop().call_later(delay, self._on_timer)
+                return
+            heapq.heappop(self.waiting)
+            self._grant(tokens)
+            future.set_result(None)
+
+    def _on_timer(self):
+        self._timer = None
+        self._dispatch()
+
+    def retry_after(self) -> int:
+        """Seconds until the queue has likely drained enough to take another call"""
+        queue_wait = self.avg_call_seconds * (len(self.waiting) + 1) / self.max_concurrency
+        budget_wait = max(0.0, -self.tokens) * 60 / self.tokens_per_minute
+        return max(1, math.ceil(queue_wait + budget_wait))
+
+    def stats(self) -> Dict[str, Any]:
+        self._refill()
+        return {
+            "name": self.name,
+            "active": self.active,
+            "waiting": len(self.waiting),
+            "tokens_available": int(self.tokens),
+            "rejected": self.rejected,
+        }
+
+
+_schedulers: Dict[str, ProviderScheduler] = {}
+
+
+def get_scheduler(ai: str) -> ProviderScheduler:
+    """Process-wide scheduler for the "claude" or "chatgpt" provider, from the AI_* settings"""
+    if ai not in _schedulers:
+        tokens_per_minute = {
+            "claude": settings.AI_CLAUDE_TOKENS_PER_MINUTE,
+            "chatgpt": settings.AI_CHATGPT_TOKENS_PER_MINUTE,
+        }[ai]
+        _schedulers[ai] = ProviderScheduler(
+            f"ai:{ai}", settings.AI_MAX_CONCURRENT_CALLS, tokens_per_minute, settings.AI_MAX_QUEUED_CALLS
+        )
+    return _schedulers[ai]
+
+
+def scheduler_stats() -> list:
+    return [scheduler.stats() for scheduler in _schedulers.values()]
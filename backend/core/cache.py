@@ -0,0 +1,281 @@
+import asyncio
+import json
+import logging
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from redis.exceptions import RedisError
+
+from core.config import settings
+from core.redis import get_redis
+from core.single_flight import RedisSingleFlight, SingleFlight
+
+logger = logging.getLogger(__name__)
+
+# Commands per pipeline round trip in RedisCache.set_many
+SET_MANY_CHUNK = 1000
+
+
+class CacheStats:
+    """Hit/miss counters for this process (Redis-backed caches are shared, the counts are not)"""
+
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+
+    def record(self, value: Optional[Any]) -> Optional[Any]:
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return value
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "namespace": self.namespace,
+            "backend": self.backend,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else None,
+        }
+
+
+class MemoryCache(CacheStats):
+    """In-process TTL cache with LRU eviction once `max_entries` is reached
+
+    `evictions` counts live entries pushed out to make room, the sign that
+    `max_entries` is too small for the working set.
+    """
+
+    backend = "memory"
+
+    def __init__(self, namespace: str, max_entries: int = 1024):
+        super().__init__()
+        self.namespace = namespace
+        self.max_entries = max_entries
+        self.evictions = 0
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+
+    async def get(self, key: str) -> Optional[Any]:
+        return self.record(self._get(key))
+
+    async def peek(self, key: str) -> Optional[Any]:
+        """get() without counting a hit or miss"""
+        return self._get(key)
+
+    def _get(self, key: str) -> Optional[Any]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        value, expires_at = entry
+        if expires_at <= time.monotonic():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    async def set(self, key: str, value: Any, ttl: float):
+        self._entries[key] = (value, time.monotonic() + ttl)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            _, (_, expires_at) = self._entries.popitem(last=False)
+            if expires_at > time.monotonic():
+                self.evictions += 1
+
+    async def set_many(self, values: Dict[str, Any], ttl: float):
+        for key, value in values.items():
+            await self.set(key, value, ttl)
+
+    async def delete(self, *keys: str):
+        for key in keys:
+            self._entries.pop(key, None)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            **super().stats(),
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "evictions": self.evictions,
+        }
+
+
+class RedisCache(CacheStats):
+    """JSON values in Redis under `<namespace>:<key>`, shared by every worker.
+
+    Entries expire by TTL; size is bounded by the server's maxmemory policy
+    (allkeys-lru) rather than per namespace. Redis being unavailable is
+    treated as a miss (and writes are dropped) so callers always have their
+    uncached path to fall back on.
+    """
+
+    backend = "redis"
+
+    def __init__(self, namespace: str):
+        super().__init__()
+        self.namespace = namespace
+
+    def _key(self, key: str) -> str:
+        return f"{self.namespace}:{key}"
+
+    async def get(self, key: str) -> Optional[Any]:
+        return self.record(await self.peek(key))
+
+    async def peek(self, key: str) -> Optional[Any]:
+        """get() without counting a hit or miss"""
+        try:
+            raw = await get_redis().get(self._key(key))
+        except RedisError as e:
+            logger.warning(f"Cache {self.namespace} unavailable on get: {e}")
+            return None
+        return json.loads(raw) if raw is not None else None
+
+    async def set(self, key: str, value: Any, ttl: float):
+        try:
+            await get_redis().set(self._key(key), json.dumps(value, default=str), px=int(ttl * 1000))
+        except RedisError as e:
+            logger.warning(f"Cache {self.namespace} unavailable on set: {e}")
+
+    async def set_many(self, values: Dict[str, Any], ttl: float):
+        """set() for many keys: pipelined on one connection, SET_MANY_CHUNK commands per round trip"""
+        items = list(values.items())
+        try:
+            for start in range(0, len(items), SET_MANY_CHUNK):
+                pipe = get_redis().pipeline(transaction=False)
+                for key, value in items[start:start + SET_MANY_CHUNK]:
+                    pipe.set(self._key(key), json.dumps(value, default=str), px=int(ttl * 1000))
+                await pipe.execute()
+        except RedisError as e:
+            logger.warning(f"Cache {self.namespace} unavailable on set_many: {e}")
+
+    async def delete(self, *keys: str):
+        if not keys:
+            return
+        try:
+            await get_redis().delete(*(self._key(key) for key in keys))
+        except RedisError as e:
+            logger.warning(f"Cache {self.namespace} unavailable on delete: {e}")
+
+
+_caches: Dict[tuple, Any] = {}
+
+
+def get_cache(namespace: str, max_entries: int = 1024):
+    """Cache for `namespace` on the configured CACHE_BACKEND ("redis" or "memory")"""
+    backend = settings.CACHE_BACKEND
+    key = (namespace, backend)
+    if key not in _caches:
+        _caches[key] = RedisCache(namespace) if backend == "redis" else MemoryCache(namespace, max_entries)
+    return _caches[key]
+
+
+def cache_stats() -> list:
+    """Hit/miss counters of every cache created in this process"""
+    return [cache.stats() for cache in _caches.values()]
+
+
+# How long one worker's refresh (or cold fetch) of a key keeps the others off it
+REFRESH_LOCK_SECONDS = 30
+
+
+class StaleWhileRevalidate:
+    """Serve cached values past their TTL while one background call refreshes them.
+
+    Entries live in the `namespace` cache (LRU in memory or Redis, per
+    CACHE_BACKEND) as {"value", "fetched_at"} for `ttl + stale_ttl` seconds.
+    Younger than `ttl` they are returned as they are; older ones are still
+    returned at once, and a refresh is started in the background. Only a
+    missing entry makes the caller wait on `fetch`. Refreshes and fetches of
+    the same key collapse into one upstream call per process and, on the
+    Redis backend, across workers. A failed refresh keeps the stale value.
+    """
+
+    def __init__(self, namespace: str, ttl: float, stale_ttl: float, max_entries: int = 1024):
+        self.namespace = namespace
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.max_entries = max_entries
+        self.stale_hits = 0
+        self.refreshes = 0
+        self.refresh_failures = 0
+        self._flights = SingleFlight()
+        self._refreshing = set()  # keys with a background refresh pending
+        self._refreshes = set()
+
+    @property
+    def cache(self):
+        return get_cache(self.namespace, self.max_entries)
+
+    async def get(self, key: str, fetch: Callable[[], Awaitable[Any]]) -> Any:
+        entry = await self.cache.get(key)
+        if entry is None:
+            return await self._flights.do(key, lambda: self._fetch_once(key, fetch))
+        if time.time() - entry["fetched_at"] >= self.ttl:
+            self.stale_hits += 1
+            if key not in self._refreshing:
+                self._refreshing.add(key)
+                task = asyncio.get_running_loop().create_task(self._refresh(key, fetch))
+                self._refreshes.add(task)
+                task.add_done_callback(self._refreshes.discard)
+        return entry["value"]
+
+    async def _fetch(self, key: str, fetch: Callable[[], Awaitable[Any]]) -> Any:
+        value = await fetch()
+        await self.cache.set(key, {"value": value, "fetched_at": time.time()}, self.ttl + self.stale_ttl)
+        return value
+
+    async def _fetch_once(self, key: str, fetch: Callable[[], Awaitable[Any]]) -> Any:
+        if settings.CACHE_BACKEND == "redis":
+            shared = RedisSingleFlight(f"{self.namespace}:fetch", REFRESH_LOCK_SECONDS)
+            return await shared.do(key, lambda: self._fetch(key, fetch))
+        return await self._fetch(key, fetch)
+
+    async def prefetch(self, key: str, fetch: Callable[[], Awaitable[Any]], lead: float) -> bool:
+        """Refresh `key` now if it is missing or turns stale within `lead` seconds.
+
+        Returns whether this call fetched it; a refresh already running (here
+        or, on Redis, in another worker) is left to finish.
+        """
+        entry = await self.cache.peek(key)
+        if entry is not None and time.time() - entry["fetched_at"] < self.ttl - lead:
+            return False
+        if key in self._refreshing:
+            return False
+        self._refreshing.add(key)
+        return await self._refresh(key, fetch)
+
+    async def _refresh(self, key: str, fetch: Callable[[], Awaitable[Any]]) -> bool:
+        try:
+            if not await self._claim_refresh(key):
+                return False
+            self.refreshes += 1
+            await self._flights.do(key, lambda: self._fetch(key, fetch))
+            return True
+        except Exception as e:
+            self.refresh_failures += 1
+            logger.warning(f"Cache {self.namespace} refresh of {key} failed, serving stale: {e}")
+            return False
+        finally:
+            self._refreshing.discard(key)
+
+    async def _claim_refresh(self, key: str) -> bool:
+        """Whether this worker should refresh `key` (another may be at it already)"""
+        if settings.CACHE_BACKEND != "redis":
+            return True
+        try:
+            lock = f"{self.namespace}:refreshing:{key}"
+            return bool(await get_redis().set(lock, 1, nx=True, px=REFRESH_LOCK_SECONDS * 1000))
+        except RedisError as e:
+            logger.warning(f"Cache {self.namespace} refresh lock unavailable: {e}")
+            return True
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            **self.cache.stats(),
+            "ttl": self.ttl,
+            "stale_ttl": self.stale_ttl,
+            "stale_hits": self.stale_hits,
+            "refreshes": self.refreshes,
+            "refresh_failures": self.refresh_failures,
+        }
@@ -0,0 +1,82 @@
+import time
+from typing import Any, Dict, Optional
+
+from core.config import settings
+
+
+class CircuitBreaker:
+    """Consecutive-failure circuit breaker for one upstream, per process.
+
+    After `failure_threshold` failures in a row the circuit opens and callers
+    skip the upstream. Once `reset_seconds` have passed a single trial call
+    is let through (half-open): success closes the circuit, failure re-opens
+    it for another `reset_seconds`. A trial that never reports back (its
+    caller was cancelled) stops blocking new trials after `reset_seconds`.
+    """
+
+    def __init__(self, name: str, failure_threshold: int, reset_seconds: float):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self.trial_started_at: Optional[float] = None
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        return "half_open" if time.monotonic() - self.opened_at >= self.reset_seconds else "open"
+
+    @property
+    def available(self) -> bool:
+        """Whether a call would currently be allowed (without claiming the half-open trial)"""
+        state = self.state
+        return state == "closed" or (state == "half_open" and not self._trial_in_flight())
+
+    def allow(self) -> bool:
+        """Claim permission for one call"""
+        state = self.state
+        if state == "closed":
+            return True
+        if state == "half_open" and not self._trial_in_flight():
+            self.trial_started_at = time.monotonic()
+            return True
+        return False
+
+    def record_success(self):
+        self.failures = 0
+        self.opened_at = None
+        self.trial_started_at = None
+
+    def record_failure(self):
+        self.failures += 1
+        self.trial_started_at = None
+        if self.failures >= self.failure_threshold:
+            self.opened_at = time.monotonic()
+
+    def release(self):
+        """The claimed call was abandoned without an outcome"""
+        self.trial_started_at = None
+
+    def _trial_in_flight(self) -> bool:
+        return self.trial_started_at is not None and time.monotonic() - self.trial_started_at < self.reset_seconds
+
+    def stats(self) -> Dict[str, Any]:
+        return {"name": self.name, "state": self.state, "consecutive_failures": self.failures}
+
+
+_breakers: Dict[str, CircuitBreaker] = {}
+
+
+def get_breaker(name: str) -> CircuitBreaker:
+    """Process-wide breaker for `name`, configured from the CIRCUIT_BREAKER_* settings"""
+    if name not in _breakers:
+        _breakers[name] = CircuitBreaker(
+            name, settings.CIRCUIT_BREAKER_FAILURE_THRESHOLD, settings.CIRCUIT_BREAKER_RESET_SECONDS
+        )
+    return _breakers[name]
+
+
+def breaker_stats() -> list:
+    return [breaker.stats() for breaker in _breakers.values()]
@@ -8,6 +8,8 @@ class Settings(BaseSettings):
     
     # Redis
     REDIS_URL: str = "redis://localhost:6379"
+    REDIS_CONNECT_TIMEOUT: float = 0.5  # seconds; Redis-backed features fall back when it is down
+    CACHE_BACKEND: str = "redis"  # "redis" (shared across workers) or "memory"
     
     # Security
     SECRET_KEY: str = "dev_secret_key_change_in_production"
@@ -17,10 +19,47 @@ class Settings(BaseSettings):
     # AI APIs
     OPENAI_API_KEY: Optional[str] = None
     ANTHROPIC_API_KEY: Optional[str] = None
+    AI_HTTP_MAX_CONNECTIONS: int = 100  # per provider, shared by every request in the process
+    AI_HTTP_MAX_KEEPALIVE: int = 20  # idle connections kept open for reuse
+    AI_HTTP_KEEPALIVE_EXPIRY: float = 60.0  # seconds an idle connection is kept
+    AI_HTTP_CONNECT_TIMEOUT: float = 5.0
+    AI_HTTP_TIMEOUT: float = 60.0  # read/write/pool timeout for a completion
+    AI_RESPONSE_CACHE_ENABLED: bool = True  # reuse answers to the same message under the same context
+    AI_RESPONSE_CACHE_TTL: int = 900  # seconds
+    AI_RESPONSE_CACHE_MAX_ENTRIES: int = 512  # LRU bound of the in-memory backend
+    AI_CONTEXT_TTL: int = 60  # seconds a user's context snapshot (MITs, ideas, chaos) is reused
+    AI_PROVIDER_DEADLINE: float = 20.0  # seconds a provider gets to answer (or finish streaming)
+    AI_HEDGE_UNMENTIONED: bool = False  # race both providers for messages without an @mention
+    CIRCUIT_BREAKER_FAILURE_THRESHOLD: int = 3  # consecutive failures before a provider is skipped
+    CIRCUIT_BREAKER_RESET_SECONDS: float = 30.0  # how long it is skipped before a trial call
+    AI_MAX_CONCURRENT_CALLS: int = 8  # per provider, in this process
+    AI_MAX_QUEUED_CALLS: int = 32  # per provider; beyond this callers get a 429
+    AI_CLAUDE_TOKENS_PER_MINUTE: int = 80000  # input + output budget, per process
+    AI_CHATGPT_TOKENS_PER_MINUTE: int = 150000
+    AI_USAGE_BATCH_SIZE: int = 200  # buffered usage records written per insert
+    AI_USAGE_FLUSH_SECONDS: float = 5.0  # longest a usage record waits in the buffer
+    AI_SINGLE_FLIGHT_REDIS: bool = False  # also coalesce duplicate chat requests across workers
+    AI_SINGLE_FLIGHT_TTL: float = 60.0  # cross-worker lock expiry; longer than a whole chat turn
+    IDEA_ENRICHMENT_BATCH_SIZE: int = 50  # unenriched ideas loaded (and written back) per batch
+    IDEA_ENRICHMENT_IDEAS_PER_REQUEST: int = 10  # ideas packed into one provider request
+    IDEA_ENRICHMENT_INTERVAL: float = 300.0  # seconds between runs of scripts.enrich_ideas --watch
+    
+    # Pooled clients of the other upstreams (core.http_clients), one per upstream and process
+    HTTP_MAX_CONNECTIONS: int = 20
+    HTTP_MAX_KEEPALIVE: int = 10  # idle connections kept open for reuse
+    HTTP_KEEPALIVE_EXPIRY: float = 60.0  # seconds an idle connection is kept
+    HTTP_CONNECT_TIMEOUT: float = 5.0
     
     # OpenWeather API Key
     OPENWEATHER_API_KEY: Optional[str] = None
-    OPENWEATHER_BASE_URL: str = "http://api.openweathermap.org/data/2.5"
+    OPENWEATHER_BASE_URL: str = "https://api.openweathermap.org/data/3.0"
+    WEATHER_CACHE_TTL: int = 600  # seconds weather is served as fresh
+    WEATHER_STALE_TTL: int = 3600  # further seconds it is served while a refresh runs (or keeps failing)
+    WEATHER_GEOHASH_PRECISION: int = 5  # locations share a cache entry per geohash cell (5 = about 5 x 5 km)
+    WEATHER_CACHE_MAX_ENTRIES: int = 512  # snapshots kept per worker on the memory backend (LRU beyond)
+    WEATHER_PREFETCH_INTERVAL: float = 60.0  # seconds between prefetch passes
+    WEATHER_PREFETCH_BUCKETS: int = 20  # most-requested cells each pass keeps warm
+    WEATHER_PREFETCH_LEAD: float = 120.0  # refresh a cell this many seconds before it turns stale
     
     # Default location (Dedham, MA)
     DEFAULT_LATITUDE: float = 42.2477
@@ -33,6 +72,9 @@ class Settings(BaseSettings):
     WHOOP_REDIRECT_URI: Optional[str] = None
     WHOOP_BASE_URL: Optional[str] = None
     WHOOP_SCOPE: Optional[str] = None
+    WHOOP_INGEST_BATCH_SIZE: int = 200  # queued webhooks drained (and upserted) per transaction
+    WHOOP_INGEST_MAX_ATTEMPTS: int = 5  # failed stores before an event is left for inspection
+    WHOOP_INGEST_INTERVAL: float = 5.0  # seconds between drains of scripts.ingest_whoop --watch
     
     # CORS
     ALLOWED_HOSTS: List[str] = ["http://localhost:3000", "http://127.0.0.1:3000"]
@@ -43,10 +85,21 @@ class Settings(BaseSettings):
     
     # Nudge Engine
     N8N_WEBHOOK_BASE_URL: str = "http://localhost:5678/webhook"
+    N8N_BASE_URL: str = "http://n8n:5678"
     
     # Chaos Detection
     RAPID_CAPTURE_THRESHOLD: int = 3  # ideas per 10 minutes
     RAPID_CAPTURE_WINDOW: int = 600   # seconds (10 minutes)
+    CHAOS_URGENCY_KEYWORDS: List[str] = [
+        "urgent", "asap", "immediately", "need to", "should", "must",
+        "critical", "important", "deadline", "rush", "quick", "fast",
+    ]
+    CHAOS_COUNTERS_ENABLED: bool = True  # Redis sliding-window counters instead of DB aggregates
+    CHAOS_COUNTERS_RESYNC_SECONDS: int = 3600  # counters are rebuilt from the DB at least this often
+    CHAOS_RESULT_TTL: int = 30  # seconds a computed chaos level is served from cache
+    CHAOS_METRIC_HEARTBEAT_SECONDS: int = 900  # persist an unchanged ChaosMetric at most this often
+    CHAOS_METRIC_RAW_RETENTION_DAYS: int = 30  # older ChaosMetric rows are folded into rollups and deleted
+    CHAOS_METRIC_HOURLY_RETENTION_DAYS: int = 365  # older hourly rollups are deleted; daily ones are kept
     
     class Config:
         env_file = ".env"
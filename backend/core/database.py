@@ -1,26 +1,43 @@
-from sqlalchemy import create_engine
-from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.orm import declarative_base
 from core.config import settings
 
-# Create database engine
-engine = create_engine(
-    settings.DATABASE_URL,
+# asyncio drivers for the plain URLs used in .env / docker-compose
+ASYNC_DRIVERS = {
+    "postgresql": "asyncpg",
+    "sqlite": "aiosqlite",
+}
+
+def get_async_database_url(database_url: str = settings.DATABASE_URL):
+    """Swap a sync DATABASE_URL onto its asyncio driver (postgresql:// -> postgresql+asyncpg://)"""
+    url = make_url(database_url)
+    backend = url.get_backend_name()
+    if backend in ASYNC_DRIVERS:
+        url = url.set(drivername=f"{backend}+{ASYNC_DRIVERS[backend]}")
+    return url
+
+# Create async database engine
+engine = create_async_engine(
+    get_async_database_url(),
     echo=settings.DEBUG,
     pool_pre_ping=True,
     pool_recycle=3600
 )
 
-# Create session factory
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+# Create session factory - objects stay loaded after commit so handlers
+# never trigger implicit (blocking) refreshes
+AsyncSessionLocal = async_sessionmaker(
+    bind=engine,
+    class_=AsyncSession,
+    autoflush=False,
+    expire_on_commit=False
+)
 
 # Create declarative base
 Base = declarative_base()
 
 # Dependency to get database session
-def get_db():
-    db = SessionLocal()
-    try:
+async def get_db():
+    async with AsyncSessionLocal() as db:
         yield db
-    finally:
-        db.close()
\ No newline at end of file
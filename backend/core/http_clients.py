@@ -0,0 +1,100 @@
+import importlib.util
+from typing import Any, Callable, Dict
+
+import httpx
+
+from core.config import settings
+
+# HTTP/2 needs the h2 package (httpx[http2]); without it clients speak HTTP/1.1
+HTTP2_AVAILABLE = importlib.util.find_spec("h2") is not None
+
+
+def upstreams() -> Dict[str, Dict[str, Any]]:
+    """Base URL and overall timeout (seconds) of each upstream the app calls"""
+    return {
+        "openweather": {"base_url": settings.OPENWEATHER_BASE_URL, "timeout": 10.0},
+        "whoop": {"base_url": settings.WHOOP_BASE_URL or "", "timeout": 10.0},
+        "n8n": {"base_url": settings.N8N_BASE_URL, "timeout": 5.0},
+    }
+
+
+class ConnectionStats:
+    """Requests vs. new connections (attempted) of one client, from httpcore's trace events.
+
+    A request that opens no connection went over a pooled one, so
+    `1 - connections / requests` is the share of requests that skipped the
+    TCP (and TLS) setup.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self.requests = 0
+        self.connections = 0
+        self.tls_handshakes = 0
+
+    async def on_request(self, request: httpx.Request):
+        self.requests += 1
+        request.extensions["trace"] = self.trace
+
+    async def trace(self, event: str, info: Dict):
+        if event == "connection.connect_tcp.started":
+            self.connections += 1
+        elif event == "connection.start_tls.complete":
+            self.tls_handshakes += 1
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "requests": self.requests,
+            "connections": self.connections,
+            "tls_handshakes": self.tls_handshakes,
+            "reuse_rate": round(1 - self.connections / self.requests, 3) if self.requests else None,
+        }
+
+
+_clients: Dict[str, httpx.AsyncClient] = {}
+_stats: Dict[str, ConnectionStats] = {}
+
+
+def create_http_client(name: str) -> httpx.AsyncClient:
+    upstream = upstreams()[name]
+    stats = _stats.setdefault(name, ConnectionStats(name))
+    return httpx.AsyncClient(
+        base_url=upstream["base_url"],
+        timeout=httpx.Timeout(upstream["timeout"], connect=settings.HTTP_CONNECT_TIMEOUT),
+        limits=httpx.Limits(
+            max_connections=settings.HTTP_MAX_CONNECTIONS,
+            max_keepalive_connections=settings.HTTP_MAX_KEEPALIVE,
+            keepalive_expiry=settings.HTTP_KEEPALIVE_EXPIRY,
+        ),
+        http2=HTTP2_AVAILABLE,
+        event_hooks={"request": [stats.on_request]},
+    )
+
+
+def get_http_client(name: str) -> httpx.AsyncClient:
+    """Process-wide pooled client for the upstream `name` (see upstreams()); closed with the app"""
+    if name not in _clients:
+        _clients[name] = create_http_client(name)
+    return _clients[name]
+
+
+def http_client(name: str) -> Callable[[], httpx.AsyncClient]:
+    """FastAPI dependency giving the shared client of `name`:
+
+        client: httpx.AsyncClient = Depends(http_client("whoop"))
+    """
+    def dependency() -> httpx.AsyncClient:
+        return get_http_client(name)
+    return dependency
+
+
+def http_client_stats() -> list:
+    """Connection reuse of every upstream client created in this process"""
+    return [{**stats.stats(), "http2": HTTP2_AVAILABLE} for stats in _stats.values()]
+
+
+async def close_http_clients():
+    for client in _clients.values():
+        await client.aclose()
+    _clients.clear()
@@ -0,0 +1,22 @@
+import redis.asyncio as redis
+from core.config import settings
+
+_client = None
+
+def get_redis() -> redis.Redis:
+    """Process-wide asyncio Redis client (lazily created, closed in the app lifespan)"""
+    global _client
+    if _client is None:
+        _client = redis.from_url(
+            settings.REDIS_URL,
+            decode_responses=True,
+            socket_connect_timeout=settings.REDIS_CONNECT_TIMEOUT,
+            socket_timeout=settings.REDIS_CONNECT_TIMEOUT,
+        )
+    return _client
+
+async def close_redis():
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
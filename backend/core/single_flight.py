@@ -0,0 +1,112 @@
+import asyncio
+import json
+import logging
+import time
+import uuid
+from typing import Any, Awaitable, Callable, Dict
+
+from redis.exceptions import RedisError
+
+from core.redis import get_redis
+
+logger = logging.getLogger(__name__)
+
+# How long a finished call's result stays readable for the workers that were
+# waiting on it (they poll, so they may look a little after it lands)
+RESULT_TTL_SECONDS = 5
+
+
+class SingleFlight:
+    """Coalesce concurrent calls with the same key within this process.
+
+    The first caller runs the call; callers arriving while it is in flight
+    await the same result (or exception) instead of starting their own. If
+    the running caller is cancelled, a waiting one takes over.
+    """
+
+    def __init__(self):
+        self._calls: Dict[str, asyncio.Future] = {}
+
+    async def do(self, key: str, call: Callable[[], Awaitable[Any]]) -> Any:
+        while key in self._calls:
+            leader = self._calls[key]
+            try:
+                return await asyncio.shield(leader)
+            except asyncio.CancelledError:
+                if not leader.cancelled():
+                    raise
+
+        future = asyncio.get_running_loop().create_future()
+        self._calls[key] = future
+        try:
+            result = await call()
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            future.exception()  # retrieved: nobody may be waiting on it
+            raise
+        finally:
+            if self._calls.get(key) is future:
+                del self._calls[key]
+        future.set_result(result)
+        return result
+
+    def in_flight(self) -> int:
+        return len(self._calls)
+
+
+class RedisSingleFlight:
+    """Coalesce calls with the same key across workers through Redis.
+
+    The worker that takes the `<prefix>:lock:<key>` lock (SET NX, expiring
+    after `ttl`) runs the call and publishes the encoded result for
+    RESULT_TTL_SECONDS; the others poll for it. Waiters take over when the
+    lock goes away without a result, and every caller runs the call itself
+    when Redis is unavailable or the wait outlasts `ttl`.
+    """
+
+    def __init__(self, prefix: str, ttl: float, poll_interval: float = 0.05):
+        self.prefix = prefix
+        self.ttl = ttl
+        self.poll_interval = poll_interval
+
+    async def do(
+        self,
+        key: str,
+        call: Callable[[], Awaitable[Any]],
+        encode: Callable[[Any], str] = json.dumps,
+        decode: Callable[[str], Any] = json.loads,
+    ) -> Any:
+        redis = get_redis()
+        lock_key, result_key = f"{self.prefix}:lock:{key}", f"{self.prefix}:result:{key}"
+        token = uuid.uuid4().hex
+        give_up = time.monotonic() + self.ttl
+        try:
+            while True:
+                raw = await redis.get(result_key)
+                if raw is not None:
+                    return decode(raw)
+                if await redis.set(lock_key, token, nx=True, px=int(self.ttl * 1000)):
+                    break
+                if time.monotonic() > give_up:
+                    return await call()
+                await asyncio.sleep(self.poll_interval)
+        except RedisError as e:
+            logger.warning(f"Single-flight {self.prefix} unavailable, running uncoalesced: {e}")
+            return await call()
+
+        try:
+            result = await call()
+            try:
+                await redis.set(result_key, encode(result), ex=RESULT_TTL_SECONDS)
+            except RedisError as e:
+                logger.warning(f"Single-flight {self.prefix} result not shared: {e}")
+            return result
+        finally:
+            try:
+                if await redis.get(lock_key) == token:
+                    await redis.delete(lock_key)
+            except RedisError as e:
+                logger.warning(f"Single-flight {self.prefix} lock not released: {e}")
@@ -5,6 +5,17 @@ import logging
 
 # Import database components
 from core.database import engine, Base
+from core.redis import close_redis
+from core.ai_clients import close_ai_clients, get_anthropic_client, get_openai_client
+from core.http_clients import close_http_clients, get_http_client, upstreams
+from core.config import settings
+from services.ai_usage import close_usage_recorder, get_usage_recorder
+from services.weather import close_weather_prefetcher, get_weather_prefetcher
+
+# Registers the task/idea write listeners that score urgency and feed the
+# chaos counters
+import services.activity  # noqa: F401
+import services.urgency  # noqa: F401
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -22,15 +33,40 @@ async def lifespan(app: FastAPI):
         )
         
         # Create database tables
-        Base.metadata.create_all(bind=engine)
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
         logger.info("Database tables created successfully")
     except Exception as e:
         logger.error(f"Database initialization failed: {e}")
         # Continue anyway for development
+
+    try:
+        # One pooled client per provider for every chat request
+        get_openai_client()
+        get_anthropic_client()
+    except Exception as e:
+        logger.warning(f"AI provider clients not created: {e}")
+
+    # One pooled client per upstream (weather, WHOOP, n8n), injected with http_client()
+    for name in upstreams():
+        get_http_client(name)
+
+    # Batched writes of per-call AI usage
+    get_usage_recorder().start()
+
+    # Keep the most-requested weather cells warm
+    if settings.OPENWEATHER_API_KEY:
+        get_weather_prefetcher().start()
     
     yield
     # Shutdown
     logger.info("Shutting down Rhythmiq API...")
+    await close_usage_recorder()
+    await close_weather_prefetcher()
+    await engine.dispose()
+    await close_redis()
+    await close_ai_clients()
+    await close_http_clients()
 
 app = FastAPI(
     title="Rhythmiq API",
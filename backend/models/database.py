@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, DateTime, Boolean, Text, ForeignKey, JSON, Enum
+from sqlalchemy import Column, Integer, Float, String, DateTime, Boolean, Text, ForeignKey, JSON, Enum, Index, text
 from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
@@ -32,6 +32,10 @@ class User(Base):
     hashed_password = Column(String(100), nullable=False)
     is_active = Column(Boolean, default=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
+    # Where the user's weather is for; DEFAULT_LATITUDE/LONGITUDE when unset
+    latitude = Column(Float)
+    longitude = Column(Float)
+    location_name = Column(String(100))
     
     # Relationships
     tasks = relationship("Task", back_populates="user")
@@ -54,6 +58,7 @@ class Task(Base):
     actual_minutes = Column(Integer)
     due_date = Column(DateTime(timezone=True))
     completed_at = Column(DateTime(timezone=True))
+    urgency_score = Column(Integer, default=0, server_default="0", nullable=False)  # Urgency keywords in title + description
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
     
@@ -63,6 +68,22 @@ class Task(Base):
     # Relationships
     user = relationship("User", back_populates="tasks")
 
+    # Chaos detection windows filter on user_id + one timestamp; the
+    # updated_at window also sums urgency_score, so Postgres covers it
+    __table_args__ = (
+        Index("ix_tasks_user_id_created_at", "user_id", "created_at"),
+        Index("ix_tasks_user_id_updated_at", "user_id", "updated_at", postgresql_include=["urgency_score"]),
+        Index("ix_tasks_user_id_completed_at", "user_id", "completed_at"),
+        Index(
+            "ix_tasks_user_id_open_mits",
+            "user_id",
+            # Enum columns store member names; SQLite only matches a partial
+            # index when the predicate reads like the rendered query (is_mit = 1)
+            postgresql_where=text("is_mit AND status != 'DONE'"),
+            sqlite_where=text("is_mit = 1 AND status != 'DONE'"),
+        ),
+    )
+
 class Idea(Base):
     __tablename__ = "ideas"
 
@@ -76,6 +97,7 @@ class Idea(Base):
     ai_enrichment_data = Column(JSON)  # Keywords, research, connections
     origin = Column(String(100))  # Where the idea came from
     next_step = Column(Text)
+    urgency_score = Column(Integer, default=0, server_default="0", nullable=False)  # Urgency keywords in title + description
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
     
@@ -85,6 +107,11 @@ class Idea(Base):
     # Relationships
     user = relationship("User", back_populates="ideas")
 
+    __table_args__ = (
+        Index("ix_ideas_user_id_created_at", "user_id", "created_at"),
+        Index("ix_ideas_user_id_updated_at", "user_id", "updated_at", postgresql_include=["urgency_score"]),
+    )
+
 class JournalEntry(Base):
     __tablename__ = "journal_entries"
 
@@ -108,7 +135,7 @@ class AIConversation(Base):
 
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     thread_title = Column(String(200))
-    messages = Column(JSON, default=list)  # Array of message objects
+    message_count = Column(Integer, default=0, server_default="0", nullable=False)  # Last AIMessage.seq allocated
     ai_participants = Column(JSON, default=list)  # ["claude", "chatgpt", "all"]
     context_data = Column(JSON)  # Related tasks, ideas, projects
     created_at = Column(DateTime(timezone=True), server_default=func.now())
@@ -120,6 +147,41 @@ class AIConversation(Base):
     # Relationships
     user = relationship("User", back_populates="ai_conversations")
 
+class AIMessage(Base):
+    """One message of an AIConversation; appended, never rewritten"""
+    __tablename__ = "ai_messages"
+
+    conversation_id = Column(UUID(as_uuid=True), ForeignKey("ai_conversations.id", ondelete="CASCADE"), primary_key=True)
+    seq = Column(Integer, primary_key=True, autoincrement=False)  # 1-based position in the thread
+    role = Column(String(20), nullable=False)  # "user" or "assistant"
+    ai = Column(String(20))  # "claude", "chatgpt" for assistant messages
+    content = Column(Text, nullable=False)
+    model = Column(String(50))
+    tokens_used = Column(Integer)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+class AIUsageRecord(Base):
+    """One AI provider call: tokens, latency and outcome, for quotas and regressions"""
+    __tablename__ = "ai_usage"
+
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    user_id = Column(UUID(as_uuid=True), ForeignKey("users.id"), nullable=False)
+    provider = Column(String(20), nullable=False)  # "claude", "chatgpt"
+    model = Column(String(50), nullable=False)
+    outcome = Column(String(20), nullable=False)  # ok, cached, error, timeout, skipped, rejected, cancelled
+    streamed = Column(Boolean, default=False, nullable=False)
+    input_tokens = Column(Integer, default=0, nullable=False)  # uncached input
+    cached_input_tokens = Column(Integer, default=0, nullable=False)
+    cache_write_tokens = Column(Integer, default=0, nullable=False)
+    output_tokens = Column(Integer, default=0, nullable=False)
+    latency_ms = Column(Integer, nullable=False)
+    created_at = Column(DateTime(timezone=True), nullable=False)  # naive UTC, set by the writer
+
+    __table_args__ = (
+        Index("ix_ai_usage_created_at", "created_at"),
+        Index("ix_ai_usage_user_id_created_at", "user_id", "created_at"),
+    )
+
 class ChaosMetric(Base):
     __tablename__ = "chaos_metrics"
 
@@ -134,4 +196,83 @@ class ChaosMetric(Base):
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     
     # Foreign keys
-    user_id = Column(UUID(as_uuid=True), ForeignKey("users.id"), nullable=False)
\ No newline at end of file
+    user_id = Column(UUID(as_uuid=True), ForeignKey("users.id"), nullable=False)
+
+    # Latest-row lookups for change-only persistence
+    __table_args__ = (
+        Index("ix_chaos_metrics_user_id_created_at", "user_id", "created_at"),
+    )
+
+class ChaosRollupMixin:
+    """Per-user ChaosMetric readings folded into fixed time buckets.
+
+    Sums rather than means are stored so buckets can be merged incrementally;
+    mean = sum / samples.
+    """
+    user_id = Column(UUID(as_uuid=True), ForeignKey("users.id"), primary_key=True)
+    bucket_start = Column(DateTime(timezone=True), primary_key=True)
+    samples = Column(Integer, default=0, nullable=False)  # ChaosMetric readings in the bucket
+    focused_count = Column(Integer, default=0, nullable=False)
+    scattered_count = Column(Integer, default=0, nullable=False)
+    spinning_count = Column(Integer, default=0, nullable=False)
+    capture_velocity_sum = Column(Integer, default=0, nullable=False)
+    task_switches_sum = Column(Integer, default=0, nullable=False)
+    urgency_keywords_sum = Column(Integer, default=0, nullable=False)
+    completion_ratio_sum = Column(Integer, default=0, nullable=False)
+
+class ChaosMetricHourly(ChaosRollupMixin, Base):
+    __tablename__ = "chaos_metrics_hourly"
+
+class ChaosMetricDaily(ChaosRollupMixin, Base):
+    __tablename__ = "chaos_metrics_daily"
+
+class WhoopWebhookEvent(Base):
+    """Outbox of received WHOOP webhooks, drained in batches by services.whoop_ingest"""
+    __tablename__ = "whoop_webhook_events"
+
+    id = Column(Integer, primary_key=True, autoincrement=True)  # arrival order
+    event_type = Column(String(50), nullable=False)
+    payload = Column(JSON, nullable=False)
+    received_at = Column(DateTime(timezone=True), nullable=False)  # naive UTC, set by the writer
+    processed_at = Column(DateTime(timezone=True))  # null while queued
+    attempts = Column(Integer, default=0, nullable=False)  # times it failed to store on its own
+    last_error = Column(String(500))
+
+    __table_args__ = (
+        Index("ix_whoop_webhook_events_pending", "id", postgresql_where=text("processed_at IS NULL")),
+    )
+
+class WhoopRecordMixin:
+    """Latest state of one WHOOP record, upserted from webhooks.
+
+    Keyed by WHOOP's user id (not ours: WHOOP accounts are not linked to
+    users yet) and the record's WHOOP id; `data` is the webhook's data as sent.
+    """
+    whoop_user_id = Column(String(50), primary_key=True)
+    record_id = Column(String(50), primary_key=True)
+    data = Column(JSON, nullable=False)
+    updated_at = Column(DateTime(timezone=True), nullable=False)  # when the webhook was received
+
+class WhoopRecovery(WhoopRecordMixin, Base):
+    __tablename__ = "whoop_recoveries"  # record_id is the cycle's id
+
+    recovery_score = Column(Float)
+    hrv_rmssd = Column(Float)
+    resting_heart_rate = Column(Float)
+
+class WhoopSleep(WhoopRecordMixin, Base):
+    __tablename__ = "whoop_sleeps"
+
+    sleep_duration_ms = Column(Integer)
+    sleep_efficiency = Column(Float)
+
+class WhoopWorkout(WhoopRecordMixin, Base):
+    __tablename__ = "whoop_workouts"
+
+    strain_score = Column(Float)
+    duration_ms = Column(Integer)
+
+class WhoopCycle(WhoopRecordMixin, Base):
+    __tablename__ = "whoop_cycles"
+
+    strain = Column(Float)
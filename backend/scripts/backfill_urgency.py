@@ -0,0 +1,68 @@
+# backend/scripts/backfill_urgency.py
+"""
+Backfill tasks.urgency_score and ideas.urgency_score for rows written before
+write-time scoring existed (or after CHAOS_URGENCY_KEYWORDS changes).
+
+    python -m scripts.backfill_urgency --batch-size 1000
+"""
+import argparse
+import asyncio
+import logging
+
+from sqlalchemy import bindparam, select, update
+
+from core.database import AsyncSessionLocal, engine
+from models.database import Idea, Task
+from services.urgency import get_urgency_matcher
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+async def backfill_model(model, batch_size: int) -> int:
+    """Rescore every row of `model` in primary-key order, one batch per transaction"""
+    matcher = get_urgency_matcher()
+    table = model.__table__
+    # updated_at is set to itself so its onupdate=now() doesn't fire and
+    # every backfilled row doesn't suddenly count as recent chaos activity
+    statement = (
+        update(table)
+        .where(table.c.id == bindparam("row_id"))
+        .values(urgency_score=bindparam("score"), updated_at=table.c.updated_at)
+    )
+
+    last_id, changed = None, 0
+    async with AsyncSessionLocal() as db:
+        while True:
+            query = select(model.id, model.title, model.description, model.urgency_score).order_by(model.id).limit(batch_size)
+            if last_id is not None:
+                query = query.where(model.id > last_id)
+            rows = (await db.execute(query)).all()
+            if not rows:
+                break
+
+            updates = [
+                {"row_id": row.id, "score": score}
+                for row in rows
+                if (score := matcher.count_all((row.title, row.description))) != row.urgency_score
+            ]
+            if updates:
+                await db.execute(statement, updates)
+                await db.commit()
+                changed += len(updates)
+            last_id = rows[-1].id
+
+    logger.info(f"Backfilled urgency_score on {changed} {table.name} rows")
+    return changed
+
+
+async def main(batch_size: int):
+    for model in (Task, Idea):
+        await backfill_model(model, batch_size)
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--batch-size", type=int, default=1000)
+    asyncio.run(main(parser.parse_args().batch_size))
@@ -0,0 +1,36 @@
+# backend/scripts/chaos_retention.py
+"""
+Downsample ChaosMetric history: raw rows older than
+CHAOS_METRIC_RAW_RETENTION_DAYS are folded into the hourly/daily rollups and
+deleted, hourly rollups older than CHAOS_METRIC_HOURLY_RETENTION_DAYS are
+dropped. Run daily.
+
+    python -m scripts.chaos_retention
+    python -m scripts.chaos_retention --rebuild   # backfill rollups from all raw rows first
+"""
+import argparse
+import asyncio
+import logging
+import time
+
+from core.database import AsyncSessionLocal, engine
+from services.chaos_history import downsample_raw_metrics, rebuild_rollups
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+async def main(rebuild: bool):
+    start = time.perf_counter()
+    async with AsyncSessionLocal() as db:
+        if rebuild:
+            logger.info(f"Rebuilt rollups from {await rebuild_rollups(db)} raw rows")
+        removed = await downsample_raw_metrics(db)
+    logger.info(f"Chaos retention removed {removed} in {time.perf_counter() - start:.2f}s")
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rebuild", action="store_true", help="re-derive rollups from every raw row before pruning")
+    asyncio.run(main(rebuild=parser.parse_args().rebuild))
@@ -0,0 +1,33 @@
+# backend/scripts/chaos_sweep.py
+"""
+Evaluate chaos levels for every active user in one batch and store the
+ChaosMetric rows that changed or are due a heartbeat (for scheduled nudge
+sweeps).
+
+    python -m scripts.chaos_sweep
+    python -m scripts.chaos_sweep --dry-run
+"""
+import argparse
+import asyncio
+import logging
+import time
+
+from core.database import AsyncSessionLocal, engine
+from services.chaos_batch import BatchChaosEvaluator
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+async def main(persist: bool):
+    start = time.perf_counter()
+    async with AsyncSessionLocal() as db:
+        levels = await BatchChaosEvaluator(db).evaluate(persist=persist)
+    logger.info(f"Chaos sweep {levels} in {time.perf_counter() - start:.2f}s (persisted={persist})")
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dry-run", action="store_true", help="classify without writing ChaosMetric rows")
+    asyncio.run(main(persist=not parser.parse_args().dry_run))
@@ -0,0 +1,45 @@
+# backend/scripts/enrich_ideas.py
+"""
+Fill in AI enrichment (keywords, summary, category, next step) for ideas that
+do not have it yet, in batches of several ideas per provider request.
+
+    python -m scripts.enrich_ideas
+    python -m scripts.enrich_ideas --watch        # keep running every IDEA_ENRICHMENT_INTERVAL
+    python -m scripts.enrich_ideas --max-batches 1
+"""
+import argparse
+import asyncio
+import logging
+import time
+
+from core.ai_clients import close_ai_clients
+from core.config import settings
+from core.database import engine
+from services.ai_usage import close_usage_recorder
+from services.idea_enrichment import IdeaEnrichmentPipeline
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+async def main(watch: bool, max_batches):
+    try:
+        while True:
+            start = time.perf_counter()
+            progress = await IdeaEnrichmentPipeline().run(max_batches)
+            logger.info(f"Idea enrichment {progress} in {time.perf_counter() - start:.2f}s")
+            if not watch:
+                break
+            await asyncio.sleep(settings.IDEA_ENRICHMENT_INTERVAL)
+    finally:
+        await close_usage_recorder()
+        await close_ai_clients()
+        await engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--watch", action="store_true", help="keep enriching new ideas")
+    parser.add_argument("--max-batches", type=int, default=None, help="stop after this many batches per run")
+    args = parser.parse_args()
+    asyncio.run(main(args.watch, args.max_batches))
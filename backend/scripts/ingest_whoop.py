@@ -0,0 +1,42 @@
+# backend/scripts/ingest_whoop.py
+"""
+Store queued WHOOP webhooks (whoop_webhook_events) as recovery, sleep,
+workout and cycle records, in batches.
+
+    python -m scripts.ingest_whoop
+    python -m scripts.ingest_whoop --watch        # keep draining every WHOOP_INGEST_INTERVAL
+    python -m scripts.ingest_whoop --max-batches 1
+"""
+import argparse
+import asyncio
+import logging
+import time
+
+from core.config import settings
+from core.database import engine
+from services.whoop_ingest import WhoopIngestWorker
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+async def main(watch: bool, max_batches):
+    try:
+        while True:
+            start = time.perf_counter()
+            progress = await WhoopIngestWorker().run(max_batches)
+            if progress["events"] or progress["failed"]:
+                logger.info(f"WHOOP ingest {progress} in {time.perf_counter() - start:.2f}s")
+            if not watch:
+                break
+            await asyncio.sleep(settings.WHOOP_INGEST_INTERVAL)
+    finally:
+        await engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--watch", action="store_true", help="keep draining new webhooks")
+    parser.add_argument("--max-batches", type=int, default=None, help="stop after this many batches per run")
+    args = parser.parse_args()
+    asyncio.run(main(args.watch, args.max_batches))
@@ -0,0 +1,214 @@
+import asyncio
+import logging
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Awaitable, Callable, Dict, List, NamedTuple, Optional
+from uuid import UUID
+
+from sqlalchemy import and_, event, inspect, or_, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from core.config import settings
+from core.redis import get_redis
+from models.database import Idea, Task
+
+logger = logging.getLogger(__name__)
+
+# The completion ratio looks back to midnight, so counters keep a full day
+# plus the rapid capture window
+RETENTION_SECONDS = 86400 + settings.RAPID_CAPTURE_WINDOW
+COUNTER_KINDS = ("tasks_created", "tasks_updated", "tasks_completed", "ideas_created", "ideas_updated")
+PENDING_KEY = "chaos_activity"
+
+
+class ActivityEvent(NamedTuple):
+    user_id: UUID
+    kind: str  # one of COUNTER_KINDS
+    row_id: UUID
+    timestamp: float  # epoch seconds
+    urgency_score: int = 0
+
+
+def to_epoch(value: datetime) -> float:
+    """DB timestamps come back naive (SQLite) or aware (Postgres); both are UTC"""
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.timestamp()
+
+
+class ActivityCounters:
+    """Per-user sliding windows of task and idea activity in Redis sorted sets.
+
+    Every kind is a sorted set of row ids scored by when the activity happened,
+    so editing a row twice moves it instead of counting it twice - the same
+    semantics as the DB aggregate in ChaosDetectionService. Urgency scores sit
+    in a hash beside them. A "primed" marker with a TTL says the sets are
+    complete; when it is missing the caller rebuilds them from the database.
+    """
+
+    def __init__(self, redis_client=None):
+        self.redis = redis_client or get_redis()
+
+    @staticmethod
+    def key(user_id: UUID, name: str) -> str:
+        return f"chaos:activity:{user_id}:{name}"
+
+    async def record(self, events: List[ActivityEvent]):
+        async with self.redis.pipeline(transaction=False) as pipe:
+            self._write(pipe, events)
+            await pipe.execute()
+
+    async def window_counts(self, user_id: UUID, window_start: float, today_start: float) -> Optional[Dict[str, int]]:
+        """Same keys as the DB aggregate, or None if the counters are not primed"""
+        key = lambda name: self.key(user_id, name)
+        async with self.redis.pipeline(transaction=False) as pipe:
+            pipe.exists(key("primed"))
+            pipe.zcount(key("tasks_created"), window_start, "+inf")
+            pipe.zcount(key("tasks_created"), today_start, "+inf")
+            pipe.zcount(key("tasks_completed"), today_start, "+inf")
+            pipe.zrangebyscore(key("tasks_updated"), window_start, "+inf")
+            pipe.zcount(key("ideas_created"), window_start, "+inf")
+            pipe.zrangebyscore(key("ideas_updated"), window_start, "+inf")
+            (primed, recent_tasks, started_today, completed_today,
+             updated_tasks, recent_ideas, updated_ideas) = await pipe.execute()
+
+        if not primed:
+            return None
+
+        task_urgency = idea_urgency = 0
+        if updated_tasks or updated_ideas:
+            scores = [int(score or 0) for score in await self.redis.hmget(key("urgency"), updated_tasks + updated_ideas)]
+            task_urgency = sum(scores[:len(updated_tasks)])
+            idea_urgency = sum(scores[len(updated_tasks):])
+
+        return {
+            "recent_tasks": recent_tasks,
+            "task_switches": len(updated_tasks),
+            "completed_today": completed_today,
+            "started_today": started_today,
+            "task_urgency": task_urgency,
+            "recent_ideas": recent_ideas,
+            "idea_urgency": idea_urgency,
+        }
+
+    async def rebuild(self, db: AsyncSession, user_id: UUID, now: datetime):
+        """Cold start: replay the retention window of task/idea rows into fresh counters"""
+        since = now - timedelta(seconds=RETENTION_SECONDS)
+        since_epoch = to_epoch(since)
+        tasks = (await db.execute(
+            select(Task.id, Task.created_at, Task.updated_at, Task.completed_at, Task.urgency_score).where(
+                and_(
+                    Task.user_id == user_id,
+                    or_(Task.created_at >= since, Task.updated_at >= since, Task.completed_at >= since),
+                )
+            )
+        )).all()
+        ideas = (await db.execute(
+            select(Idea.id, Idea.created_at, Idea.updated_at, Idea.urgency_score).where(
+                and_(Idea.user_id == user_id, or_(Idea.created_at >= since, Idea.updated_at >= since))
+            )
+        )).all()
+
+        events = []
+        for row in tasks:
+            for kind, at in (("tasks_created", row.created_at), ("tasks_updated", row.updated_at), ("tasks_completed", row.completed_at)):
+                if at is not None and to_epoch(at) >= since_epoch:
+                    events.append(ActivityEvent(user_id, kind, row.id, to_epoch(at), row.urgency_score))
+        for row in ideas:
+            for kind, at in (("ideas_created", row.created_at), ("ideas_updated", row.updated_at)):
+                if at is not None and to_epoch(at) >= since_epoch:
+                    events.append(ActivityEvent(user_id, kind, row.id, to_epoch(at), row.urgency_score))
+
+        async with self.redis.pipeline(transaction=True) as pipe:
+            pipe.delete(*(self.key(user_id, name) for name in COUNTER_KINDS + ("urgency",)))
+            self._write(pipe, events)
+            pipe.set(self.key(user_id, "primed"), int(time.time()), ex=settings.CHAOS_COUNTERS_RESYNC_SECONDS)
+            await pipe.execute()
+
+    def _write(self, pipe, events: List[ActivityEvent]):
+        cutoff = time.time() - RETENTION_SECONDS
+        for ev in events:
+            pipe.zadd(self.key(ev.user_id, ev.kind), {str(ev.row_id): ev.timestamp})
+            pipe.hset(self.key(ev.user_id, "urgency"), str(ev.row_id), ev.urgency_score)
+        for user_id in {ev.user_id for ev in events}:
+            for name in COUNTER_KINDS:
+                pipe.zremrangebyscore(self.key(user_id, name), "-inf", cutoff)
+                pipe.expire(self.key(user_id, name), RETENTION_SECONDS)
+            pipe.expire(self.key(user_id, "urgency"), RETENTION_SECONDS)
+
+
+# --- Write capture ---------------------------------------------------------
+#
+# Task and idea writes are collected from every ORM flush and handed to the
+# registered handlers once the transaction commits. Handlers run as
+# background tasks on the running loop; when there is none (sync scripts,
+# migrations) the events are dropped and the periodic resync catches up.
+
+ActivityHandler = Callable[[List[ActivityEvent]], Awaitable[None]]
+activity_handlers: List[ActivityHandler] = []
+_dispatches = set()
+
+
+def on_activity(handler: ActivityHandler) -> ActivityHandler:
+    """Register an async handler for committed task/idea activity"""
+    activity_handlers.append(handler)
+    return handler
+
+
+def _events_for(obj, is_new: bool, now: float) -> List[ActivityEvent]:
+    urgency = obj.urgency_score or 0
+    if isinstance(obj, Idea):
+        return [ActivityEvent(obj.user_id, "ideas_created" if is_new else "ideas_updated", obj.id, now, urgency)]
+
+    events = [ActivityEvent(obj.user_id, "tasks_created" if is_new else "tasks_updated", obj.id, now, urgency)]
+    completed = inspect(obj).attrs.completed_at.history.added
+    if completed and completed[0] is not None:
+        at = to_epoch(completed[0]) if isinstance(completed[0], datetime) else now
+        events.append(ActivityEvent(obj.user_id, "tasks_completed", obj.id, at, urgency))
+    return events
+
+
+@event.listens_for(Session, "after_flush")
+def _collect_activity(session, flush_context):
+    now = time.time()
+    pending = session.info.setdefault(PENDING_KEY, [])
+    for obj in session.new:
+        if isinstance(obj, (Task, Idea)):
+            pending.extend(_events_for(obj, True, now))
+    for obj in session.dirty:
+        if isinstance(obj, (Task, Idea)) and session.is_modified(obj, include_collections=False):
+            pending.extend(_events_for(obj, False, now))
+
+
+@event.listens_for(Session, "after_commit")
+def _publish_activity(session):
+    events = session.info.pop(PENDING_KEY, None)
+    if not events or not activity_handlers:
+        return
+    try:
+        loop = asyncio.get_running_loop()
+    except RuntimeError:
+        return
+    task = loop.create_task(_dispatch(events))
+    _dispatches.add(task)
+    task.add_done_callback(_dispatches.discard)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_activity(session):
+    session.info.pop(PENDING_KEY, None)
+
+
+async def _dispatch(events: List[ActivityEvent]):
+    for handler in activity_handlers:
+        try:
+            await handler(events)
+        except Exception as e:
+            logger.warning(f"Activity handler {handler.__name__} failed: {e}")
+
+
+@on_activity
+async def record_chaos_counters(events: List[ActivityEvent]):
+    if settings.CHAOS_COUNTERS_ENABLED:
+        await ActivityCounters().record(events)
@@ -1,39 +1,175 @@
 import asyncio
+import hashlib
 import re
-from typing import Dict, List, Optional, Tuple
+import time
+from typing import AsyncIterator, Dict, List, Optional
 from openai import AsyncOpenAI
 from anthropic import AsyncAnthropic
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from uuid import UUID
 import json
 
+from core.ai_clients import get_anthropic_client, get_openai_client
+from core.ai_scheduler import INTERACTIVE, ProviderBusy, get_scheduler
+from core.cache import get_cache
+from core.circuit_breaker import get_breaker
 from core.config import settings
-from models.database import AIConversation, Task, Idea, User
+from core.single_flight import RedisSingleFlight, SingleFlight
+from models.database import AIConversation
+from services.ai_usage import get_usage_recorder
+from services.context_snapshot import ContextSnapshotService
+from services.conversation_store import ConversationStore
+
+CLAUDE_MODEL = "claude-3-5-sonnet-20241022"
+CHATGPT_MODEL = "gpt-4-turbo-preview"
+MAX_TOKENS = 1000
+PROVIDER_NAMES = {'claude': 'Claude', 'chatgpt': 'ChatGPT'}
+PROVIDER_MODELS = {'claude': CLAUDE_MODEL, 'chatgpt': CHATGPT_MODEL}
+
+# Static system prompt preambles. They come first and never vary between
+# requests, so the providers' prompt caches can reuse them; the user's
+# context follows as a separate, per-request suffix. Both providers only
+# cache prefixes of at least 1024 tokens and these are well under 100, so
+# nothing is cached until the preamble grows past that; the layout and the
+# Claude cache breakpoint are in place for when it does.
+CLAUDE_SYSTEM_PREFIX = """You are Claude, the engineering AI assistant for Rhythmiq Personal OS. You help with technical implementation, code review, architecture decisions, and debugging.
+
+Provide clear, actionable technical guidance. Be concise but thorough.
+
+You have access to the user's current context, which follows."""
+CHATGPT_SYSTEM_PREFIX = """You are the creative AI assistant for Rhythmiq Personal OS. You help with brainstorming, planning, writing, and strategic thinking.
+
+Provide creative, inspiring, and strategic guidance. Help organize thoughts and suggest next steps.
+
+You have access to the user's current context, which follows."""
+
+
+def normalize_message(message: str) -> str:
+    """Case, spacing and trailing punctuation don't change what is being asked"""
+    return " ".join(message.casefold().split()).rstrip("?!. ")
+
+
+def response_cache_key(ai: str, model: str, message: str, system_prompt) -> str:
+    """Provider + model + normalized message + system prompt (which carries the MITs, ideas and chaos level)"""
+    if not isinstance(system_prompt, str):
+        system_prompt = json.dumps(system_prompt, sort_keys=True)
+    prompt_hash = hashlib.sha256(system_prompt.encode()).hexdigest()[:32]
+    message_hash = hashlib.sha256(normalize_message(message).encode()).hexdigest()[:32]
+    return f"{ai}:{model}:{prompt_hash}:{message_hash}"
+
+
+# Concurrent duplicates of the same chat turn (double submits, retries) share one run
+_flights = SingleFlight()
+
+
+def _decode_shared_result(raw: str) -> Dict:
+    """A process_message result published by another worker"""
+    result = json.loads(raw)
+    result['thread_id'] = UUID(result['thread_id'])
+    return result
+
+
+def claude_token_usage(usage) -> Dict:
+    """Anthropic usage split into prompt-cache reads, cache writes and uncached input"""
+    return {
+        'uncached_input_tokens': usage.input_tokens,
+        'cached_input_tokens': getattr(usage, 'cache_read_input_tokens', None) or 0,
+        'cache_write_tokens': getattr(usage, 'cache_creation_input_tokens', None) or 0,
+        'output_tokens': usage.output_tokens,
+    }
+
+
+def openai_token_usage(usage) -> Dict:
+    """OpenAI usage split the same way (prompt_tokens includes the cached ones; caching is automatic)"""
+    details = getattr(usage, 'prompt_tokens_details', None)
+    cached = (getattr(details, 'cached_tokens', None) or 0) if details else 0
+    return {
+        'uncached_input_tokens': usage.prompt_tokens - cached,
+        'cached_input_tokens': cached,
+        'cache_write_tokens': 0,
+        'output_tokens': usage.completion_tokens,
+    }
 
 class AIRoutingService:
-    def __init__(self, db: Session, user_id: UUID):
+    def __init__(
+        self,
+        db: AsyncSession,
+        user_id: UUID,
+        openai_client: Optional[AsyncOpenAI] = None,
+        anthropic_client: Optional[AsyncAnthropic] = None,
+        priority: int = INTERACTIVE,
+    ):
         self.db = db
         self.user_id = user_id
-        self.openai_client = AsyncOpenAI(api_key=settings.OPENAI_API_KEY)
-        self.anthropic_client = AsyncAnthropic(api_key=settings.ANTHROPIC_API_KEY)
+        # Place in the provider schedulers' queues (core.ai_scheduler INTERACTIVE / BACKGROUND)
+        self.priority = priority
+        self.conversations = ConversationStore(db)
+        # Shared, pooled clients: one connection pool per provider for the whole process
+        self.openai_client = openai_client or get_openai_client()
+        self.anthropic_client = anthropic_client or get_anthropic_client()
+        self.usage = get_usage_recorder()
 
-    async def process_message(self, message: str, thread_id: Optional[UUID] = None) -> Dict:
-        """Process a message with @mention routing"""
-        
-        # Parse @mentions
+    async def process_message(
+        self,
+        message: str,
+        thread_id: Optional[UUID] = None,
+        bypass_cache: bool = False,
+        hedge: Optional[bool] = None,
+    ) -> Dict:
+        """Process a message with @mention routing.
+
+        bypass_cache forces fresh answers; hedge (default AI_HEDGE_UNMENTIONED)
+        races both providers for un-mentioned messages. An identical request
+        (same thread, message and mentions) already in flight is awaited
+        instead of being run and stored again - across workers too with
+        AI_SINGLE_FLIGHT_REDIS.
+        """
         mentions = self._parse_mentions(message)
+        if hedge is None:
+            hedge = settings.AI_HEDGE_UNMENTIONED
+        key = self._flight_key(thread_id, message, mentions, bypass_cache, hedge)
+
+        async def run():
+            return await self._process_message(message, mentions, thread_id, bypass_cache, hedge)
+
+        async def run_once_across_workers():
+            return await RedisSingleFlight("ai:flight", settings.AI_SINGLE_FLIGHT_TTL).do(
+                key, run, encode=lambda result: json.dumps(result, default=str), decode=_decode_shared_result
+            )
+
+        return await _flights.do(key, run_once_across_workers if settings.AI_SINGLE_FLIGHT_REDIS else run)
+
+    def _flight_key(
+        self, thread_id: Optional[UUID], message: str, mentions: List[str], bypass_cache: bool, hedge: bool
+    ) -> str:
+        text = normalize_message(self._remove_mentions(message))
+        digest = hashlib.sha256(f"{sorted(set(mentions))}:{text}".encode()).hexdigest()[:32]
+        return f"{self.user_id}:{thread_id}:{digest}:{int(bypass_cache)}{int(hedge)}"
+
+    async def _process_message(
+        self, message: str, mentions: List[str], thread_id: Optional[UUID], bypass_cache: bool, hedge: bool
+    ) -> Dict:
         clean_message = self._remove_mentions(message)
         
-        # Get or create conversation thread
-        conversation = await self._get_or_create_thread(thread_id)
+        # Get the conversation thread (a new one is only created once there is a turn to store)
+        conversation = await self._get_thread(thread_id)
         
         # Get relevant context
         context = await self._gather_context()
         
         # Route to appropriate AI(s)
-        responses = await self._route_message(clean_message, mentions, context)
+        responses = await self._route_message(clean_message, mentions, context, bypass_cache, hedge)
+        if responses and all(response.get('busy') for response in responses):
+            # nothing was answered: let the caller back off instead of storing a failed turn
+            raise ProviderBusy(
+                ", ".join(response['ai'] for response in responses),
+                min(response['retry_after'] for response in responses),
+            )
         
-        # Store the conversation
+        # Store the conversation, committing a new thread together with its first turn
+        if conversation is None:
+            conversation = await self._new_thread()
         await self._store_conversation(conversation, message, responses)
         
         return {
@@ -51,46 +187,256 @@ class AIRoutingService:
         """Remove @mentions from message for AI processing"""
         return re.sub(r'@\w+\s*', '', message).strip()
 
-    async def _route_message(self, message: str, mentions: List[str], context: Dict) -> List[Dict]:
+    def _select_providers(self, message: str, mentions: List[str]) -> List[str]:
+        """Which AI(s) a message goes to, based on mentions"""
+        if not mentions:
+            # No mention - smart routing based on content
+            return ['claude'] if self._is_technical_query(message) else ['chatgpt']
+        if 'all' in mentions:
+            # @all - call both
+            return ['claude', 'chatgpt']
+
+        # Specific mentions
+        providers = []
+        if 'claude' in mentions:
+            providers.append('claude')
+        if 'chatgpt' in mentions or 'gpt' in mentions:
+            providers.append('chatgpt')
+        return providers
+
+    async def _route_message(
+        self, message: str, mentions: List[str], context: Dict, bypass_cache: bool = False, hedge: bool = False
+    ) -> List[Dict]:
         """Route message to appropriate AI(s) based on mentions"""
-        responses = []
-        
-        if not mentions or 'all' in mentions:
-            # No mention or @all - route to both
-            tasks = []
-            if not mentions:
-                # Smart routing based on content
-                if self._is_technical_query(message):
-                    tasks.append(self._call_claude(message, context))
-                else:
-                    tasks.append(self._call_chatgpt(message, context))
-            else:
-                # @all - call both
-                tasks.extend([
-                    self._call_claude(message, context),
-                    self._call_chatgpt(message, context)
-                ])
-            
-            results = await asyncio.gather(*tasks, return_exceptions=True)
-            for result in results:
-                if not isinstance(result, Exception):
-                    responses.append(result)
-        
+        providers = self._select_providers(message, mentions)
+
+        if not mentions:
+            # Un-mentioned messages can go to either AI: race them, or avoid one whose circuit is open
+            other = 'chatgpt' if providers[0] == 'claude' else 'claude'
+            if hedge:
+                return [await self._hedged_call([providers[0], other], message, context, bypass_cache)]
+            if not get_breaker(f"ai:{providers[0]}").available and get_breaker(f"ai:{other}").available:
+                providers = [other]
+
+        tasks = [self._call_provider(ai, message, context, bypass_cache) for ai in providers]
+        results = await asyncio.gather(*tasks, return_exceptions=True)
+        return [result for result in results if not isinstance(result, Exception)]
+
+    async def _call_provider(self, ai: str, message: str, context: Dict, bypass_cache: bool = False) -> Dict:
+        """One provider call through its scheduler, under its deadline and circuit breaker.
+
+        A response cache hit is served first: it needs no provider, so it
+        neither waits on an open circuit nor takes a scheduler slot.
+        """
+        calls = {'claude': self._call_claude, 'chatgpt': self._call_chatgpt}
+        breaker = get_breaker(f"ai:{ai}")
+        started = time.perf_counter()
+        cached = await self._cached_response(self._response_cache_key(ai, message, context), bypass_cache)
+        if cached is not None:
+            return self._metered(ai, cached, started)
+        if not breaker.allow():
+            return self._metered(ai, self._unavailable(ai), started)
+
+        sent = False
+        try:
+            async with get_scheduler(ai).slot(self.priority, self._estimate_tokens(ai, message, context)) as slot:
+                sent = True
+                # already looked up above: go straight to the provider (the answer is still cached)
+                result = await asyncio.wait_for(calls[ai](message, context, True), settings.AI_PROVIDER_DEADLINE)
+                slot.tokens = self._tokens_spent(result, slot.tokens)
+        except ProviderBusy as e:
+            breaker.release()
+            return self._metered(ai, self._busy(ai, e.retry_after), started)
+        except asyncio.TimeoutError:
+            breaker.record_failure()
+            return self._metered(ai, self._timed_out(ai), started)
+        except asyncio.CancelledError:
+            # e.g. the losing side of a hedge; once sent, the provider may bill it
+            breaker.release()
+            if sent:
+                self._metered(ai, self._cancelled(ai), started)
+            raise
+
+        if result.get('error'):
+            breaker.record_failure()
+        elif not result.get('cached'):
+            breaker.record_success()
         else:
-            # Specific mentions
-            tasks = []
-            if 'claude' in mentions:
-                tasks.append(self._call_claude(message, context))
-            if 'chatgpt' in mentions or 'gpt' in mentions:
-                tasks.append(self._call_chatgpt(message, context))
-            
-            if tasks:
-                results = await asyncio.gather(*tasks, return_exceptions=True)
-                for result in results:
-                    if not isinstance(result, Exception):
-                        responses.append(result)
-        
-        return responses
+            breaker.release()
+        return self._metered(ai, result, started)
+
+    def _response_cache_key(self, ai: str, message: str, context: Dict) -> str:
+        if ai == 'claude':
+            system_prompt = self._build_claude_system_prompt(context)
+        else:
+            system_prompt = self._build_chatgpt_system_prompt(context)
+        return response_cache_key(ai, PROVIDER_MODELS[ai], message, system_prompt)
+
+    def _estimate_tokens(self, ai: str, message: str, context: Dict) -> int:
+        """Budget reserved before a call: ~4 characters per input token plus the whole output allowance"""
+        if ai == 'claude':
+            prompt = ''.join(block['text'] for block in self._build_claude_system_prompt(context))
+        else:
+            prompt = self._build_chatgpt_system_prompt(context)
+        return (len(prompt) + len(message)) // 4 + MAX_TOKENS
+
+    @staticmethod
+    def _tokens_spent(result: Dict, reserved: int) -> int:
+        """What a finished call really cost; failures keep the reservation (the provider may have billed them)"""
+        if result.get('cached'):
+            return 0
+        return result.get('tokens_used') or reserved
+
+    def _metered(self, ai: str, result: Dict, started: float, streamed: bool = False) -> Dict:
+        """Record the call's tokens, latency and outcome, then hand the result on"""
+        self.usage.record(self.user_id, ai, PROVIDER_MODELS[ai], result, time.perf_counter() - started, streamed)
+        return result
+
+    async def _hedged_call(self, providers: List[str], message: str, context: Dict, bypass_cache: bool = False) -> Dict:
+        """Send to every provider at once; the first good answer wins and the rest are cancelled"""
+        tasks = {asyncio.create_task(self._call_provider(ai, message, context, bypass_cache)): ai for ai in providers}
+        errors = {}
+        try:
+            pending = set(tasks)
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    result = task.result()
+                    if not result.get('error'):
+                        return {**result, 'hedged': True}
+                    errors[tasks[task]] = result
+            # every provider failed: report the one that would have been picked
+            return errors[providers[0]]
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    def _unavailable(self, ai: str) -> Dict:
+        return {
+            'ai': ai,
+            'content': f"{PROVIDER_NAMES[ai]} is temporarily unavailable after repeated failures",
+            'error': True,
+            'skipped': True
+        }
+
+    def _busy(self, ai: str, retry_after: int) -> Dict:
+        return {
+            'ai': ai,
+            'content': f"{PROVIDER_NAMES[ai]} is handling too many requests, try again in {retry_after}s",
+            'error': True,
+            'busy': True,
+            'retry_after': retry_after
+        }
+
+    def _cancelled(self, ai: str) -> Dict:
+        return {
+            'ai': ai,
+            'content': f"{PROVIDER_NAMES[ai]} call was cancelled",
+            'error': True,
+            'cancelled': True
+        }
+
+    def _timed_out(self, ai: str) -> Dict:
+        return {
+            'ai': ai,
+            'content': f"{PROVIDER_NAMES[ai]} did not answer within {settings.AI_PROVIDER_DEADLINE:g}s",
+            'error': True,
+            'timeout': True
+        }
+
+    async def stream_message(
+        self, message: str, thread_id: Optional[UUID] = None, bypass_cache: bool = False
+    ) -> AsyncIterator[Dict]:
+        """Streaming variant of process_message.
+
+        Yields a 'start' event, then 'delta' events from every routed AI as
+        tokens arrive (interleaved, tagged with 'ai'), a 'done' event per AI,
+        and finally 'end' once the whole turn has been stored.
+        """
+        mentions = self._parse_mentions(message)
+        clean_message = self._remove_mentions(message)
+        conversation = await self._get_or_create_thread(thread_id)
+        context = await self._gather_context()
+        yield {'event': 'start', 'thread_id': str(conversation.id)}
+
+        streams = {'claude': self._stream_claude, 'chatgpt': self._stream_chatgpt}
+        queue: asyncio.Queue = asyncio.Queue()
+
+        async def forward(ai: str, outcome: Dict):
+            # the cache was checked by pump: go straight to the provider
+            async for event in streams[ai](clean_message, context, True):
+                if event['event'] == 'done':
+                    outcome.update(event)
+                await queue.put(event)
+
+        async def pump(ai: str):
+            breaker = get_breaker(f"ai:{ai}")
+            started = time.perf_counter()
+            try:
+                cached = await self._cached_response(
+                    self._response_cache_key(ai, clean_message, context), bypass_cache
+                )
+                if cached is not None:
+                    await queue.put({'event': 'delta', 'ai': ai, 'content': cached['content']})
+                    await queue.put({'event': 'done', **self._metered(ai, cached, started, True)})
+                    return
+                if not breaker.allow():
+                    await queue.put({'event': 'done', **self._metered(ai, self._unavailable(ai), started, True)})
+                    return
+                outcome, sent = {}, False
+                try:
+                    estimate = self._estimate_tokens(ai, clean_message, context)
+                    async with get_scheduler(ai).slot(self.priority, estimate) as slot:
+                        sent = True
+                        try:
+                            # the deadline covers the whole stream, not just the first token
+                            await asyncio.wait_for(forward(ai, outcome), settings.AI_PROVIDER_DEADLINE)
+                        except asyncio.TimeoutError:
+                            outcome = {'event': 'done', **self._timed_out(ai)}
+                            await queue.put(outcome)
+                        slot.tokens = self._tokens_spent(outcome, slot.tokens)
+                except ProviderBusy as e:
+                    breaker.release()
+                    await queue.put({'event': 'done', **self._metered(ai, self._busy(ai, e.retry_after), started, True)})
+                    return
+                except asyncio.CancelledError:
+                    breaker.release()
+                    if sent:
+                        self._metered(ai, self._cancelled(ai), started, True)
+                    raise
+                if outcome.get('error'):
+                    breaker.record_failure()
+                elif not outcome.get('cached'):
+                    breaker.record_success()
+                else:
+                    breaker.release()
+                self._metered(ai, outcome, started, True)
+            finally:
+                await queue.put(None)
+
+        pumps = [asyncio.create_task(pump(ai)) for ai in self._select_providers(clean_message, mentions)]
+        responses = []
+        try:
+            remaining = len(pumps)
+            while remaining:
+                event = await queue.get()
+                if event is None:
+                    remaining -= 1
+                    continue
+                if event['event'] == 'done':
+                    response = {key: value for key, value in event.items() if key != 'event'}
+                    responses.append(response)
+                    # the client already has the text from the deltas, unless this is an error
+                    if not response.get('error'):
+                        event = {key: value for key, value in event.items() if key != 'content'}
+                yield event
+        finally:
+            # The client may disconnect mid-stream; stop the provider calls
+            for task in pumps:
+                task.cancel()
+
+        await self._store_conversation(conversation, message, responses)
+        yield {'event': 'end', 'thread_id': str(conversation.id)}
 
     def _is_technical_query(self, message: str) -> bool:
         """Determine if query should go to Claude (technical) or ChatGPT (creative)"""
@@ -103,15 +449,32 @@ class AIRoutingService:
         message_lower = message.lower()
         return any(keyword in message_lower for keyword in technical_keywords)
 
-    async def _call_claude(self, message: str, context: Dict) -> Dict:
+    async def _cached_response(self, cache_key: str, bypass_cache: bool) -> Optional[Dict]:
+        if bypass_cache or not settings.AI_RESPONSE_CACHE_ENABLED:
+            return None
+        cached = await get_cache("ai:response", settings.AI_RESPONSE_CACHE_MAX_ENTRIES).get(cache_key)
+        return {**cached, 'cached': True} if cached is not None else None
+
+    async def _cache_response(self, cache_key: str, response: Dict):
+        # errors are never cached; a bypassed request still refreshes the entry
+        if settings.AI_RESPONSE_CACHE_ENABLED and not response.get('error'):
+            await get_cache("ai:response", settings.AI_RESPONSE_CACHE_MAX_ENTRIES).set(
+                cache_key, response, settings.AI_RESPONSE_CACHE_TTL
+            )
+
+    async def _call_claude(self, message: str, context: Dict, bypass_cache: bool = False) -> Dict:
         """Call Claude API with context"""
+        # Build context-aware prompt
+        system_prompt = self._build_claude_system_prompt(context)
+        cache_key = response_cache_key('claude', CLAUDE_MODEL, message, system_prompt)
+        cached = await self._cached_response(cache_key, bypass_cache)
+        if cached is not None:
+            return cached
+
         try:
-            # Build context-aware prompt
-            system_prompt = self._build_claude_system_prompt(context)
-            
             response = await self.anthropic_client.messages.create(
-                model="claude-3-5-sonnet-20241022",
-                max_tokens=1000,
+                model=CLAUDE_MODEL,
+                max_tokens=MAX_TOKENS,
                 system=system_prompt,
                 messages=[{
                     "role": "user",
@@ -119,11 +482,13 @@ class AIRoutingService:
                 }]
             )
             
-            return {
+            token_usage = claude_token_usage(response.usage)
+            result = {
                 'ai': 'claude',
                 'content': response.content[0].text,
                 'model': 'claude-3-5-sonnet',
-                'tokens_used': response.usage.input_tokens + response.usage.output_tokens
+                'tokens_used': sum(token_usage.values()),
+                'token_usage': token_usage
             }
         
         except Exception as e:
@@ -133,26 +498,34 @@ class AIRoutingService:
                 'error': True
             }
 
-    async def _call_chatgpt(self, message: str, context: Dict) -> Dict:
+        await self._cache_response(cache_key, result)
+        return result
+
+    async def _call_chatgpt(self, message: str, context: Dict, bypass_cache: bool = False) -> Dict:
         """Call ChatGPT API with context"""
+        # Build context-aware prompt
+        system_prompt = self._build_chatgpt_system_prompt(context)
+        cache_key = response_cache_key('chatgpt', CHATGPT_MODEL, message, system_prompt)
+        cached = await self._cached_response(cache_key, bypass_cache)
+        if cached is not None:
+            return cached
+
         try:
-            # Build context-aware prompt
-            system_prompt = self._build_chatgpt_system_prompt(context)
-            
             response = await self.openai_client.chat.completions.create(
-                model="gpt-4-turbo-preview",
+                model=CHATGPT_MODEL,
                 messages=[
                     {"role": "system", "content": system_prompt},
                     {"role": "user", "content": message}
                 ],
-                max_tokens=1000
+                max_tokens=MAX_TOKENS
             )
             
-            return {
+            result = {
                 'ai': 'chatgpt',
                 'content': response.choices[0].message.content,
                 'model': 'gpt-4-turbo',
-                'tokens_used': response.usage.total_tokens
+                'tokens_used': response.usage.total_tokens,
+                'token_usage': openai_token_usage(response.usage)
             }
         
         except Exception as e:
@@ -162,119 +535,177 @@ class AIRoutingService:
                 'error': True
             }
 
-    def _build_claude_system_prompt(self, context: Dict) -> str:
-        """Build system prompt for Claude with current context"""
-        prompt = """You are Claude, the engineering AI assistant for Rhythmiq Personal OS. You help with technical implementation, code review, architecture decisions, and debugging.
+        await self._cache_response(cache_key, result)
+        return result
 
-You have access to the user's current context:"""
-        
-        if context.get('current_mits'):
-            prompt += f"\n\nCurrent MITs (Most Important Tasks): {[task['title'] for task in context['current_mits']]}"
-        
-        if context.get('recent_ideas'):
-            prompt += f"\n\nRecent Ideas: {[idea['title'] for idea in context['recent_ideas']]}"
-        
-        if context.get('chaos_level'):
-            prompt += f"\n\nCurrent mental state: {context['chaos_level']['level']} - {context['chaos_level']['message']}"
-        
-        prompt += "\n\nProvide clear, actionable technical guidance. Be concise but thorough."
-        
-        return prompt
+    async def _stream_claude(self, message: str, context: Dict, bypass_cache: bool = False) -> AsyncIterator[Dict]:
+        """Stream Claude's reply as delta events, then a 'done' event shaped like _call_claude's result"""
+        system_prompt = self._build_claude_system_prompt(context)
+        cache_key = response_cache_key('claude', CLAUDE_MODEL, message, system_prompt)
+        cached = await self._cached_response(cache_key, bypass_cache)
+        if cached is not None:
+            yield {'event': 'delta', 'ai': 'claude', 'content': cached['content']}
+            yield {'event': 'done', **cached}
+            return
+
+        parts = []
+        try:
+            async with self.anthropic_client.messages.stream(
+                model=CLAUDE_MODEL,
+                max_tokens=MAX_TOKENS,
+                system=system_prompt,
+                messages=[{"role": "user", "content": message}]
+            ) as stream:
+                async for text in stream.text_stream:
+                    parts.append(text)
+                    yield {'event': 'delta', 'ai': 'claude', 'content': text}
+                final = await stream.get_final_message()
+
+            token_usage = claude_token_usage(final.usage)
+            result = {
+                'ai': 'claude',
+                'content': ''.join(parts),
+                'model': 'claude-3-5-sonnet',
+                'tokens_used': sum(token_usage.values()),
+                'token_usage': token_usage
+            }
+
+        except Exception as e:
+            yield {'event': 'done', 'ai': 'claude', 'content': f"Error calling Claude: {str(e)}", 'error': True}
+            return
+
+        await self._cache_response(cache_key, result)
+        yield {'event': 'done', **result}
+
+    async def _stream_chatgpt(self, message: str, context: Dict, bypass_cache: bool = False) -> AsyncIterator[Dict]:
+        """Stream ChatGPT's reply as delta events, then a 'done' event shaped like _call_chatgpt's result"""
+        system_prompt = self._build_chatgpt_system_prompt(context)
+        cache_key = response_cache_key('chatgpt', CHATGPT_MODEL, message, system_prompt)
+        cached = await self._cached_response(cache_key, bypass_cache)
+        if cached is not None:
+            yield {'event': 'delta', 'ai': 'chatgpt', 'content': cached['content']}
+            yield {'event': 'done', **cached}
+            return
+
+        parts, tokens_used, token_usage = [], None, None
+        try:
+            stream = await self.openai_client.chat.completions.create(
+                model=CHATGPT_MODEL,
+                messages=[
+                    {"role": "system", "content": system_prompt},
+                    {"role": "user", "content": message}
+                ],
+                max_tokens=MAX_TOKENS,
+                stream=True,
+                stream_options={"include_usage": True}
+            )
+            async for chunk in stream:
+                # the final chunk carries usage and no choices
+                if chunk.usage is not None:
+                    tokens_used = chunk.usage.total_tokens
+                    token_usage = openai_token_usage(chunk.usage)
+                if chunk.choices and chunk.choices[0].delta.content:
+                    text = chunk.choices[0].delta.content
+                    parts.append(text)
+                    yield {'event': 'delta', 'ai': 'chatgpt', 'content': text}
+
+            result = {
+                'ai': 'chatgpt',
+                'content': ''.join(parts),
+                'model': 'gpt-4-turbo',
+                'tokens_used': tokens_used,
+                'token_usage': token_usage
+            }
+
+        except Exception as e:
+            yield {'event': 'done', 'ai': 'chatgpt', 'content': f"Error calling ChatGPT: {str(e)}", 'error': True}
+            return
+
+        await self._cache_response(cache_key, result)
+        yield {'event': 'done', **result}
+
+    def _build_claude_system_prompt(self, context: Dict) -> List[Dict]:
+        """Claude's system prompt as content blocks: the static preamble, marked
+        as a prompt-cache breakpoint, then this request's context"""
+        blocks = [{"type": "text", "text": CLAUDE_SYSTEM_PREFIX, "cache_control": {"type": "ephemeral"}}]
+        suffix = self._build_context_prompt(context, "Current MITs (Most Important Tasks)")
+        if suffix:
+            blocks.append({"type": "text", "text": suffix})
+        return blocks
 
     def _build_chatgpt_system_prompt(self, context: Dict) -> str:
-        """Build system prompt for ChatGPT with current context"""
-        prompt = """You are the creative AI assistant for Rhythmiq Personal OS. You help with brainstorming, planning, writing, and strategic thinking.
+        """ChatGPT's system prompt: the static preamble, then this request's context
+        (OpenAI caches matching prompt prefixes automatically)"""
+        suffix = self._build_context_prompt(context, "Current MITs")
+        return f"{CHATGPT_SYSTEM_PREFIX}\n\n{suffix}" if suffix else CHATGPT_SYSTEM_PREFIX
 
-You have access to the user's current context:"""
-        
+    def _build_context_prompt(self, context: Dict, mits_label: str) -> str:
+        """The per-request part of the system prompt"""
+        sections = []
         if context.get('current_mits'):
-            prompt += f"\n\nCurrent MITs: {[task['title'] for task in context['current_mits']]}"
-        
+            sections.append(f"{mits_label}: {[task['title'] for task in context['current_mits']]}")
+
         if context.get('recent_ideas'):
-            prompt += f"\n\nRecent Ideas: {[idea['title'] for idea in context['recent_ideas']]}"
-        
+            sections.append(f"Recent Ideas: {[idea['title'] for idea in context['recent_ideas']]}")
+
         if context.get('chaos_level'):
-            prompt += f"\n\nCurrent mental state: {context['chaos_level']['level']} - {context['chaos_level']['message']}"
-        
-        prompt += "\n\nProvide creative, inspiring, and strategic guidance. Help organize thoughts and suggest next steps."
-        
-        return prompt
+            sections.append(f"Current mental state: {context['chaos_level']['level']} - {context['chaos_level']['message']}")
+
+        return "\n\n".join(sections)
 
     async def _gather_context(self) -> Dict:
-        """Gather relevant context for AI conversations"""
-        # Get current MITs
-        current_mits = self.db.query(Task).filter(
-            Task.user_id == self.user_id,
-            Task.is_mit == True,
-            Task.status != "done"
-        ).limit(3).all()
-        
-        # Get recent ideas
-        recent_ideas = (
-            self.db.query(Idea)
-            .filter(Idea.user_id == self.user_id)
-            .order_by(Idea.created_at.desc())
-            .limit(5)
-            .all()
-        )
-        
-        # Get chaos level
-        from services.chaos_detection import ChaosDetectionService
-        chaos_service = ChaosDetectionService(self.db, self.user_id)
-        chaos_data = await chaos_service.get_current_chaos_level()
-        
-        return {
-            'current_mits': [{'title': task.title, 'status': task.status} for task in current_mits],
-            'recent_ideas': [{'title': idea.title, 'status': idea.status} for idea in recent_ideas],
-            'chaos_level': chaos_data
-        }
+        """Gather relevant context for AI conversations (cached per user, loaded concurrently)"""
+        return await ContextSnapshotService(self.db, self.user_id).get_snapshot()
 
     async def _get_or_create_thread(self, thread_id: Optional[UUID]) -> AIConversation:
         """Get existing thread or create new one"""
-        if thread_id:
-            conversation = self.db.query(AIConversation).filter(
+        conversation = await self._get_thread(thread_id)
+        if conversation is None:
+            conversation = await self._new_thread()
+            await self.db.commit()
+            await self.db.refresh(conversation)
+        return conversation
+
+    async def _get_thread(self, thread_id: Optional[UUID]) -> Optional[AIConversation]:
+        if not thread_id:
+            return None
+        return await self.db.scalar(
+            select(AIConversation).where(
                 AIConversation.id == thread_id,
                 AIConversation.user_id == self.user_id
-            ).first()
-            if conversation:
-                return conversation
-        
-        # Create new conversation
+            )
+        )
+
+    async def _new_thread(self) -> AIConversation:
+        """A new conversation, flushed but left for the caller to commit"""
         conversation = AIConversation(
             user_id=self.user_id,
             thread_title="New AI Conversation",
-            messages=[],
             ai_participants=[]
         )
         self.db.add(conversation)
-        self.db.commit()
-        self.db.refresh(conversation)
-        
+        await self.db.flush()
         return conversation
 
     async def _store_conversation(self, conversation: AIConversation, user_message: str, ai_responses: List[Dict]):
-        """Store conversation in database"""
-        # Add user message
-        conversation.messages.append({
-            'role': 'user',
-            'content': user_message,
-            'timestamp': str(asyncio.get_event_loop().time())
-        })
-        
-        # Add AI responses
+        """Append the user message and AI responses to the thread"""
+        messages = [{'role': 'user', 'content': user_message}]
         for response in ai_responses:
-            conversation.messages.append({
+            messages.append({
                 'role': 'assistant',
                 'ai': response['ai'],
                 'content': response['content'],
-                'timestamp': str(asyncio.get_event_loop().time()),
                 'model': response.get('model'),
                 'tokens_used': response.get('tokens_used')
             })
-            
-            # Track AI participants
-            if response['ai'] not in conversation.ai_participants:
-                conversation.ai_participants.append(response['ai'])
-        
-        # Update conversation
-        self.db.commit()
\ No newline at end of file
+        await self.conversations.append(conversation.id, messages)
+
+        # Track AI participants (reassigned so the JSON column is flagged dirty)
+        participants = list(conversation.ai_participants or [])
+        for response in ai_responses:
+            if response['ai'] not in participants:
+                participants.append(response['ai'])
+        if participants != conversation.ai_participants:
+            conversation.ai_participants = participants
+
+        await self.db.commit()
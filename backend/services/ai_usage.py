@@ -0,0 +1,195 @@
+import asyncio
+import logging
+from datetime import datetime
+from typing import Dict, List, Optional
+from uuid import UUID
+
+from sqlalchemy import func, insert, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from core.config import settings
+from core.database import AsyncSessionLocal
+from models.database import AIUsageRecord
+from services.chaos_history import as_utc
+
+logger = logging.getLogger(__name__)
+
+TOKEN_COLUMNS = ("input_tokens", "cached_input_tokens", "cache_write_tokens", "output_tokens")
+# Outcomes that actually waited on the provider; cache hits and skipped calls
+# would drag the latency percentiles towards zero
+TIMED_OUTCOMES = ("ok", "error", "timeout")
+
+
+def usage_outcome(result: Dict) -> str:
+    if result.get('cancelled'):
+        return 'cancelled'
+    if result.get('skipped'):
+        return 'skipped'
+    if result.get('busy'):
+        return 'rejected'
+    if result.get('timeout'):
+        return 'timeout'
+    if result.get('error'):
+        return 'error'
+    return 'cached' if result.get('cached') else 'ok'
+
+
+def percentile(ordered: List[float], fraction: float) -> Optional[float]:
+    """Linear interpolation between closest ranks, like Postgres percentile_cont"""
+    if not ordered:
+        return None
+    position = (len(ordered) - 1) * fraction
+    lower = int(position)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)
+
+
+class AIUsageRecorder:
+    """Buffered writer for AIUsageRecord rows.
+
+    record() only appends to an in-memory buffer, so a chat request never
+    waits on the metering write. The buffer is inserted in one statement once
+    AI_USAGE_BATCH_SIZE records are waiting, every AI_USAGE_FLUSH_SECONDS
+    while the periodic flusher runs (started with the app), and on close().
+    A batch that fails to insert is logged and dropped.
+    """
+
+    def __init__(self, session_factory=AsyncSessionLocal):
+        self.session_factory = session_factory
+        self.buffer: List[Dict] = []
+        self._flusher: Optional[asyncio.Task] = None
+        self._flushes = set()
+
+    def record(self, user_id: UUID, provider: str, model: str, result: Dict, latency: float, streamed: bool = False):
+        """Buffer one provider call; `result` is the routing result dict, `latency` in seconds"""
+        # a response cache hit cost no tokens
+        usage = {} if result.get('cached') else (result.get('token_usage') or {})
+        self.buffer.append({
+            'user_id': user_id,
+            'provider': provider,
+            'model': model,
+            'outcome': usage_outcome(result),
+            'streamed': streamed,
+            'input_tokens': usage.get('uncached_input_tokens') or 0,
+            'cached_input_tokens': usage.get('cached_input_tokens') or 0,
+            'cache_write_tokens': usage.get('cache_write_tokens') or 0,
+            'output_tokens': usage.get('output_tokens') or 0,
+            'latency_ms': round(latency * 1000),
+            'created_at': datetime.utcnow(),
+        })
+        if len(self.buffer) >= settings.AI_USAGE_BATCH_SIZE:
+            task = asyncio.get_running_loop().create_task(self.flush())
+            self._flushes.add(task)
+            task.add_done_callback(self._flushes.discard)
+
+    async def flush(self):
+        """Insert everything buffered so far"""
+        batch, self.buffer = self.buffer, []
+        if not batch:
+            return
+        try:
+            async with self.session_factory() as session:
+                await session.execute(insert(AIUsageRecord), batch)
+                await session.commit()
+        except Exception as e:
+            logger.warning(f"Dropped {len(batch)} AI usage records: {e}")
+
+    def start(self):
+        if self._flusher is None:
+            self._flusher = asyncio.get_running_loop().create_task(self._flush_periodically())
+
+    async def _flush_periodically(self):
+        while True:
+            await asyncio.sleep(settings.AI_USAGE_FLUSH_SECONDS)
+            await self.flush()
+
+    async def close(self):
+        if self._flusher is not None:
+            self._flusher.cancel()
+            await asyncio.gather(self._flusher, return_exceptions=True)
+            self._flusher = None
+        await asyncio.gather(*self._flushes)
+        await self.flush()
+
+
+_recorder: Optional[AIUsageRecorder] = None
+
+
+def get_usage_recorder() -> AIUsageRecorder:
+    global _recorder
+    if _recorder is None:
+        _recorder = AIUsageRecorder()
+    return _recorder
+
+
+async def close_usage_recorder():
+    """Flush what is buffered and stop the periodic flusher (app shutdown)"""
+    global _recorder
+    if _recorder is not None:
+        await _recorder.close()
+        _recorder = None
+
+
+class AIUsageReportService:
+    """Calls, errors, token spend and p50/p95 latency per day, user and provider
+    (plus cache hits and calls the scheduler rejected)"""
+
+    def __init__(self, db: AsyncSession):
+        self.db = db
+
+    async def report(
+        self, start: datetime, end: datetime, user_id: Optional[UUID] = None, provider: Optional[str] = None
+    ) -> List[Dict]:
+        day = func.date(AIUsageRecord.created_at)
+        groups = (day, AIUsageRecord.user_id, AIUsageRecord.provider)
+        filters = [AIUsageRecord.created_at >= as_utc(start), AIUsageRecord.created_at < as_utc(end)]
+        if user_id is not None:
+            filters.append(AIUsageRecord.user_id == user_id)
+        if provider is not None:
+            filters.append(AIUsageRecord.provider == provider)
+        timed = AIUsageRecord.outcome.in_(TIMED_OUTCOMES)
+
+        columns = [
+            func.count().label("calls"),
+            func.count().filter(AIUsageRecord.outcome.in_(("error", "timeout"))).label("errors"),
+            func.count().filter(AIUsageRecord.outcome == "cached").label("cached"),
+            func.count().filter(AIUsageRecord.outcome == "rejected").label("rejected"),
+            *(func.sum(getattr(AIUsageRecord, name)).label(name) for name in TOKEN_COLUMNS),
+        ]
+        postgres = self.db.get_bind().dialect.name == "postgresql"
+        if postgres:
+            columns += [
+                func.percentile_cont(fraction).within_group(AIUsageRecord.latency_ms).filter(timed).label(label)
+                for fraction, label in ((0.5, "p50_latency_ms"), (0.95, "p95_latency_ms"))
+            ]
+        rows = (await self.db.execute(
+            select(*groups, *columns).where(*filters).group_by(*groups).order_by(*groups)
+        )).all()
+
+        latencies = {}
+        if not postgres:
+            # no ordered-set aggregates here: fetch the latencies and interpolate
+            for row in await self.db.execute(
+                select(*groups, AIUsageRecord.latency_ms).where(*filters, timed).order_by(AIUsageRecord.latency_ms)
+            ):
+                latencies.setdefault(tuple(row[:3]), []).append(row.latency_ms)
+
+        report = []
+        for row in rows:
+            entry = {
+                "day": str(row[0]),
+                "user_id": row.user_id,
+                "provider": row.provider,
+                "calls": row.calls,
+                "errors": row.errors,
+                "cached": row.cached,
+                "rejected": row.rejected,
+                **{name: getattr(row, name) or 0 for name in TOKEN_COLUMNS},
+            }
+            if postgres:
+                entry.update(p50_latency_ms=row.p50_latency_ms, p95_latency_ms=row.p95_latency_ms)
+            else:
+                ordered = latencies.get(tuple(row[:3]), [])
+                entry.update(p50_latency_ms=percentile(ordered, 0.5), p95_latency_ms=percentile(ordered, 0.95))
+            report.append(entry)
+        return report
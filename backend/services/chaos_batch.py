@@ -0,0 +1,213 @@
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Dict, Optional
+from uuid import UUID
+
+import numpy as np
+from sqlalchemy import and_, func, insert, or_, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from core.cache import get_cache
+from core.config import settings
+from models.database import ChaosLevel, ChaosMetric, Idea, Task, User
+from services.activity import to_epoch
+from services.chaos_detection import (
+    CHAOS_MESSAGES, LEVEL_LIMITS, count_where, publish_chaos_change, reading_signature, sum_where,
+)
+from services.chaos_history import record_rollups
+
+# Level codes used in the classification arrays, indexes into LEVELS
+LEVELS = [ChaosLevel.FOCUSED, ChaosLevel.SCATTERED, ChaosLevel.SPINNING]
+
+
+@dataclass
+class BatchMetrics:
+    """Chaos metrics for many users as parallel arrays (one slot per user)"""
+    user_ids: np.ndarray
+    capture_velocity: np.ndarray
+    task_switches: np.ndarray
+    urgency_keywords: np.ndarray
+    completion_ratio: np.ndarray
+
+    def __len__(self):
+        return len(self.user_ids)
+
+
+def classify_levels(metrics: BatchMetrics) -> np.ndarray:
+    """Vectorised _determine_chaos_level: an array of LEVELS indexes"""
+    codes = np.zeros(len(metrics), dtype=np.int8)
+    # Apply the mildest level first so worse levels overwrite it
+    for level, limits in reversed(LEVEL_LIMITS):
+        hit = (
+            (metrics.capture_velocity > limits["capture_velocity"])
+            | (metrics.task_switches > limits["task_switches"])
+            | (metrics.urgency_keywords > limits["urgency_keywords"])
+            | (metrics.completion_ratio < limits["completion_ratio"])
+        )
+        codes[hit] = LEVELS.index(level)
+    return codes
+
+
+class BatchChaosEvaluator:
+    """Chaos levels for every active user from two grouped aggregate queries.
+
+    The per-user ChaosDetectionService costs a round trip (or more) per user;
+    a scheduled sweep instead groups the same window counts by user_id,
+    classifies all users at once with NumPy and bulk-inserts the ChaosMetric
+    rows. Like the per-user path, a reading is only persisted when it differs
+    from the user's latest one or CHAOS_METRIC_HEARTBEAT_SECONDS have passed,
+    and the chaos caches are brought up to date afterwards.
+    """
+
+    def __init__(self, db: AsyncSession, now: Optional[datetime] = None):
+        self.db = db
+        self.now = now or datetime.utcnow()
+        self.window_start = self.now - timedelta(seconds=settings.RAPID_CAPTURE_WINDOW)
+        self.today_start = self.now.replace(hour=0, minute=0, second=0, microsecond=0)
+
+    async def compute_metrics(self) -> BatchMetrics:
+        user_ids = (await self.db.scalars(select(User.id).where(User.is_active.is_not(False)).order_by(User.id))).all()
+        slots = {user_id: slot for slot, user_id in enumerate(user_ids)}
+        size = len(user_ids)
+        recent_tasks, task_switches, completed_today, started_today, urgency, recent_ideas = (
+            np.zeros(size, dtype=np.int64) for _ in range(6)
+        )
+
+        earliest = min(self.window_start, self.today_start)
+        task_rows = await self.db.execute(
+            select(
+                Task.user_id,
+                count_where(self.db, Task.created_at >= self.window_start),
+                count_where(self.db, Task.updated_at >= self.window_start),
+                count_where(self.db, Task.completed_at >= self.today_start),
+                count_where(self.db, Task.created_at >= self.today_start),
+                sum_where(self.db, Task.urgency_score, Task.updated_at >= self.window_start),
+            )
+            .where(
+                or_(
+                    Task.created_at >= earliest,
+                    Task.updated_at >= self.window_start,
+                    Task.completed_at >= self.today_start,
+                )
+            )
+            .group_by(Task.user_id)
+        )
+        for user_id, *counts in task_rows:
+            slot = slots.get(user_id)
+            if slot is not None:
+                (recent_tasks[slot], task_switches[slot], completed_today[slot],
+                 started_today[slot], urgency[slot]) = (value or 0 for value in counts)
+
+        idea_rows = await self.db.execute(
+            select(
+                Idea.user_id,
+                count_where(self.db, Idea.created_at >= self.window_start),
+                sum_where(self.db, Idea.urgency_score, Idea.updated_at >= self.window_start),
+            )
+            .where(or_(Idea.created_at >= self.window_start, Idea.updated_at >= self.window_start))
+            .group_by(Idea.user_id)
+        )
+        for user_id, created, idea_urgency in idea_rows:
+            slot = slots.get(user_id)
+            if slot is not None:
+                recent_ideas[slot] = created or 0
+                urgency[slot] += idea_urgency or 0
+
+        # Same float arithmetic and truncation as int((completed / started) * 100)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            ratio = np.where(started_today > 0, completed_today / started_today * 100, 0)
+
+        return BatchMetrics(
+            user_ids=np.array(user_ids, dtype=object),
+            capture_velocity=recent_tasks + recent_ideas,
+            task_switches=task_switches,
+            urgency_keywords=urgency,
+            completion_ratio=ratio.astype(np.int64),
+        )
+
+    async def evaluate(self, persist: bool = True) -> Dict[str, int]:
+        """Classify every active user; returns the number of users per level"""
+        metrics = await self.compute_metrics()
+        codes = classify_levels(metrics)
+
+        if persist and len(metrics):
+            rows = [
+                {
+                    "user_id": user_id,
+                    "created_at": self.now,
+                    "chaos_level": LEVELS[code],
+                    "capture_velocity": velocity,
+                    "task_switches": switches,
+                    "urgency_keywords": urgency,
+                    "completion_ratio": ratio,
+                    "detection_reason": CHAOS_MESSAGES[LEVELS[code]],
+                }
+                for user_id, code, velocity, switches, urgency, ratio in zip(
+                    metrics.user_ids.tolist(),
+                    codes.tolist(),
+                    metrics.capture_velocity.tolist(),
+                    metrics.task_switches.tolist(),
+                    metrics.urgency_keywords.tolist(),
+                    metrics.completion_ratio.tolist(),
+                )
+            ]
+            await self._persist_changed(rows)
+
+        counts = np.bincount(codes, minlength=len(LEVELS))
+        return {level.value: int(count) for level, count in zip(LEVELS, counts)}
+
+    async def _latest_readings(self) -> Dict[UUID, Dict]:
+        """Every user's latest persisted reading as {"signature", "at"}, from one grouped query"""
+        latest = (
+            select(ChaosMetric.user_id, func.max(ChaosMetric.created_at).label("created_at"))
+            .group_by(ChaosMetric.user_id)
+            .subquery()
+        )
+        rows = await self.db.execute(
+            select(
+                ChaosMetric.user_id,
+                ChaosMetric.created_at,
+                ChaosMetric.chaos_level,
+                ChaosMetric.capture_velocity,
+                ChaosMetric.task_switches,
+                ChaosMetric.urgency_keywords,
+                ChaosMetric.completion_ratio,
+            ).join(
+                latest,
+                and_(ChaosMetric.user_id == latest.c.user_id, ChaosMetric.created_at == latest.c.created_at),
+            )
+        )
+        return {
+            row.user_id: {"signature": reading_signature(row.chaos_level, row._mapping), "at": to_epoch(row.created_at)}
+            for row in rows
+        }
+
+    async def _persist_changed(self, rows: list):
+        """Insert the readings that changed or are due a heartbeat, then update the chaos caches"""
+        latest = await self._latest_readings()
+        now = to_epoch(self.now)
+        persisted, changed = {}, []
+        for row in rows:
+            signature = reading_signature(row["chaos_level"], row)
+            last = latest.get(row["user_id"])
+            unchanged = last is not None and last["signature"] == signature
+            if unchanged and now - last["at"] < settings.CHAOS_METRIC_HEARTBEAT_SECONDS:
+                continue
+            if not unchanged:
+                changed.append(row["user_id"])
+            persisted[row["user_id"]] = (row, signature)
+        if not persisted:
+            return
+
+        readings = [row for row, _ in persisted.values()]
+        await self.db.execute(insert(ChaosMetric), readings)
+        await record_rollups(self.db, readings)
+        await self.db.commit()
+
+        await get_cache("chaos:persisted").set_many(
+            {str(user_id): {"signature": signature, "at": now} for user_id, (_, signature) in persisted.items()},
+            settings.CHAOS_METRIC_HEARTBEAT_SECONDS,
+        )
+        if changed:
+            await get_cache("chaos:result").delete(*(str(user_id) for user_id in changed))
+            await publish_chaos_change(changed)
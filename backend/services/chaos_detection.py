@@ -1,55 +1,104 @@
-from sqlalchemy.orm import Session
-from sqlalchemy import and_
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import and_, case, func, or_, select, true
 from datetime import datetime, timedelta
-from typing import Dict, Optional
-import re
+from typing import Awaitable, Callable, Dict, Iterable, List, Optional
 from uuid import UUID
+import logging
+
+from redis.exceptions import RedisError
 
 from models.database import Task, Idea, ChaosMetric, ChaosLevel
+from core.cache import get_cache
 from core.config import settings
+from services.activity import ActivityCounters, on_activity, to_epoch
+from services.chaos_history import record_rollups
+
+logger = logging.getLogger(__name__)
+
+# Worst level first. A level applies when any activity metric is above its
+# limit or the completion ratio is below its limit; shared with the batch sweep.
+LEVEL_LIMITS = [
+    (ChaosLevel.SPINNING, {"capture_velocity": 5, "task_switches": 5, "urgency_keywords": 10, "completion_ratio": 50}),
+    (ChaosLevel.SCATTERED, {"capture_velocity": 2, "task_switches": 2, "urgency_keywords": 5, "completion_ratio": 80}),
+]
+
+CHAOS_MESSAGES = {
+    ChaosLevel.FOCUSED: "You seem focused and on track. Keep it up!",
+    ChaosLevel.SCATTERED: "You're juggling quite a few things. Consider narrowing your focus.",
+    ChaosLevel.SPINNING: "Things look pretty chaotic right now. Let's pause and regroup.",
+}
+
+# Handlers for users whose persisted chaos reading changed (e.g. caches built
+# from it); services.context_snapshot registers one.
+ChaosChangeHandler = Callable[[List[UUID]], Awaitable[None]]
+chaos_change_handlers: List[ChaosChangeHandler] = []
+
+
+def on_chaos_change(handler: ChaosChangeHandler) -> ChaosChangeHandler:
+    """Register an async handler for users whose chaos reading changed"""
+    chaos_change_handlers.append(handler)
+    return handler
+
+
+async def publish_chaos_change(user_ids: Iterable[UUID]):
+    user_ids = list(user_ids)
+    if not user_ids:
+        return
+    for handler in chaos_change_handlers:
+        try:
+            await handler(user_ids)
+        except Exception as e:
+            logger.warning(f"Chaos change handler {handler.__name__} failed: {e}")
+
+
+def reading_signature(chaos_level: ChaosLevel, metrics: Dict) -> list:
+    """What has to differ for a reading to be persisted before the heartbeat"""
+    return [
+        ChaosLevel(chaos_level).value,
+        metrics["capture_velocity"],
+        metrics["task_switches"],
+        metrics["urgency_keywords"],
+        metrics["completion_ratio"],
+    ]
+
+
+def count_where(db: AsyncSession, condition):
+    """COUNT(*) FILTER (WHERE ...) on Postgres, the portable SUM(CASE ...) elsewhere"""
+    if db.get_bind().dialect.name == "postgresql":
+        return func.count().filter(condition)
+    return func.sum(case((condition, 1), else_=0))
+
+
+def sum_where(db: AsyncSession, column, condition):
+    if db.get_bind().dialect.name == "postgresql":
+        return func.sum(column).filter(condition)
+    return func.sum(case((condition, column), else_=0))
 
 
 class ChaosDetectionService:
     """Service for analysing recent activity and determining a user's mental state."""
 
-    def __init__(self, db: Session, user_id: UUID):
+    def __init__(self, db: AsyncSession, user_id: UUID):
         self.db = db
         self.user_id = user_id
         self.now = datetime.utcnow()
         self.window_start = self.now - timedelta(seconds=settings.RAPID_CAPTURE_WINDOW)
-        self.urgency_keywords = [
-            "urgent",
-            "asap",
-            "immediately",
-            "need to",
-            "should",
-            "must",
-            "critical",
-            "important",
-            "deadline",
-            "rush",
-            "quick",
-            "fast",
-        ]
+        self.today_start = self.now.replace(hour=0, minute=0, second=0, microsecond=0)
+        self._window_counts_result: Optional[Dict[str, int]] = None
 
     async def get_current_chaos_level(self) -> Dict:
+        result_cache = get_cache("chaos:result")
+        cached = await result_cache.get(str(self.user_id))
+        if cached is not None:
+            return {**cached, "level": ChaosLevel(cached["level"])}
+
         metrics = await self._calculate_metrics()
         chaos_level = await self._determine_chaos_level(metrics)
         message = await self._generate_chaos_message(chaos_level, metrics)
 
-        chaos_metric = ChaosMetric(
-            user_id=self.user_id,
-            chaos_level=chaos_level,
-            capture_velocity=metrics["capture_velocity"],
-            task_switches=metrics["task_switches"],
-            urgency_keywords=metrics["urgency_keywords"],
-            completion_ratio=metrics["completion_ratio"],
-            detection_reason=message,
-        )
-        self.db.add(chaos_metric)
-        self.db.commit()
+        await self._persist_if_changed(chaos_level, metrics, message)
 
-        return {
+        result = {
             "level": chaos_level,
             "message": message,
             "metrics": metrics,
@@ -58,15 +107,62 @@ class ChaosDetectionService:
                 ChaosLevel.SPINNING,
             ],
         }
+        await result_cache.set(str(self.user_id), result, settings.CHAOS_RESULT_TTL)
+        return result
 
-    async def check_idea_capture_pattern(self) -> Optional[Dict]:
-        recent_ideas = (
-            self.db.query(Idea)
-            .filter(
-                and_(Idea.user_id == self.user_id, Idea.created_at >= self.window_start)
+    async def _persist_if_changed(self, chaos_level: ChaosLevel, metrics: Dict, message: str) -> bool:
+        """Write a ChaosMetric only when the reading changed or the heartbeat is due"""
+        persisted_cache = get_cache("chaos:persisted")
+        signature = reading_signature(chaos_level, metrics)
+        now = to_epoch(self.now)
+
+        last = await persisted_cache.get(str(self.user_id))
+        if last is None:
+            latest = await self.db.scalar(
+                select(ChaosMetric)
+                .where(ChaosMetric.user_id == self.user_id)
+                .order_by(ChaosMetric.created_at.desc())
+                .limit(1)
             )
-            .count()
+            if latest is not None and latest.created_at is not None:
+                last = {
+                    "signature": reading_signature(latest.chaos_level, {
+                        "capture_velocity": latest.capture_velocity,
+                        "task_switches": latest.task_switches,
+                        "urgency_keywords": latest.urgency_keywords,
+                        "completion_ratio": latest.completion_ratio,
+                    }),
+                    "at": to_epoch(latest.created_at),
+                }
+
+        if (
+            last is not None
+            and last["signature"] == signature
+            and now - last["at"] < settings.CHAOS_METRIC_HEARTBEAT_SECONDS
+        ):
+            return False
+
+        reading = {
+            "user_id": self.user_id,
+            "created_at": self.now,
+            "chaos_level": chaos_level,
+            "capture_velocity": metrics["capture_velocity"],
+            "task_switches": metrics["task_switches"],
+            "urgency_keywords": metrics["urgency_keywords"],
+            "completion_ratio": metrics["completion_ratio"],
+        }
+        self.db.add(ChaosMetric(**reading, detection_reason=message))
+        await record_rollups(self.db, [reading])
+        await self.db.commit()
+        await persisted_cache.set(
+            str(self.user_id), {"signature": signature, "at": now}, settings.CHAOS_METRIC_HEARTBEAT_SECONDS
         )
+        if last is None or last["signature"] != signature:
+            await publish_chaos_change([self.user_id])
+        return True
+
+    async def check_idea_capture_pattern(self) -> Optional[Dict]:
+        recent_ideas = (await self._window_counts())["recent_ideas"]
         if recent_ideas >= settings.RAPID_CAPTURE_THRESHOLD:
             return {
                 "trigger": "rapid_capture",
@@ -76,13 +172,7 @@ class ChaosDetectionService:
         return None
 
     async def check_task_switching_pattern(self) -> Optional[Dict]:
-        recent_updates = (
-            self.db.query(Task)
-            .filter(
-                and_(Task.user_id == self.user_id, Task.updated_at >= self.window_start)
-            )
-            .count()
-        )
+        recent_updates = (await self._window_counts())["task_switches"]
         if recent_updates >= 5:
             return {
                 "trigger": "task_switching",
@@ -92,13 +182,7 @@ class ChaosDetectionService:
         return None
 
     async def check_task_creation_pattern(self) -> Optional[Dict]:
-        recent_tasks = (
-            self.db.query(Task)
-            .filter(
-                and_(Task.user_id == self.user_id, Task.created_at >= self.window_start)
-            )
-            .count()
-        )
+        recent_tasks = (await self._window_counts())["recent_tasks"]
         if recent_tasks >= 3:
             return {
                 "trigger": "rapid_task_creation",
@@ -108,94 +192,104 @@ class ChaosDetectionService:
         return None
 
     async def _calculate_metrics(self) -> Dict:
-        recent_ideas = (
-            self.db.query(Idea)
-            .filter(and_(Idea.user_id == self.user_id, Idea.created_at >= self.window_start))
-            .count()
-        )
-        recent_tasks = (
-            self.db.query(Task)
-            .filter(and_(Task.user_id == self.user_id, Task.created_at >= self.window_start))
-            .count()
-        )
-        capture_velocity = recent_ideas + recent_tasks
-
-        task_switches = (
-            self.db.query(Task)
-            .filter(and_(Task.user_id == self.user_id, Task.updated_at >= self.window_start))
-            .count()
-        )
+        counts = await self._window_counts()
+        capture_velocity = counts["recent_ideas"] + counts["recent_tasks"]
 
-        urgency_count = await self._count_urgency_keywords()
+        urgency_count = counts["task_urgency"] + counts["idea_urgency"]
 
-        today_start = self.now.replace(hour=0, minute=0, second=0, microsecond=0)
-        completed_today = (
-            self.db.query(Task)
-            .filter(and_(Task.user_id == self.user_id, Task.completed_at >= today_start))
-            .count()
-        )
-        started_today = (
-            self.db.query(Task)
-            .filter(and_(Task.user_id == self.user_id, Task.created_at >= today_start))
-            .count()
-        )
+        completed_today = counts["completed_today"]
+        started_today = counts["started_today"]
         completion_ratio = int((completed_today / started_today) * 100) if started_today else 0
 
         return {
             "capture_velocity": capture_velocity,
-            "task_switches": task_switches,
+            "task_switches": counts["task_switches"],
             "urgency_keywords": urgency_count,
             "completion_ratio": completion_ratio,
         }
 
-    async def _count_urgency_keywords(self) -> int:
-        texts = []
-        tasks = (
-            self.db.query(Task)
-            .filter(and_(Task.user_id == self.user_id, Task.updated_at >= self.window_start))
-            .all()
+    async def _window_counts(self) -> Dict[str, int]:
+        """Window counts and urgency sums, read once per evaluation.
+
+        The Redis activity counters answer without touching the database; the
+        single aggregate statement is the fallback. The result is kept on the
+        instance so the check_* patterns reuse it.
+        """
+        if self._window_counts_result is None:
+            counts = await self._counter_window_counts() if settings.CHAOS_COUNTERS_ENABLED else None
+            self._window_counts_result = counts if counts is not None else await self._aggregate_window_counts()
+        return self._window_counts_result
+
+    async def _counter_window_counts(self) -> Optional[Dict[str, int]]:
+        counters = ActivityCounters()
+        window_start, today_start = to_epoch(self.window_start), to_epoch(self.today_start)
+        try:
+            counts = await counters.window_counts(self.user_id, window_start, today_start)
+            if counts is None:
+                # Cold start (or resync due): replay recent rows into the counters
+                await counters.rebuild(self.db, self.user_id, self.now)
+                counts = await counters.window_counts(self.user_id, window_start, today_start)
+            return counts
+        except RedisError as e:
+            logger.warning(f"Chaos counters unavailable, using the database aggregate: {e}")
+            return None
+
+    async def _aggregate_window_counts(self) -> Dict[str, int]:
+        """Every chaos window count and urgency sum in a single aggregate statement"""
+        earliest = min(self.window_start, self.today_start)
+        task_counts = (
+            select(
+                count_where(self.db, Task.created_at >= self.window_start).label("recent_tasks"),
+                count_where(self.db, Task.updated_at >= self.window_start).label("task_switches"),
+                count_where(self.db, Task.completed_at >= self.today_start).label("completed_today"),
+                count_where(self.db, Task.created_at >= self.today_start).label("started_today"),
+                sum_where(self.db, Task.urgency_score, Task.updated_at >= self.window_start).label("task_urgency"),
+            )
+            .where(
+                and_(
+                    Task.user_id == self.user_id,
+                    or_(
+                        Task.created_at >= earliest,
+                        Task.updated_at >= self.window_start,
+                        Task.completed_at >= self.today_start,
+                    ),
+                )
+            )
+            .subquery()
         )
-        ideas = (
-            self.db.query(Idea)
-            .filter(and_(Idea.user_id == self.user_id, Idea.updated_at >= self.window_start))
-            .all()
+        idea_counts = (
+            select(
+                count_where(self.db, Idea.created_at >= self.window_start).label("recent_ideas"),
+                sum_where(self.db, Idea.urgency_score, Idea.updated_at >= self.window_start).label("idea_urgency"),
+            )
+            .where(
+                and_(
+                    Idea.user_id == self.user_id,
+                    or_(Idea.created_at >= self.window_start, Idea.updated_at >= self.window_start),
+                )
+            )
+            .subquery()
         )
-        for t in tasks:
-            texts.append(t.title or "")
-            if t.description:
-                texts.append(t.description)
-        for i in ideas:
-            texts.append(i.title or "")
-            if i.description:
-                texts.append(i.description)
-
-        count = 0
-        for text in texts:
-            lower = text.lower()
-            for kw in self.urgency_keywords:
-                count += len(re.findall(r"\b" + re.escape(kw) + r"\b", lower))
-        return count
+        # both sides are single-row aggregates, so the join is a 1x1 cross join
+        statement = select(task_counts, idea_counts).select_from(task_counts.join(idea_counts, true()))
+        row = (await self.db.execute(statement)).one()
+        return {key: int(value or 0) for key, value in row._mapping.items()}
 
     async def _determine_chaos_level(self, metrics: Dict) -> ChaosLevel:
-        if (
-            metrics["capture_velocity"] > 5
-            or metrics["task_switches"] > 5
-            or metrics["urgency_keywords"] > 10
-            or metrics["completion_ratio"] < 50
-        ):
-            return ChaosLevel.SPINNING
-        if (
-            metrics["capture_velocity"] > 2
-            or metrics["task_switches"] > 2
-            or metrics["urgency_keywords"] > 5
-            or metrics["completion_ratio"] < 80
-        ):
-            return ChaosLevel.SCATTERED
+        for level, limits in LEVEL_LIMITS:
+            if (
+                metrics["capture_velocity"] > limits["capture_velocity"]
+                or metrics["task_switches"] > limits["task_switches"]
+                or metrics["urgency_keywords"] > limits["urgency_keywords"]
+                or metrics["completion_ratio"] < limits["completion_ratio"]
+            ):
+                return level
         return ChaosLevel.FOCUSED
 
     async def _generate_chaos_message(self, level: ChaosLevel, metrics: Dict) -> str:
-        if level == ChaosLevel.FOCUSED:
-            return "You seem focused and on track. Keep it up!"
-        if level == ChaosLevel.SCATTERED:
-            return "You're juggling quite a few things. Consider narrowing your focus."
-        return "Things look pretty chaotic right now. Let's pause and regroup." 
+        return CHAOS_MESSAGES[level]
+
+@on_activity
+async def invalidate_chaos_results(events):
+    """Task and idea writes make the cached chaos level stale"""
+    await get_cache("chaos:result").delete(*{str(event.user_id) for event in events})
@@ -0,0 +1,191 @@
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional
+from uuid import UUID
+
+from sqlalchemy import delete, func, select
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from core.config import settings
+from models.database import ChaosLevel, ChaosMetric, ChaosMetricDaily, ChaosMetricHourly
+
+ROLLUPS = {"hour": ChaosMetricHourly, "day": ChaosMetricDaily}
+ROLLUP_VALUES = (
+    "samples", "focused_count", "scattered_count", "spinning_count",
+    "capture_velocity_sum", "task_switches_sum", "urgency_keywords_sum", "completion_ratio_sum",
+)
+METRICS = ("capture_velocity", "task_switches", "urgency_keywords", "completion_ratio")
+
+# Widest range served by each resolution when the caller asks for "auto"
+RAW_MAX_SPAN = timedelta(days=2)
+HOURLY_MAX_SPAN = timedelta(days=31)
+
+
+def as_utc(value: datetime) -> datetime:
+    """Naive UTC, the form ChaosMetric timestamps are written in"""
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+
+def bucket_start(value: datetime, resolution: str) -> datetime:
+    value = as_utc(value).replace(minute=0, second=0, microsecond=0)
+    return value.replace(hour=0) if resolution == "day" else value
+
+
+def _rollup_rows(readings: List[Dict], resolution: str) -> List[Dict]:
+    buckets: Dict[tuple, Dict] = {}
+    for reading in readings:
+        start = bucket_start(reading["created_at"], resolution)
+        row = buckets.setdefault(
+            (reading["user_id"], start),
+            {"user_id": reading["user_id"], "bucket_start": start, **dict.fromkeys(ROLLUP_VALUES, 0)},
+        )
+        row["samples"] += 1
+        row[f"{ChaosLevel(reading['chaos_level']).value}_count"] += 1
+        for metric in METRICS:
+            row[f"{metric}_sum"] += reading[metric] or 0
+    return list(buckets.values())
+
+
+async def record_rollups(db: AsyncSession, readings: List[Dict], replace: bool = False):
+    """Fold ChaosMetric readings into the hourly and daily rollups.
+
+    `readings` are dicts with the ChaosMetric columns (user_id, created_at,
+    chaos_level and the four metrics). Buckets are upserted by adding to what
+    is already there, or overwritten when `replace` is set (the retention job
+    re-deriving complete days from raw rows). The caller commits.
+    """
+    dialect = postgresql if db.get_bind().dialect.name == "postgresql" else sqlite
+    for resolution, model in ROLLUPS.items():
+        rows = _rollup_rows(readings, resolution)
+        if not rows:
+            continue
+        statement = dialect.insert(model)
+        statement = statement.on_conflict_do_update(
+            index_elements=[model.user_id, model.bucket_start],
+            set_={
+                name: statement.excluded[name] if replace else getattr(model, name) + statement.excluded[name]
+                for name in ROLLUP_VALUES
+            },
+        )
+        await db.execute(statement, rows)
+
+
+async def _rederive_day(db: AsyncSession, day_start: datetime, day_end: datetime, delete_raw: bool) -> int:
+    """Rebuild the rollup buckets of one whole day from its raw rows (one transaction)"""
+    in_day = (ChaosMetric.created_at >= day_start) & (ChaosMetric.created_at < day_end)
+    readings = (await db.execute(
+        select(
+            ChaosMetric.user_id, ChaosMetric.created_at, ChaosMetric.chaos_level,
+            *(getattr(ChaosMetric, metric) for metric in METRICS),
+        ).where(in_day)
+    )).mappings().all()
+    await record_rollups(db, [dict(reading) for reading in readings], replace=True)
+    if delete_raw:
+        await db.execute(delete(ChaosMetric).where(in_day))
+    await db.commit()
+    return len(readings)
+
+
+async def downsample_raw_metrics(db: AsyncSession, now: Optional[datetime] = None) -> Dict[str, int]:
+    """Retention: fold raw ChaosMetric rows past their retention into the
+    rollups and delete them, one whole day per transaction, then drop hourly
+    rollups past theirs. Returns the number of rows removed from each table.
+    """
+    now = as_utc(now or datetime.utcnow())
+    raw_cutoff = bucket_start(now - timedelta(days=settings.CHAOS_METRIC_RAW_RETENTION_DAYS), "day")
+    hourly_cutoff = bucket_start(now - timedelta(days=settings.CHAOS_METRIC_HOURLY_RETENTION_DAYS), "day")
+    removed = {"raw": 0, "hourly": 0}
+
+    while True:
+        oldest = await db.scalar(select(func.min(ChaosMetric.created_at)).where(ChaosMetric.created_at < raw_cutoff))
+        if oldest is None:
+            break
+        day_start = bucket_start(oldest, "day")
+        removed["raw"] += await _rederive_day(db, day_start, min(day_start + timedelta(days=1), raw_cutoff), True)
+
+    result = await db.execute(delete(ChaosMetricHourly).where(ChaosMetricHourly.bucket_start < hourly_cutoff))
+    await db.commit()
+    removed["hourly"] = result.rowcount
+    return removed
+
+
+async def rebuild_rollups(db: AsyncSession) -> int:
+    """Re-derive every rollup bucket that still has raw rows (backfill after
+    the rollup tables are added). Returns the number of raw rows read.
+    """
+    oldest = await db.scalar(select(func.min(ChaosMetric.created_at)))
+    latest = await db.scalar(select(func.max(ChaosMetric.created_at)))
+    if oldest is None:
+        return 0
+    day_start, read = bucket_start(oldest, "day"), 0
+    while day_start <= as_utc(latest):
+        read += await _rederive_day(db, day_start, day_start + timedelta(days=1), False)
+        day_start += timedelta(days=1)
+    return read
+
+
+class ChaosHistoryService:
+    """Chaos level history for charts, read from the coarsest table that
+    still resolves the requested range: raw readings for a couple of days,
+    hourly rollups up to a month, daily rollups beyond that.
+    """
+
+    def __init__(self, db: AsyncSession, user_id: UUID):
+        self.db = db
+        self.user_id = user_id
+        self.now = datetime.utcnow()
+
+    def pick_resolution(self, start: datetime, end: datetime) -> str:
+        span = end - start
+        if span <= RAW_MAX_SPAN and start >= self.now - timedelta(days=settings.CHAOS_METRIC_RAW_RETENTION_DAYS):
+            return "raw"
+        if span <= HOURLY_MAX_SPAN and start >= self.now - timedelta(days=settings.CHAOS_METRIC_HOURLY_RETENTION_DAYS):
+            return "hour"
+        return "day"
+
+    async def get_history(self, start: datetime, end: datetime, resolution: str = "auto") -> Dict:
+        start, end = as_utc(start), as_utc(end)
+        if resolution == "auto":
+            resolution = self.pick_resolution(start, end)
+
+        if resolution == "raw":
+            points = await self._raw_points(start, end)
+        else:
+            points = await self._rollup_points(ROLLUPS[resolution], bucket_start(start, resolution), end)
+        return {"resolution": resolution, "start": start, "end": end, "points": points}
+
+    async def _raw_points(self, start: datetime, end: datetime) -> List[Dict]:
+        rows = await self.db.scalars(
+            select(ChaosMetric)
+            .where(ChaosMetric.user_id == self.user_id, ChaosMetric.created_at >= start, ChaosMetric.created_at < end)
+            .order_by(ChaosMetric.created_at)
+        )
+        return [
+            {
+                "at": row.created_at,
+                "samples": 1,
+                "levels": {level.value: int(row.chaos_level == level) for level in ChaosLevel},
+                **{metric: getattr(row, metric) for metric in METRICS},
+            }
+            for row in rows
+        ]
+
+    async def _rollup_points(self, model, start: datetime, end: datetime) -> List[Dict]:
+        rows = await self.db.scalars(
+            select(model)
+            .where(model.user_id == self.user_id, model.bucket_start >= start, model.bucket_start < end)
+            .order_by(model.bucket_start)
+        )
+        return [
+            {
+                "at": row.bucket_start,
+                "samples": row.samples,
+                "levels": {level.value: getattr(row, f"{level.value}_count") for level in ChaosLevel},
+                # means over the bucket's readings
+                **{metric: round(getattr(row, f"{metric}_sum") / row.samples, 2) for metric in METRICS},
+            }
+            for row in rows
+            if row.samples
+        ]
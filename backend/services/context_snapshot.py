@@ -0,0 +1,92 @@
+import asyncio
+from typing import Dict, List
+from uuid import UUID
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from core.cache import get_cache
+from core.config import settings
+from models.database import Idea, Task, TaskStatus
+from services.activity import on_activity
+from services.chaos_detection import ChaosDetectionService, on_chaos_change
+
+SNAPSHOT_NAMESPACE = "context:snapshot"
+
+
+class ContextSnapshotService:
+    """A user's current MITs, recent ideas and chaos level in one snapshot.
+
+    The three parts are loaded concurrently, each on its own session from the
+    caller's engine (one AsyncSession cannot run statements in parallel), and
+    the snapshot is cached per user for AI_CONTEXT_TTL seconds. Task and idea
+    writes, and chaos level changes, drop it. Values are plain JSON types so
+    the memory and Redis backends return the same thing.
+    """
+
+    def __init__(self, db: AsyncSession, user_id: UUID):
+        self.db = db
+        self.user_id = user_id
+
+    async def get_snapshot(self, refresh: bool = False) -> Dict:
+        cache = get_cache(SNAPSHOT_NAMESPACE)
+        if not refresh:
+            cached = await cache.get(str(self.user_id))
+            if cached is not None:
+                return cached
+
+        current_mits, recent_ideas, chaos_level = await asyncio.gather(
+            self._in_own_session(self._current_mits),
+            self._in_own_session(self._recent_ideas),
+            self._in_own_session(self._chaos_level),
+        )
+        snapshot = {
+            'current_mits': current_mits,
+            'recent_ideas': recent_ideas,
+            'chaos_level': chaos_level,
+        }
+        await cache.set(str(self.user_id), snapshot, settings.AI_CONTEXT_TTL)
+        return snapshot
+
+    async def _in_own_session(self, load):
+        async with AsyncSession(bind=self.db.bind, expire_on_commit=False) as session:
+            return await load(session)
+
+    async def _current_mits(self, session: AsyncSession) -> List[Dict]:
+        tasks = (await session.execute(
+            select(Task.title, Task.status).where(
+                Task.user_id == self.user_id,
+                Task.is_mit,
+                Task.status != TaskStatus.DONE
+            ).limit(3)
+        )).all()
+        return [{'title': title, 'status': status.value if status else None} for title, status in tasks]
+
+    async def _recent_ideas(self, session: AsyncSession) -> List[Dict]:
+        ideas = (await session.execute(
+            select(Idea.title, Idea.status)
+            .where(Idea.user_id == self.user_id)
+            .order_by(Idea.created_at.desc())
+            .limit(5)
+        )).all()
+        return [{'title': title, 'status': status.value if status else None} for title, status in ideas]
+
+    async def _chaos_level(self, session: AsyncSession) -> Dict:
+        chaos = await ChaosDetectionService(session, self.user_id).get_current_chaos_level()
+        return {**chaos, 'level': chaos['level'].value}
+
+
+async def invalidate_context_snapshot(*user_ids: UUID):
+    await get_cache(SNAPSHOT_NAMESPACE).delete(*(str(user_id) for user_id in user_ids))
+
+
+@on_activity
+async def invalidate_context_snapshots(events):
+    """Task and idea writes change the MITs, ideas and chaos level in the snapshot"""
+    await invalidate_context_snapshot(*{event.user_id for event in events})
+
+
+@on_chaos_change
+async def invalidate_context_snapshots_on_chaos_change(user_ids):
+    """A changed chaos reading makes the snapshot's chaos level stale"""
+    await invalidate_context_snapshot(*user_ids)
@@ -0,0 +1,74 @@
+from typing import Dict, List, Optional
+from uuid import UUID
+
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from models.database import AIConversation, AIMessage
+
+
+class ConversationStore:
+    """Append-only AI conversation messages keyed by (conversation_id, seq).
+
+    Appending allocates a block of sequence numbers with one UPDATE of the
+    conversation's message_count and inserts only the new rows, so the cost
+    of a turn does not grow with the length of the thread. Reads page
+    backwards from the newest message using seq as the keyset cursor.
+    """
+
+    def __init__(self, db: AsyncSession):
+        self.db = db
+
+    async def get_conversation(self, conversation_id: UUID, user_id: UUID) -> Optional[AIConversation]:
+        return await self.db.scalar(
+            select(AIConversation).where(AIConversation.id == conversation_id, AIConversation.user_id == user_id)
+        )
+
+    async def append(self, conversation_id: UUID, messages: List[Dict]) -> List[AIMessage]:
+        """Add messages (dicts of AIMessage columns) at the end of the thread; the caller commits"""
+        if not messages:
+            return []
+
+        # The row lock taken by the UPDATE serialises concurrent appends to one thread
+        last_seq = await self.db.scalar(
+            update(AIConversation)
+            .where(AIConversation.id == conversation_id)
+            .values(message_count=AIConversation.message_count + len(messages))
+            .returning(AIConversation.message_count)
+        )
+        if last_seq is None:
+            raise ValueError(f"Conversation {conversation_id} does not exist")
+
+        first_seq = last_seq - len(messages) + 1
+        rows = [
+            AIMessage(conversation_id=conversation_id, seq=first_seq + offset, **message)
+            for offset, message in enumerate(messages)
+        ]
+        self.db.add_all(rows)
+        return rows
+
+    async def recent(self, conversation_id: UUID, limit: int = 50, before_seq: Optional[int] = None) -> Dict:
+        """Up to `limit` messages before `before_seq` (newest first page when omitted), oldest first"""
+        query = select(AIMessage).where(AIMessage.conversation_id == conversation_id)
+        if before_seq is not None:
+            query = query.where(AIMessage.seq < before_seq)
+        rows = list((await self.db.scalars(query.order_by(AIMessage.seq.desc()).limit(limit))).all())
+        rows.reverse()
+
+        return {
+            "messages": [self.to_dict(row) for row in rows],
+            # pass back as before_seq for the next (older) page
+            "next_before": rows[0].seq if rows and rows[0].seq > 1 else None,
+        }
+
+    @staticmethod
+    def to_dict(message: AIMessage) -> Dict:
+        return {
+            "seq": message.seq,
+            "role": message.role,
+            "ai": message.ai,
+            "content": message.content,
+            "model": message.model,
+            "tokens_used": message.tokens_used,
+            "created_at": message.created_at,
+        }
@@ -0,0 +1,187 @@
+import asyncio
+import json
+import logging
+import time
+from datetime import datetime
+from typing import Dict, List, Optional, Set
+from uuid import UUID
+
+from openai import AsyncOpenAI
+from sqlalchemy import bindparam, func, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from core.ai_clients import get_openai_client
+from core.ai_scheduler import BACKGROUND, ProviderBusy, get_scheduler
+from core.circuit_breaker import get_breaker
+from core.config import settings
+from core.database import AsyncSessionLocal
+from models.database import Idea
+from services.ai_routing import CHATGPT_MODEL, openai_token_usage
+from services.ai_usage import get_usage_recorder
+
+logger = logging.getLogger(__name__)
+
+ENRICHMENT_PROMPT = """You enrich ideas captured in Rhythmiq Personal OS. You are given a JSON list of ideas, each with an id, title and description.
+
+For every idea return a few keywords, a one-sentence summary, a category (hardware, writing, business, software, learning, personal or other) and one small, concrete next step.
+
+Reply with only a JSON object of the form {"ideas": [{"id": "<the idea's id>", "keywords": ["..."], "summary": "...", "category": "...", "next_step": "..."}]}, covering every idea exactly once."""
+ENRICHMENT_FIELDS = ("keywords", "summary", "category", "next_step")
+OUTPUT_TOKENS_PER_IDEA = 150
+
+_ideas = Idea.__table__
+# One statement for the whole batch. updated_at is kept as it was: enrichment
+# is not user activity and must not count as an idea edit for chaos detection.
+ENRICH_IDEA = (
+    update(_ideas)
+    .where(_ideas.c.id == bindparam("idea_id"))
+    .values(ai_enriched=True, ai_enrichment_data=bindparam("data"), updated_at=_ideas.c.updated_at)
+)
+
+
+class IdeaEnrichmentPipeline:
+    """Fills Idea.ai_enrichment_data in the background, in batches.
+
+    Each batch loads up to IDEA_ENRICHMENT_BATCH_SIZE unenriched ideas
+    (oldest first), packs each user's ideas IDEA_ENRICHMENT_IDEAS_PER_REQUEST
+    at a time into single ChatGPT requests - queued as BACKGROUND work behind
+    interactive chat, under the same breaker, deadline and metering - and
+    writes the results back with one bulk UPDATE. Ideas a request could not
+    enrich are skipped for the rest of the run and retried by the next one.
+    Run it from scripts.enrich_ideas; one worker at a time.
+    """
+
+    def __init__(self, session_factory=AsyncSessionLocal, openai_client: Optional[AsyncOpenAI] = None):
+        self.session_factory = session_factory
+        self.openai_client = openai_client or get_openai_client()
+        self.usage = get_usage_recorder()
+        self.progress = {"batches": 0, "requests": 0, "enriched": 0, "failed": 0}
+        self._failed: Set[UUID] = set()
+
+    async def run(self, max_batches: Optional[int] = None) -> Dict[str, int]:
+        """Enrich batches until none are left (or `max_batches`); returns the run's progress"""
+        while max_batches is None or self.progress["batches"] < max_batches:
+            ideas = await self._next_batch()
+            if not ideas:
+                break
+            await self._enrich_batch(ideas)
+            self.progress["batches"] += 1
+            logger.info(f"Idea enrichment progress: {self.progress}")
+        return self.progress
+
+    async def _next_batch(self) -> List:
+        query = (
+            select(Idea.id, Idea.user_id, Idea.title, Idea.description)
+            .where(Idea.ai_enriched.is_not(True))
+            .order_by(Idea.created_at, Idea.id)
+            .limit(settings.IDEA_ENRICHMENT_BATCH_SIZE)
+        )
+        if self._failed:
+            query = query.where(Idea.id.not_in(self._failed))
+        async with self.session_factory() as session:
+            return (await session.execute(query)).all()
+
+    async def _enrich_batch(self, ideas: List):
+        by_user: Dict[UUID, List] = {}
+        for idea in ideas:
+            by_user.setdefault(idea.user_id, []).append(idea)
+        size = settings.IDEA_ENRICHMENT_IDEAS_PER_REQUEST
+        chunks = [
+            (user_id, user_ideas[start:start + size])
+            for user_id, user_ideas in by_user.items()
+            for start in range(0, len(user_ideas), size)
+        ]
+        results = await asyncio.gather(*(self._request(user_id, chunk) for user_id, chunk in chunks))
+
+        enriched_at = datetime.utcnow().isoformat()
+        rows = [
+            {"idea_id": idea_id, "data": {**data, "model": CHATGPT_MODEL, "enriched_at": enriched_at}}
+            for result in results
+            for idea_id, data in result.items()
+        ]
+        if rows:
+            async with self.session_factory() as session:
+                await session.execute(ENRICH_IDEA, rows)
+                await session.commit()
+
+        missing = {idea.id for idea in ideas} - {row["idea_id"] for row in rows}
+        self._failed |= missing
+        self.progress["requests"] += len(chunks)
+        self.progress["enriched"] += len(rows)
+        self.progress["failed"] += len(missing)
+
+    async def _request(self, user_id: UUID, ideas: List) -> Dict[UUID, Dict]:
+        """Enrich one user's ideas with a single request; ideas missing from the answer are left out"""
+        payload = [
+            {"id": str(position), "title": idea.title, "description": idea.description or ""}
+            for position, idea in enumerate(ideas)
+        ]
+        content = json.dumps(payload)
+        max_tokens = OUTPUT_TOKENS_PER_IDEA * len(ideas)
+        breaker = get_breaker("ai:chatgpt")
+        started = time.perf_counter()
+        if not breaker.allow():
+            self._meter(user_id, {'error': True, 'skipped': True}, started)
+            return {}
+
+        try:
+            estimate = (len(ENRICHMENT_PROMPT) + len(content)) // 4 + max_tokens
+            async with get_scheduler("chatgpt").slot(BACKGROUND, estimate) as slot:
+                response = await asyncio.wait_for(
+                    self.openai_client.chat.completions.create(
+                        model=CHATGPT_MODEL,
+                        messages=[
+                            {"role": "system", "content": ENRICHMENT_PROMPT},
+                            {"role": "user", "content": content},
+                        ],
+                        max_tokens=max_tokens,
+                        response_format={"type": "json_object"},
+                    ),
+                    settings.AI_PROVIDER_DEADLINE,
+                )
+                slot.tokens = response.usage.total_tokens
+        except ProviderBusy:
+            breaker.release()
+            self._meter(user_id, {'error': True, 'busy': True}, started)
+            return {}
+        except asyncio.TimeoutError:
+            breaker.record_failure()
+            self._meter(user_id, {'error': True, 'timeout': True}, started)
+            return {}
+        except asyncio.CancelledError:
+            breaker.release()
+            raise
+        except Exception as e:
+            logger.warning(f"Idea enrichment request failed: {e}")
+            breaker.record_failure()
+            self._meter(user_id, {'error': True}, started)
+            return {}
+
+        breaker.record_success()
+        self._meter(user_id, {'token_usage': openai_token_usage(response.usage)}, started)
+        try:
+            answers = json.loads(response.choices[0].message.content)["ideas"]
+        except (ValueError, KeyError, TypeError) as e:
+            logger.warning(f"Idea enrichment answer not understood: {e}")
+            return {}
+
+        enriched = {}
+        for answer in answers:
+            if not isinstance(answer, dict) or not str(answer.get("id", "")).isdigit():
+                continue
+            position = int(answer["id"])
+            if position < len(ideas):
+                enriched[ideas[position].id] = {field: answer.get(field) for field in ENRICHMENT_FIELDS}
+        return enriched
+
+    def _meter(self, user_id: UUID, result: Dict, started: float):
+        self.usage.record(user_id, "chatgpt", CHATGPT_MODEL, result, time.perf_counter() - started)
+
+
+async def enrichment_progress(db: AsyncSession, user_id: Optional[UUID] = None) -> Dict[str, int]:
+    """How many ideas are enriched and how many are still waiting"""
+    query = select(Idea.ai_enriched.is_(True), func.count()).group_by(Idea.ai_enriched.is_(True))
+    if user_id is not None:
+        query = query.where(Idea.user_id == user_id)
+    counts = {bool(enriched): count for enriched, count in (await db.execute(query)).all()}
+    return {"enriched": counts.get(True, 0), "pending": counts.get(False, 0)}
@@ -0,0 +1,60 @@
+import re
+from functools import lru_cache
+from typing import Iterable, Optional, Tuple
+
+from sqlalchemy import event, inspect
+
+from core.config import settings
+from models.database import Idea, Task
+
+
+class UrgencyMatcher:
+    """Counts urgency keywords in a single regex pass per text.
+
+    All keywords are folded into one word-bounded alternation (longest first,
+    so "need to" wins over a shorter keyword it contains), compiled once and
+    reused for every text instead of one findall per keyword.
+    """
+
+    def __init__(self, keywords: Iterable[str]):
+        unique = {keyword.strip().lower() for keyword in keywords if keyword and keyword.strip()}
+        self.keywords: Tuple[str, ...] = tuple(sorted(unique, key=lambda kw: (-len(kw), kw)))
+        self._pattern = (
+            re.compile(r"\b(?:" + "|".join(re.escape(kw) for kw in self.keywords) + r")\b", re.IGNORECASE)
+            if self.keywords
+            else None
+        )
+
+    def count(self, text: Optional[str]) -> int:
+        if not text or self._pattern is None:
+            return 0
+        return sum(1 for _ in self._pattern.finditer(text))
+
+    def count_all(self, texts: Iterable[Optional[str]]) -> int:
+        return sum(self.count(text) for text in texts)
+
+
+@lru_cache(maxsize=8)
+def _build_matcher(keywords: Tuple[str, ...]) -> UrgencyMatcher:
+    return UrgencyMatcher(keywords)
+
+
+def get_urgency_matcher() -> UrgencyMatcher:
+    """Matcher for settings.CHAOS_URGENCY_KEYWORDS, built once per keyword list"""
+    return _build_matcher(tuple(settings.CHAOS_URGENCY_KEYWORDS))
+
+
+@event.listens_for(Task, "before_insert")
+@event.listens_for(Idea, "before_insert")
+def _score_new(mapper, connection, target):
+    """Score urgency once per write so chaos checks SUM a column instead of reading text"""
+    target.urgency_score = get_urgency_matcher().count_all((target.title, target.description))
+
+
+@event.listens_for(Task, "before_update")
+@event.listens_for(Idea, "before_update")
+def _rescore_changed(mapper, connection, target):
+    """Status and timestamp updates keep their score; only edited text is rescanned"""
+    attrs = inspect(target).attrs
+    if attrs.title.history.has_changes() or attrs.description.history.has_changes():
+        target.urgency_score = get_urgency_matcher().count_all((target.title, target.description))
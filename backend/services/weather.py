@@ -0,0 +1,227 @@
+import asyncio
+import logging
+from datetime import datetime
+from typing import Dict, List, NamedTuple, Optional
+from uuid import UUID
+
+import httpx
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from core import geohash
+from core.cache import StaleWhileRevalidate
+from core.config import settings
+from core.http_clients import get_http_client
+from models.database import User
+
+logger = logging.getLogger(__name__)
+
+# One normalized One Call snapshot per geohash cell, from which both
+# /weather/current and /weather/forecast are derived. Shared by every worker
+# on the Redis backend; past WEATHER_CACHE_TTL the stale snapshot is served
+# while one background call refreshes it
+weather_cache = StaleWhileRevalidate(
+    "weather", settings.WEATHER_CACHE_TTL, settings.WEATHER_STALE_TTL, settings.WEATHER_CACHE_MAX_ENTRIES
+)
+
+
+class WeatherLocation(NamedTuple):
+    name: str
+    bucket: str  # geohash cell the weather is fetched (and cached) for
+
+
+def locate(latitude: float, longitude: float, name: Optional[str] = None) -> WeatherLocation:
+    """Snap a point to its WEATHER_GEOHASH_PRECISION cell, so nearby users share one snapshot"""
+    bucket = geohash.encode(latitude, longitude, settings.WEATHER_GEOHASH_PRECISION)
+    return WeatherLocation(name or f"{latitude:.2f}, {longitude:.2f}", bucket)
+
+
+async def resolve_location(
+    db: AsyncSession,
+    user_id: Optional[UUID] = None,
+    latitude: Optional[float] = None,
+    longitude: Optional[float] = None,
+) -> Optional[WeatherLocation]:
+    """Explicit coordinates, else the user's saved location, else the default one.
+
+    None when `user_id` names no user.
+    """
+    if latitude is not None and longitude is not None:
+        return locate(latitude, longitude)
+    if user_id is not None:
+        user = await db.get(User, user_id)
+        if user is None:
+            return None
+        if user.latitude is not None and user.longitude is not None:
+            return locate(user.latitude, user.longitude, user.location_name)
+    return locate(settings.DEFAULT_LATITUDE, settings.DEFAULT_LONGITUDE, settings.DEFAULT_LOCATION)
+
+
+class WeatherDemand:
+    """Requests per cell in this worker, halved every prefetch pass so old demand fades"""
+
+    def __init__(self):
+        self.requests: Dict[str, float] = {}
+
+    def record(self, bucket: str):
+        self.requests[bucket] = self.requests.get(bucket, 0) + 1
+
+    def top(self, count: int) -> List[str]:
+        return sorted(self.requests, key=self.requests.get, reverse=True)[:count]
+
+    def decay(self):
+        self.requests = {bucket: count / 2 for bucket, count in self.requests.items() if count >= 0.25}
+
+
+weather_demand = WeatherDemand()
+
+
+async def get_weather_snapshot(bucket: str, client: Optional[httpx.AsyncClient] = None) -> dict:
+    """The cached One Call snapshot of a geohash cell"""
+    weather_demand.record(bucket)
+    return await weather_cache.get(f"onecall:{bucket}", lambda: fetch_weather_snapshot(bucket, client))
+
+
+async def fetch_weather_snapshot(bucket: str, client: Optional[httpx.AsyncClient] = None) -> dict:
+    """Fetch current conditions and forecast for the cell's centre in one One Call API 3.0 request.
+
+    `client` defaults to the shared "openweather" client.
+    """
+    latitude, longitude = geohash.decode(bucket)
+    logger.info(f"Fetching fresh weather data for {bucket} from OpenWeather One Call API 3.0")
+    now = datetime.utcnow()
+    client = client or get_http_client("openweather")
+    response = await client.get(
+        "/onecall",
+        params={
+            "lat": round(latitude, 4),
+            "lon": round(longitude, 4),
+            "exclude": "minutely,alerts",  # Exclude minutely forecasts and alerts to save data
+            "appid": settings.OPENWEATHER_API_KEY,
+            "units": "imperial"
+        }
+    )
+    if response.status_code != 200:
+        logger.error(f"OpenWeather One Call API error: {response.status_code} - {response.text}")
+    response.raise_for_status()
+
+    snapshot = normalize_one_call(response.json())
+    snapshot["fetched_at"] = now.isoformat()
+    return snapshot
+
+
+def normalize_one_call(weather_data: dict) -> dict:
+    """Keep only what the current and forecast views use, so cached snapshots stay small"""
+    def conditions(entry: dict) -> dict:
+        return {
+            "weather_id": entry["weather"][0]["id"],
+            "description": entry["weather"][0]["description"].title(),
+            "icon": entry["weather"][0]["icon"],
+        }
+
+    current = weather_data["current"]
+    return {
+        "current": {
+            "temp": current["temp"],
+            "feels_like": current["feels_like"],
+            "humidity": current["humidity"],
+            "pressure": current["pressure"],
+            "wind_speed": current.get("wind_speed", 0),
+            "wind_deg": current.get("wind_deg", 0),
+            "uvi": current.get("uvi", 0),
+            "visibility": current.get("visibility", 10000),
+            "dew_point": current.get("dew_point", 0),
+            "clouds": current.get("clouds", 0),
+            "sunrise": current["sunrise"],
+            "sunset": current["sunset"],
+            **conditions(current),
+        },
+        "hourly": [
+            {"dt": hour["dt"], "temp": hour["temp"], "pop": hour.get("pop", 0), **conditions(hour)}
+            for hour in weather_data.get("hourly", [])[:12]  # Next 12 hours
+        ],
+        "daily": [
+            {
+                "dt": day["dt"],
+                "max": day["temp"]["max"],
+                "min": day["temp"]["min"],
+                "pop": day.get("pop", 0),
+                **conditions(day),
+            }
+            for day in weather_data.get("daily", [])[:7]  # Next 7 days
+        ],
+    }
+
+
+class WeatherPrefetcher:
+    """Keeps the most-requested cells warm.
+
+    Every WEATHER_PREFETCH_INTERVAL seconds, the WEATHER_PREFETCH_BUCKETS
+    cells with the most recent requests are refreshed if their snapshot is
+    missing or turns stale within WEATHER_PREFETCH_LEAD seconds, so their
+    users neither wait on a cold fetch nor see stale weather. Refreshes go
+    through weather_cache, so one already running (here or, on Redis, in
+    another worker) is not repeated.
+    """
+
+    def __init__(self, demand: WeatherDemand = weather_demand):
+        self.demand = demand
+        self.passes = 0
+        self.prefetched = 0
+        self._task: Optional[asyncio.Task] = None
+
+    async def prefetch(self) -> int:
+        """One pass; returns how many cells were fetched"""
+        buckets = self.demand.top(settings.WEATHER_PREFETCH_BUCKETS)
+        fetched = await asyncio.gather(*(
+            weather_cache.prefetch(
+                f"onecall:{bucket}", lambda bucket=bucket: fetch_weather_snapshot(bucket),
+                settings.WEATHER_PREFETCH_LEAD,
+            )
+            for bucket in buckets
+        ))
+        self.demand.decay()
+        self.passes += 1
+        self.prefetched += sum(fetched)
+        return sum(fetched)
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._prefetch_periodically())
+
+    async def _prefetch_periodically(self):
+        while True:
+            await asyncio.sleep(settings.WEATHER_PREFETCH_INTERVAL)
+            try:
+                await self.prefetch()
+            except Exception as e:
+                logger.warning(f"Weather prefetch pass failed: {e}")
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    def stats(self) -> Dict:
+        return {
+            "passes": self.passes,
+            "prefetched": self.prefetched,
+            "hot_buckets": self.demand.top(settings.WEATHER_PREFETCH_BUCKETS),
+        }
+
+
+_prefetcher: Optional[WeatherPrefetcher] = None
+
+
+def get_weather_prefetcher() -> WeatherPrefetcher:
+    global _prefetcher
+    if _prefetcher is None:
+        _prefetcher = WeatherPrefetcher()
+    return _prefetcher
+
+
+async def close_weather_prefetcher():
+    global _prefetcher
+    if _prefetcher is not None:
+        await _prefetcher.close()
+        _prefetcher = None
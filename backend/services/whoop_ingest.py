@@ -0,0 +1,213 @@
+import logging
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from sqlalchemy import bindparam, func, select, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from core.config import settings
+from core.database import AsyncSessionLocal
+from models.database import WhoopCycle, WhoopRecovery, WhoopSleep, WhoopWebhookEvent, WhoopWorkout
+
+logger = logging.getLogger(__name__)
+
+# Webhook type -> (record table, data key of the record's WHOOP id, columns copied from data)
+RECORD_TYPES = {
+    "recovery.updated": (WhoopRecovery, "cycle_id", ("recovery_score", "hrv_rmssd", "resting_heart_rate")),
+    "sleep.updated": (WhoopSleep, "sleep_id", ("sleep_duration_ms", "sleep_efficiency")),
+    "workout.updated": (WhoopWorkout, "workout_id", ("strain_score", "duration_ms")),
+    "cycle.updated": (WhoopCycle, "cycle_id", ("strain",)),
+}
+
+_events = WhoopWebhookEvent.__table__
+SKIP_EVENT = (
+    update(_events).where(_events.c.id == bindparam("event_id")).values(last_error=bindparam("error"))
+)
+COUNT_ATTEMPT = (
+    update(_events)
+    .where(_events.c.id == bindparam("event_id"))
+    .values(attempts=_events.c.attempts + 1, last_error=bindparam("error"))
+)
+
+
+async def enqueue_whoop_webhooks(db: AsyncSession, payloads: List[Dict]) -> List[int]:
+    """Append webhooks (or records shaped like them) to the outbox in one commit; returns their queue ids"""
+    received_at = datetime.utcnow()
+    events = [
+        WhoopWebhookEvent(
+            event_type=str(payload.get("type") or "unknown")[:50], payload=payload, received_at=received_at
+        )
+        for payload in payloads
+    ]
+    db.add_all(events)
+    await db.commit()
+    return [event.id for event in events]
+
+
+def _value(model, column: str, value):
+    """A data value as the column's Python type; None when it is missing or not convertible"""
+    if value is None:
+        return None
+    try:
+        return model.__table__.c[column].type.python_type(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def record_row(event_type: str, payload: Dict, received_at: datetime) -> Optional[tuple]:
+    """(record table, row) for a webhook, or None when it carries no usable record"""
+    if event_type not in RECORD_TYPES or not isinstance(payload.get("data", {}), dict):
+        return None
+    model, id_key, columns = RECORD_TYPES[event_type]
+    data = payload.get("data") or {}
+    user_id = payload.get("user_id")
+    record_id = data.get(id_key) or data.get("id") or payload.get("id")
+    if user_id is None or record_id is None:
+        return None
+    user_id, record_id = str(user_id), str(record_id)
+    if len(user_id) > model.whoop_user_id.type.length or len(record_id) > model.record_id.type.length:
+        return None  # would not fit the primary key
+    return model, {
+        "whoop_user_id": user_id,
+        "record_id": record_id,
+        "data": data,
+        "updated_at": received_at,
+        **{column: _value(model, column, data.get(column)) for column in columns},
+    }
+
+
+class WhoopIngestWorker:
+    """Drains the WHOOP webhook outbox into the record tables.
+
+    Each batch claims up to WHOOP_INGEST_BATCH_SIZE queued events in arrival
+    order (FOR UPDATE SKIP LOCKED on Postgres, so several workers can drain
+    side by side), upserts one statement per record table - a later event for
+    the same record wins - and marks the events processed, all in one
+    transaction of its own session. Events without a usable record are marked
+    processed with the reason in last_error. A batch that fails is retried in
+    halves (savepoints in the same transaction) until the failing events are
+    isolated, so one bad payload does not hold back the rest; only events that
+    fail on their own have their attempts counted, and the run stops. Events
+    that reach WHOOP_INGEST_MAX_ATTEMPTS stay queued but are no longer claimed.
+    Run it from scripts.ingest_whoop.
+    """
+
+    def __init__(self, session_factory=AsyncSessionLocal):
+        self.session_factory = session_factory
+        self.progress = {"batches": 0, "events": 0, "upserted": 0, "skipped": 0, "failed": 0}
+
+    async def run(self, max_batches: Optional[int] = None) -> Dict[str, int]:
+        """Drain batches until the queue is empty (or `max_batches`, or a batch fails)"""
+        while max_batches is None or self.progress["batches"] < max_batches:
+            if not await self.drain_batch():
+                break
+        return self.progress
+
+    async def drain_batch(self) -> bool:
+        """Ingest one batch; whether there may be more to drain"""
+        async with self.session_factory() as session:
+            events = (await session.execute(
+                select(_events.c.id, _events.c.event_type, _events.c.payload, _events.c.received_at)
+                .where(_events.c.processed_at.is_(None), _events.c.attempts < settings.WHOOP_INGEST_MAX_ATTEMPTS)
+                .order_by(_events.c.id)
+                .limit(settings.WHOOP_INGEST_BATCH_SIZE)
+                .with_for_update(skip_locked=True)
+            )).all()
+            if not events:
+                return False
+
+            claimed = [
+                (event.id, event.event_type, record_row(event.event_type, event.payload, event.received_at))
+                for event in events
+            ]
+            try:
+                failures = await self._apply(session, claimed)
+                await session.commit()
+            except Exception as e:
+                await session.rollback()
+                logger.warning(f"WHOOP ingest batch of {len(events)} events failed: {e}")
+                await self._count_attempts([{"event_id": event.id, "error": str(e)[:500]} for event in events])
+                self.progress["failed"] += len(events)
+                return False
+
+        if failures:
+            logger.warning(f"WHOOP ingest: {len(failures)} of {len(events)} events failed on their own")
+            await self._count_attempts(failures)
+        failed_ids = {failure["event_id"] for failure in failures}
+        stored = [record for event_id, _, record in claimed if event_id not in failed_ids]
+        self.progress["batches"] += 1
+        self.progress["events"] += len(stored)
+        self.progress["upserted"] += len({
+            (model, row["whoop_user_id"], row["record_id"]) for model, row in filter(None, stored)
+        })
+        self.progress["skipped"] += stored.count(None)
+        self.progress["failed"] += len(failures)
+        return not failures
+
+    async def _apply(self, session: AsyncSession, claimed: List[tuple]) -> List[Dict]:
+        """Store claimed events in a savepoint, halving on failure until the failing events are isolated.
+
+        Returns {"event_id", "error"} for each event that failed on its own;
+        the rest are stored and marked processed.
+        """
+        try:
+            async with session.begin_nested():
+                await self._store(session, claimed)
+            return []
+        except Exception as e:
+            if len(claimed) == 1:
+                return [{"event_id": claimed[0][0], "error": str(e)[:500]}]
+            middle = len(claimed) // 2
+            return await self._apply(session, claimed[:middle]) + await self._apply(session, claimed[middle:])
+
+    async def _store(self, session: AsyncSession, claimed: List[tuple]):
+        records: Dict[tuple, tuple] = {}
+        skipped: List[Dict] = []
+        for event_id, event_type, record in claimed:
+            if record is None:
+                skipped.append({"event_id": event_id, "error": f"No {event_type} record to store"})
+                continue
+            model, row = record
+            records[(model, row["whoop_user_id"], row["record_id"])] = record
+
+        await self._upsert(session, list(records.values()))
+        if skipped:
+            await session.execute(SKIP_EVENT, skipped)
+        await session.execute(
+            update(_events)
+            .where(_events.c.id.in_([event_id for event_id, _, _ in claimed]))
+            .values(processed_at=datetime.utcnow())
+        )
+
+    async def _upsert(self, session: AsyncSession, records: List[tuple]):
+        dialect = postgresql if session.get_bind().dialect.name == "postgresql" else sqlite
+        by_model: Dict[type, List[Dict]] = {}
+        for model, row in records:
+            by_model.setdefault(model, []).append(row)
+        for model, rows in by_model.items():
+            statement = dialect.insert(model)
+            statement = statement.on_conflict_do_update(
+                index_elements=[model.whoop_user_id, model.record_id],
+                set_={name: statement.excluded[name] for name in rows[0] if name not in ("whoop_user_id", "record_id")},
+            )
+            await session.execute(statement, rows)
+
+    async def _count_attempts(self, failures: List[Dict]):
+        async with self.session_factory() as session:
+            await session.execute(COUNT_ATTEMPT, failures)
+            await session.commit()
+
+
+async def ingest_backlog(db: AsyncSession) -> Dict:
+    """Queued events, those given up on after WHOOP_INGEST_MAX_ATTEMPTS, and the oldest still queued"""
+    pending = _events.c.processed_at.is_(None)
+    given_up = _events.c.attempts >= settings.WHOOP_INGEST_MAX_ATTEMPTS
+    row = (await db.execute(
+        select(
+            func.count().filter(~given_up).label("queued"),
+            func.count().filter(given_up).label("failed"),
+            func.min(_events.c.received_at).filter(~given_up).label("oldest_queued_at"),
+        ).where(pending)
+    )).one()
+    return {"queued": row.queued, "failed": row.failed, "oldest_queued_at": row.oldest_queued_at}
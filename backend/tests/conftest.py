@@ -0,0 +1,27 @@
+import pytest
+import pytest_asyncio
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+
+from core.database import Base
+
+
+@pytest_asyncio.fixture
+async def engine():
+    """A fresh in-memory SQLite database with every table created"""
+    engine = create_async_engine("sqlite+aiosqlite://")
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    yield engine
+    await engine.dispose()
+
+
+@pytest.fixture
+def sessions(engine):
+    """Session factory on `engine`, for code that opens its own sessions"""
+    return async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+
+
+@pytest_asyncio.fixture
+async def db(sessions):
+    async with sessions() as session:
+        yield session
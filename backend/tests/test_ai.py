@@ -0,0 +1,615 @@
+import asyncio
+import json
+import os
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from types import SimpleNamespace
+
+import fakeredis
+from openai import AsyncOpenAI
+import pytest
+import pytest_asyncio
+from sqlalchemy import event, func, select
+
+from api.v1.endpoints.ai_chat import get_ai_usage
+from benchmarks.fake_providers import serve_fake_providers
+from core import ai_clients, ai_scheduler, cache, circuit_breaker, single_flight
+from core.config import settings
+from models.database import AIConversation, Idea, Task, User
+from services import activity, ai_routing
+from services.ai_routing import AIRoutingService
+from services.ai_usage import AIUsageRecorder, AIUsageReportService, usage_outcome
+from services.chaos_detection import publish_chaos_change
+from services.context_snapshot import ContextSnapshotService
+from services.conversation_store import ConversationStore
+from services.idea_enrichment import IdeaEnrichmentPipeline, enrichment_progress
+
+FIXTURES = Path(__file__).parent / "fixtures"
+
+
+@pytest.fixture(autouse=True)
+def memory_cache(monkeypatch):
+    # Routing consults the response cache first; keep it in process instead of reaching for Redis
+    monkeypatch.setattr(settings, "CACHE_BACKEND", "memory")
+    monkeypatch.setattr(cache, "_caches", {})
+
+
+@pytest_asyncio.fixture
+async def conversation(db):
+    user = User(username="ai", email="ai@example.com", hashed_password="x")
+    db.add(user)
+    await db.flush()
+    conversation = AIConversation(user_id=user.id, thread_title="thread", ai_participants=[])
+    db.add(conversation)
+    await db.commit()
+    return conversation
+
+
+@pytest.mark.asyncio
+async def test_messages_append_without_rewriting_the_thread(engine, db, conversation):
+    store = ConversationStore(db)
+    for turn in range(30):
+        await store.append(conversation.id, [
+            {"role": "user", "content": f"question {turn}"},
+            {"role": "assistant", "ai": "claude", "content": f"answer {turn}", "tokens_used": turn},
+        ])
+        await db.commit()
+
+    statements = []
+    event.listen(engine.sync_engine, "before_cursor_execute", lambda *args: statements.append(args[2]))
+    await store.append(conversation.id, [{"role": "user", "content": "one more"}])
+    await db.commit()
+
+    # one counter bump and one single-row insert, however long the thread is
+    writes = [sql for sql in statements if sql.lstrip().upper().startswith(("INSERT", "UPDATE"))]
+    assert len(writes) == 2
+    assert all("ai_messages" in sql or "message_count" in sql for sql in writes)
+
+    page = await store.recent(conversation.id, limit=25)
+    assert [m["seq"] for m in page["messages"]] == list(range(37, 62))
+    assert page["messages"][-1]["content"] == "one more"
+
+    older = await store.recent(conversation.id, limit=50, before_seq=page["next_before"])
+    assert [m["seq"] for m in older["messages"]] == list(range(1, 37))
+    assert older["messages"][0]["content"] == "question 0"
+    assert older["next_before"] is None
+
+
+@pytest.mark.asyncio
+async def test_append_to_missing_conversation_fails(db):
+    with pytest.raises(ValueError):
+        await ConversationStore(db).append(uuid.uuid4(), [{"role": "user", "content": "hi"}])
+
+
+@pytest.mark.asyncio
+async def test_stream_interleaves_providers_and_stores_turn_once(db, conversation, monkeypatch):
+    monkeypatch.setattr(settings, "OPENAI_API_KEY", "test")
+    monkeypatch.setattr(settings, "ANTHROPIC_API_KEY", "test")
+    service = AIRoutingService(db, conversation.user_id)
+
+    def fake_stream(ai, tokens, delay):
+        async def stream(message, context, bypass_cache=False):
+            for token in tokens:
+                await asyncio.sleep(delay)
+                yield {"event": "delta", "ai": ai, "content": token}
+            yield {"event": "done", "ai": ai, "content": "".join(tokens), "model": ai, "tokens_used": len(tokens)}
+        return stream
+
+    async def no_context():
+        return {}
+
+    monkeypatch.setattr(service, "_gather_context", no_context)
+    monkeypatch.setattr(service, "_stream_claude", fake_stream("claude", ["slow ", "reply"], 0.02))
+    monkeypatch.setattr(service, "_stream_chatgpt", fake_stream("chatgpt", ["a ", "quick ", "reply"], 0.001))
+
+    events = [event async for event in service.stream_message("@all plan my day", conversation.id)]
+
+    assert events[0] == {"event": "start", "thread_id": str(conversation.id)}
+    assert events[-1]["event"] == "end"
+    deltas = [event["ai"] for event in events if event["event"] == "delta"]
+    # chatgpt's tokens are not held back behind the slower provider
+    assert deltas[:3] == ["chatgpt"] * 3 and deltas.count("claude") == 2
+    assert [event["ai"] for event in events if event["event"] == "done"] == ["chatgpt", "claude"]
+
+    page = await ConversationStore(db).recent(conversation.id)
+    assert [(m["role"], m["ai"], m["content"]) for m in page["messages"]] == [
+        ("user", None, "@all plan my day"),
+        ("assistant", "chatgpt", "a quick reply"),
+        ("assistant", "claude", "slow reply"),
+    ]
+
+
+@pytest.mark.asyncio
+async def test_routing_services_share_pooled_provider_clients(db, monkeypatch):
+    monkeypatch.setattr(settings, "OPENAI_API_KEY", "test")
+    monkeypatch.setattr(settings, "ANTHROPIC_API_KEY", "test")
+    await ai_clients.close_ai_clients()
+
+    first, second = AIRoutingService(db, uuid.uuid4()), AIRoutingService(db, uuid.uuid4())
+    assert first.openai_client is second.openai_client
+    assert first.anthropic_client is second.anthropic_client
+
+    await ai_clients.close_ai_clients()
+    assert first.openai_client.is_closed()
+    assert AIRoutingService(db, uuid.uuid4()).openai_client is not first.openai_client
+    await ai_clients.close_ai_clients()
+
+
+class StubAnthropic:
+    """Just enough of AsyncAnthropic for _call_claude"""
+
+    def __init__(self):
+        self.calls = 0
+        self.messages = self
+
+    async def create(self, **kwargs):
+        self.calls += 1
+        return SimpleNamespace(
+            content=[SimpleNamespace(text=f"answer {self.calls}")],
+            usage=SimpleNamespace(input_tokens=10, output_tokens=5),
+        )
+
+
+@pytest.mark.asyncio
+async def test_response_cache_keys_on_normalized_message_and_context(db, monkeypatch):
+    monkeypatch.setattr(settings, "CACHE_BACKEND", "memory")
+    monkeypatch.setattr(cache, "_caches", {})
+    monkeypatch.setattr(settings, "OPENAI_API_KEY", "test")
+    anthropic = StubAnthropic()
+    service = AIRoutingService(db, uuid.uuid4(), anthropic_client=anthropic)
+    context = {"current_mits": [{"title": "ship", "status": "doing"}]}
+
+    first = await service._call_claude("What should I focus on?", context)
+    again = await service._call_claude("  what should i focus   on ", context)
+    assert anthropic.calls == 1
+    assert again == {**first, "cached": True}
+
+    fresh = await service._call_claude("What should I focus on?", context, bypass_cache=True)
+    assert anthropic.calls == 2 and "cached" not in fresh
+
+    await service._call_claude("What should I focus on?", {"current_mits": [{"title": "rest", "status": "doing"}]})
+    assert anthropic.calls == 3
+
+    stats = cache.get_cache("ai:response").stats()
+    assert (stats["hits"], stats["misses"]) == (1, 2)
+
+
+@pytest.mark.asyncio
+async def test_context_snapshot_is_memoized_and_invalidated_by_writes(engine, db, conversation, monkeypatch):
+    monkeypatch.setattr(settings, "CACHE_BACKEND", "memory")
+    monkeypatch.setattr(settings, "CHAOS_COUNTERS_ENABLED", False)
+    monkeypatch.setattr(cache, "_caches", {})
+    user_id = conversation.user_id
+    db.add_all([Task(title="ship it", user_id=user_id, is_mit=True), Idea(title="side quest", user_id=user_id)])
+    await db.commit()
+    await asyncio.gather(*activity._dispatches)
+
+    snapshot = await ContextSnapshotService(db, user_id).get_snapshot()
+    assert snapshot["current_mits"] == [{"title": "ship it", "status": "not_started"}]
+    assert snapshot["recent_ideas"] == [{"title": "side quest", "status": "active"}]
+    assert snapshot["chaos_level"]["level"] in ("focused", "scattered", "spinning")
+
+    statements = []
+    event.listen(engine.sync_engine, "before_cursor_execute", lambda *args: statements.append(args[2]))
+    assert await ContextSnapshotService(db, user_id).get_snapshot() == snapshot
+    assert statements == []
+
+    db.add(Task(title="second mit", user_id=user_id, is_mit=True))
+    await db.commit()
+    await asyncio.gather(*activity._dispatches)
+    refreshed = await ContextSnapshotService(db, user_id).get_snapshot()
+    assert {mit["title"] for mit in refreshed["current_mits"]} == {"ship it", "second mit"}
+
+    await publish_chaos_change([user_id])
+    assert await cache.get_cache("context:snapshot").get(str(user_id)) is None
+
+
+@pytest.mark.asyncio
+async def test_context_snapshot_parts_load_concurrently(db, monkeypatch):
+    monkeypatch.setattr(settings, "CACHE_BACKEND", "memory")
+    monkeypatch.setattr(cache, "_caches", {})
+
+    async def slow(self, session):
+        await asyncio.sleep(0.1)
+        return []
+
+    for part in ("_current_mits", "_recent_ideas", "_chaos_level"):
+        monkeypatch.setattr(ContextSnapshotService, part, slow)
+
+    start = time.perf_counter()
+    await ContextSnapshotService(db, uuid.uuid4()).get_snapshot()
+    assert time.perf_counter() - start < 0.25
+
+
+def provider(ai, delay=0.0, error=False):
+    calls = []
+
+    async def call(message, context, bypass_cache=False):
+        calls.append(message)
+        await asyncio.sleep(delay)
+        if error:
+            return {"ai": ai, "content": "failed", "error": True}
+        return {"ai": ai, "content": f"{ai} answer", "model": ai, "tokens_used": 1}
+    call.calls = calls
+    return call
+
+
+async def cached_answer(service, ai, message, context=None):
+    """Seed the response cache as if `ai` had already answered `message`"""
+    key = service._response_cache_key(ai, message, context or {})
+    await cache.get_cache("ai:response", settings.AI_RESPONSE_CACHE_MAX_ENTRIES).set(
+        key, {"ai": ai, "content": "cached answer", "model": ai, "tokens_used": 1}, 60
+    )
+
+
+@pytest.mark.asyncio
+async def test_breaker_opens_after_failures_and_unmentioned_messages_fall_back(db, monkeypatch):
+    monkeypatch.setattr(settings, "OPENAI_API_KEY", "test")
+    monkeypatch.setattr(settings, "ANTHROPIC_API_KEY", "test")
+    monkeypatch.setattr(settings, "CIRCUIT_BREAKER_FAILURE_THRESHOLD", 3)
+    monkeypatch.setattr(circuit_breaker, "_breakers", {})
+    service = AIRoutingService(db, uuid.uuid4())
+    claude = provider("claude", error=True)
+    monkeypatch.setattr(service, "_call_claude", claude)
+    monkeypatch.setattr(service, "_call_chatgpt", provider("chatgpt"))
+
+    for _ in range(3):
+        await service._route_message("@claude help", ["claude"], {})
+    assert circuit_breaker.get_breaker("ai:claude").state == "open"
+
+    skipped = await service._route_message("@claude help", ["claude"], {})
+    assert skipped[0]["skipped"] and len(claude.calls) == 3
+
+    # a cached answer needs no provider, so the open circuit doesn't hide it
+    await cached_answer(service, "claude", "@claude help")
+    [hit] = await service._route_message("@claude help", ["claude"], {})
+    assert hit["cached"] and hit["content"] == "cached answer" and len(claude.calls) == 3
+
+    # a technical question would go to claude; with its circuit open chatgpt answers
+    [fallback] = await service._route_message("debug this python error", [], {})
+    assert fallback["ai"] == "chatgpt" and not fallback.get("error")
+
+
+@pytest.mark.asyncio
+async def test_provider_deadline_and_hedged_call(db, monkeypatch):
+    monkeypatch.setattr(settings, "OPENAI_API_KEY", "test")
+    monkeypatch.setattr(settings, "ANTHROPIC_API_KEY", "test")
+    monkeypatch.setattr(settings, "AI_PROVIDER_DEADLINE", 0.1)
+    monkeypatch.setattr(circuit_breaker, "_breakers", {})
+    service = AIRoutingService(db, uuid.uuid4())
+    monkeypatch.setattr(service, "_call_claude", provider("claude", delay=1))
+    monkeypatch.setattr(service, "_call_chatgpt", provider("chatgpt", delay=0.01))
+    outcomes = []
+    monkeypatch.setattr(service.usage, "record", lambda user_id, ai, model, result, *args: outcomes.append(
+        (ai, usage_outcome(result))
+    ))
+
+    start = time.perf_counter()
+    [late] = await service._route_message("@claude help", ["claude"], {})
+    assert late["timeout"] and late["error"]
+    assert time.perf_counter() - start < 0.5
+    assert circuit_breaker.get_breaker("ai:claude").failures == 1
+
+    [winner] = await service._route_message("debug this python error", [], {}, hedge=True)
+    assert winner["ai"] == "chatgpt" and winner["hedged"]
+    # the cancelled loser neither counts as a failure nor holds a trial, but is metered
+    assert circuit_breaker.get_breaker("ai:claude").failures == 1
+    await asyncio.sleep(0.01)  # let the cancellation land
+    assert outcomes == [("claude", "timeout"), ("chatgpt", "ok"), ("claude", "cancelled")]
+
+
+MIN_CACHEABLE_TOKENS = 1024  # both providers' smallest cacheable prompt prefix
+
+
+def rough_tokens(text):
+    return len(text) // 4
+
+
+class RecordingClient:
+    """Records create() kwargs and answers like either SDK.
+
+    Usage is derived from the request (about 4 characters per token) under
+    the providers' prompt-cache rules: nothing shorter than
+    MIN_CACHEABLE_TOKENS is cached; Anthropic writes a cache_control prefix
+    on first sight and reads it afterwards; OpenAI reuses the longest prompt
+    prefix it has seen, in 128-token steps.
+    """
+
+    def __init__(self):
+        self.requests = []
+        self.seen = []
+        self.messages = self.chat = self.completions = self
+
+    async def create(self, **kwargs):
+        self.requests.append(kwargs)
+        output_tokens = 5
+        if "system" in kwargs:
+            usage = self._claude_usage(kwargs["system"], kwargs["messages"][-1]["content"])
+        else:
+            usage = self._openai_usage("".join(message["content"] for message in kwargs["messages"]))
+        return SimpleNamespace(
+            content=[SimpleNamespace(text="ok")],
+            choices=[SimpleNamespace(message=SimpleNamespace(content="ok"))],
+            usage=SimpleNamespace(**usage, output_tokens=output_tokens, completion_tokens=output_tokens,
+                                  total_tokens=usage.get("prompt_tokens", 0) + output_tokens),
+        )
+
+    def _claude_usage(self, system, message):
+        marked = max((i for i, block in enumerate(system) if "cache_control" in block), default=-1)
+        prefix = "".join(block["text"] for block in system[:marked + 1])
+        total = rough_tokens("".join(block["text"] for block in system) + message)
+        read = write = 0
+        if rough_tokens(prefix) >= MIN_CACHEABLE_TOKENS:
+            if prefix in self.seen:
+                read = rough_tokens(prefix)
+            else:
+                write = rough_tokens(prefix)
+                self.seen.append(prefix)
+        return {"input_tokens": total - read - write, "cache_read_input_tokens": read,
+                "cache_creation_input_tokens": write}
+
+    def _openai_usage(self, prompt):
+        shared = max((len(os.path.commonprefix([prompt, seen])) for seen in self.seen), default=0)
+        cached = rough_tokens(prompt[:shared]) // 128 * 128
+        self.seen.append(prompt)
+        return {"prompt_tokens": rough_tokens(prompt),
+                "prompt_tokens_details": SimpleNamespace(cached_tokens=cached if cached >= MIN_CACHEABLE_TOKENS else 0)}
+
+
+@pytest.mark.asyncio
+async def test_system_prompts_keep_a_stable_cacheable_prefix(db, monkeypatch):
+    recorded = json.loads((FIXTURES / "ai_prompt_requests.json").read_text())
+    anthropic, openai = RecordingClient(), RecordingClient()
+    service = AIRoutingService(db, uuid.uuid4(), openai_client=openai, anthropic_client=anthropic)
+
+    claude = await service._call_claude(recorded["requests"]["claude"]["message"], recorded["context"], True)
+    chatgpt = await service._call_chatgpt(recorded["requests"]["chatgpt"]["message"], recorded["context"], True)
+    assert anthropic.requests[0] == recorded["requests"]["claude"]["request"]
+    assert openai.requests[0] == recorded["requests"]["chatgpt"]["request"]
+
+    # the static preambles are far below the minimum cacheable prefix, so nothing is cached yet
+    assert claude["token_usage"]["cached_input_tokens"] == claude["token_usage"]["cache_write_tokens"] == 0
+    assert chatgpt["token_usage"]["cached_input_tokens"] == 0
+    assert claude["tokens_used"] == sum(claude["token_usage"].values())
+
+    # another user's context changes only what follows the prefix
+    other = {"current_mits": [{"title": "rest", "status": "not_started"}]}
+    await service._call_claude("anything", other, True)
+    await service._call_chatgpt("anything", other, True)
+    first, second = anthropic.requests[0]["system"], anthropic.requests[1]["system"]
+    assert first[0] == second[0] and "cache_control" in first[0]
+    assert first[1] != second[1] and "cache_control" not in second[1]
+    prefix = recorded["requests"]["chatgpt"]["request"]["messages"][0]["content"].split("\n\nCurrent MITs")[0]
+    assert openai.requests[1]["messages"][0]["content"].startswith(prefix + "\n\n")
+
+
+@pytest.mark.asyncio
+async def test_a_long_enough_preamble_is_written_once_then_read_from_the_prompt_cache(db, monkeypatch):
+    monkeypatch.setattr(ai_routing, "CLAUDE_SYSTEM_PREFIX", "Engineering guidelines. " * 200)
+    monkeypatch.setattr(ai_routing, "CHATGPT_SYSTEM_PREFIX", "Planning guidelines. " * 250)
+    anthropic, openai = RecordingClient(), RecordingClient()
+    service = AIRoutingService(db, uuid.uuid4(), openai_client=openai, anthropic_client=anthropic)
+
+    first = await service._call_claude("one", {"current_mits": [{"title": "a", "status": "doing"}]}, True)
+    second = await service._call_claude("two", {"current_mits": [{"title": "b", "status": "doing"}]}, True)
+    assert (first["token_usage"]["cache_write_tokens"], first["token_usage"]["cached_input_tokens"]) == (1200, 0)
+    assert (second["token_usage"]["cache_write_tokens"], second["token_usage"]["cached_input_tokens"]) == (0, 1200)
+
+    await service._call_chatgpt("one", {}, True)
+    repeat = await service._call_chatgpt("two", {}, True)
+    assert repeat["token_usage"]["cached_input_tokens"] == 1280
+    assert repeat["token_usage"]["uncached_input_tokens"] == repeat["tokens_used"] - 5 - 1280
+
+
+@pytest.mark.asyncio
+async def test_usage_records_are_batched_and_reported(engine, sessions, db, conversation, monkeypatch):
+    monkeypatch.setattr(settings, "OPENAI_API_KEY", "test")
+    monkeypatch.setattr(settings, "ANTHROPIC_API_KEY", "test")
+    monkeypatch.setattr(settings, "CACHE_BACKEND", "memory")
+    monkeypatch.setattr(cache, "_caches", {})
+    monkeypatch.setattr(settings, "AI_USAGE_BATCH_SIZE", 4)
+    monkeypatch.setattr(settings, "AI_PROVIDER_DEADLINE", 0.05)
+    monkeypatch.setattr(circuit_breaker, "_breakers", {})
+    recorder = AIUsageRecorder(sessions)
+    anthropic = RecordingClient()
+    service = AIRoutingService(db, conversation.user_id, anthropic_client=anthropic)
+    service.usage = recorder
+    monkeypatch.setattr(service, "_call_chatgpt", provider("chatgpt", delay=1))
+
+    inserts = []
+    event.listen(engine.sync_engine, "before_cursor_execute",
+                 lambda *args: inserts.append(args[2]) if "INSERT INTO ai_usage" in args[2] else None)
+    for turn in range(3):
+        await service._route_message(f"question {turn}", ["claude"], {}, bypass_cache=True)
+    await service._route_message("question", ["chatgpt"], {})
+    assert recorder.buffer == []  # the fourth record filled the batch
+    await asyncio.gather(*recorder._flushes)
+    assert len(inserts) == 1
+
+    await service._route_message("question 0", ["claude"], {})  # response cache hit
+    await recorder.close()
+
+    report = await AIUsageReportService(db).report(
+        datetime.utcnow() - timedelta(hours=1), datetime.utcnow() + timedelta(hours=1), conversation.user_id
+    )
+    by_provider = {row["provider"]: row for row in report}
+    claude, chatgpt = by_provider["claude"], by_provider["chatgpt"]
+    assert (claude["calls"], claude["errors"], claude["cached"]) == (4, 0, 1)
+    assert (claude["input_tokens"], claude["cached_input_tokens"], claude["output_tokens"]) == (228, 0, 15)
+    assert claude["p50_latency_ms"] is not None
+    assert (chatgpt["calls"], chatgpt["errors"]) == (1, 1)
+    assert chatgpt["p95_latency_ms"] >= 40
+
+    # an offset-aware start with the default end
+    usage = await get_ai_usage(start=datetime.now(timezone.utc) - timedelta(hours=1), user_id=conversation.user_id, db=db)
+    assert usage["usage"] == report
+
+
+@pytest.mark.asyncio
+async def test_duplicate_in_flight_messages_share_one_run(db, conversation, monkeypatch):
+    monkeypatch.setattr(settings, "OPENAI_API_KEY", "test")
+    monkeypatch.setattr(settings, "ANTHROPIC_API_KEY", "test")
+    monkeypatch.setattr(circuit_breaker, "_breakers", {})
+    service = AIRoutingService(db, conversation.user_id)
+    claude = provider("claude", delay=0.05)
+    monkeypatch.setattr(service, "_call_claude", claude)
+
+    async def no_context():
+        return {}
+
+    monkeypatch.setattr(service, "_gather_context", no_context)
+    monkeypatch.setattr(service.usage, "record", lambda *args, **kwargs: None)
+
+    first, second = await asyncio.gather(
+        service.process_message("@claude fix the build", conversation.id),
+        service.process_message("@claude  Fix the build?", conversation.id),
+    )
+    assert first == second and len(claude.calls) == 1
+    assert len((await ConversationStore(db).recent(conversation.id))["messages"]) == 2
+
+    await service.process_message("@claude fix the build", conversation.id)
+    assert len(claude.calls) == 2  # only concurrent duplicates are coalesced
+
+
+@pytest.mark.asyncio
+async def test_redis_single_flight_coalesces_across_workers(monkeypatch):
+    redis = fakeredis.FakeAsyncRedis(decode_responses=True)
+    monkeypatch.setattr(single_flight, "get_redis", lambda: redis)
+    calls = []
+
+    async def answer():
+        calls.append(1)
+        await asyncio.sleep(0.1)
+        return {"answer": 42}
+
+    # separate instances, as in two workers
+    results = await asyncio.gather(*(
+        single_flight.RedisSingleFlight("test", ttl=5, poll_interval=0.01).do("key", answer) for _ in range(3)
+    ))
+    assert results == [{"answer": 42}] * 3 and len(calls) == 1
+
+    monkeypatch.setattr(single_flight, "get_redis", lambda: fakeredis.FakeAsyncRedis(connected=False))
+    assert await single_flight.RedisSingleFlight("test", ttl=5).do("key", answer) == {"answer": 42}
+
+
+@pytest.mark.asyncio
+async def test_scheduler_bounds_concurrency_prefers_interactive_and_rejects_when_full():
+    scheduler = ai_scheduler.ProviderScheduler("test", max_concurrency=1, tokens_per_minute=6000, max_waiting=2)
+    order = []
+
+    async def call(name, priority):
+        async with scheduler.slot(priority, 100):
+            order.append(name)
+            await asyncio.sleep(0.01)
+
+    running = asyncio.create_task(call("first", ai_scheduler.INTERACTIVE))
+    await asyncio.sleep(0)
+    queued = [
+        asyncio.create_task(call("enrichment", ai_scheduler.BACKGROUND)),
+        asyncio.create_task(call("chat", ai_scheduler.INTERACTIVE)),
+    ]
+    await asyncio.sleep(0)
+    assert (scheduler.active, len(scheduler.waiting)) == (1, 2)
+    with pytest.raises(ai_scheduler.ProviderBusy) as busy:
+        await call("rejected", ai_scheduler.INTERACTIVE)
+    assert busy.value.retry_after >= 1
+
+    await asyncio.gather(running, *queued)
+    assert order == ["first", "chat", "enrichment"]
+
+    # 6000 tokens/minute refill at 100/s: a call reserving more than is left waits for the budget
+    scheduler.tokens = 0
+    start = time.perf_counter()
+    async with scheduler.slot(ai_scheduler.INTERACTIVE, 10) as slot:
+        slot.tokens = 10
+    assert 0.05 < time.perf_counter() - start < 0.5
+
+
+@pytest.mark.asyncio
+async def test_all_providers_busy_rejects_the_turn(db, conversation, monkeypatch):
+    monkeypatch.setattr(settings, "OPENAI_API_KEY", "test")
+    monkeypatch.setattr(settings, "ANTHROPIC_API_KEY", "test")
+    monkeypatch.setattr(settings, "AI_MAX_CONCURRENT_CALLS", 1)
+    monkeypatch.setattr(settings, "AI_MAX_QUEUED_CALLS", 0)
+    monkeypatch.setattr(circuit_breaker, "_breakers", {})
+    monkeypatch.setattr(ai_scheduler, "_schedulers", {})
+    service = AIRoutingService(db, conversation.user_id)
+    monkeypatch.setattr(service, "_call_claude", provider("claude", delay=0.1))
+    monkeypatch.setattr(service, "_call_chatgpt", provider("chatgpt"))
+    monkeypatch.setattr(service.usage, "record", lambda *args, **kwargs: None)
+
+    first = asyncio.create_task(service._route_message("one", ["claude"], {}))
+    await asyncio.sleep(0.01)
+    [busy] = await service._route_message("two", ["claude"], {})
+    assert busy["busy"] and busy["retry_after"] >= 1
+    both = await service._route_message("three", ["all"], {})
+    assert [bool(response.get("busy")) for response in both] == [True, False]
+
+    # a cache hit takes no slot, so it is answered while the provider is full
+    await cached_answer(service, "claude", "four")
+    [hit] = await service._route_message("four", ["claude"], {})
+    assert hit["cached"] and not hit.get("busy")
+
+    # a rejected turn on a new chat leaves no empty thread behind
+    async def no_context():
+        return {}
+    monkeypatch.setattr(service, "_gather_context", no_context)
+    with pytest.raises(ai_scheduler.ProviderBusy):
+        await service.process_message("@claude five")
+    assert await db.scalar(select(func.count()).select_from(AIConversation)) == 1
+    await first
+
+    async def all_busy(*args):
+        return [busy]
+
+    monkeypatch.setattr(settings, "CACHE_BACKEND", "memory")
+    monkeypatch.setattr(cache, "_caches", {})
+    monkeypatch.setattr(service, "_route_message", all_busy)
+    with pytest.raises(ai_scheduler.ProviderBusy):
+        await service.process_message("@claude two", conversation.id)
+    assert (await ConversationStore(db).recent(conversation.id))["messages"] == []
+
+
+@pytest.mark.asyncio
+async def test_enrichment_pipeline_packs_ideas_per_request_against_fake_provider(engine, sessions, db, conversation, monkeypatch):
+    monkeypatch.setattr(settings, "IDEA_ENRICHMENT_BATCH_SIZE", 8)
+    monkeypatch.setattr(settings, "IDEA_ENRICHMENT_IDEAS_PER_REQUEST", 3)
+    monkeypatch.setattr(circuit_breaker, "_breakers", {})
+    monkeypatch.setattr(ai_scheduler, "_schedulers", {})
+    other = User(username="other", email="other@example.com", hashed_password="x")
+    db.add(other)
+    await db.flush()
+    ideas = [Idea(title=f"Idea number {n}", user_id=conversation.user_id) for n in range(7)]
+    ideas += [Idea(title=f"Other idea {n}", user_id=other.id) for n in range(3)]
+    created = datetime.utcnow() - timedelta(hours=1)
+    for n, idea in enumerate(ideas):  # the batches follow creation order
+        idea.created_at = created + timedelta(seconds=n)
+    db.add_all(ideas)
+    await db.commit()
+    await asyncio.gather(*activity._dispatches)
+    updated_at = {idea.id: idea.updated_at for idea in ideas}
+    assert await enrichment_progress(db) == {"enriched": 0, "pending": 10}
+
+    statements = []
+    event.listen(engine.sync_engine, "before_cursor_execute", lambda *args: statements.append(args[2]))
+    async with serve_fake_providers(first_token_delay=0, chatgpt_token_delay=0) as fake:
+        client = AsyncOpenAI(api_key="fake", base_url=f"{fake.url}/v1")
+        pipeline = IdeaEnrichmentPipeline(sessions, client)
+        monkeypatch.setattr(pipeline.usage, "record", lambda *args, **kwargs: None)
+        progress = await pipeline.run()
+        await client.close()
+
+    # batch 1: 8 oldest ideas -> 7 of one user (3 + 3 + 1) and 1 of the other; batch 2: the last 2
+    assert progress == {"batches": 2, "requests": 5, "enriched": 10, "failed": 0}
+    assert fake.app.state.requests == 5
+    assert sum(statement.startswith("UPDATE ideas") for statement in statements) == 2
+    assert await enrichment_progress(db, conversation.user_id) == {"enriched": 7, "pending": 0}
+
+    fifth = ideas[4].id
+    db.expire_all()
+    stored = await db.get(Idea, fifth)
+    assert stored.ai_enriched and stored.ai_enrichment_data["summary"] == "Idea number 4"
+    assert stored.ai_enrichment_data["keywords"] == ["idea", "number", "4"]
+    assert stored.updated_at == updated_at[stored.id]
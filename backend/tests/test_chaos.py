@@ -0,0 +1,307 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+import fakeredis
+import pytest
+import pytest_asyncio
+from sqlalchemy import event, func, select
+
+from api.v1.endpoints.chaos import get_chaos_history
+from core import cache
+from core.config import settings
+from models.database import ChaosLevel, ChaosMetric, ChaosMetricDaily, ChaosMetricHourly, Idea, Task, TaskStatus, User
+from services import activity
+from services.chaos_batch import BatchChaosEvaluator
+from services.chaos_detection import ChaosDetectionService
+from services.chaos_history import ChaosHistoryService, downsample_raw_metrics
+from services.urgency import UrgencyMatcher
+
+
+@pytest.fixture(autouse=True)
+def database_counts(monkeypatch):
+    # Query-shape tests below exercise the DB aggregate; the Redis counters opt back in
+    monkeypatch.setattr(settings, "CHAOS_COUNTERS_ENABLED", False)
+    monkeypatch.setattr(settings, "CACHE_BACKEND", "memory")
+
+
+@pytest.fixture
+def fake_redis(monkeypatch):
+    client = fakeredis.FakeAsyncRedis(decode_responses=True)
+    monkeypatch.setattr(activity, "get_redis", lambda: client)
+    monkeypatch.setattr(settings, "CHAOS_COUNTERS_ENABLED", True)
+    return client
+
+
+@pytest_asyncio.fixture
+async def user(db):
+    user = User(username="chaos", email="chaos@example.com", hashed_password="x")
+    db.add(user)
+    await db.commit()
+    return user
+
+
+async def explain_statements(engine, run):
+    """Run `run()` and return (sql, plan) for each SELECT it sent against tasks/ideas"""
+    captured = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith("SELECT") and ("tasks" in statement or "ideas" in statement):
+            captured.append((statement, parameters))
+
+    event.listen(engine.sync_engine, "before_cursor_execute", capture)
+    try:
+        await run()
+    finally:
+        event.remove(engine.sync_engine, "before_cursor_execute", capture)
+
+    plans = []
+    async with engine.connect() as conn:
+        for statement, parameters in captured:
+            rows = await conn.exec_driver_sql("EXPLAIN QUERY PLAN " + statement, parameters)
+            plans.append((statement, " | ".join(row[-1] for row in rows)))
+    return plans
+
+
+@pytest.mark.asyncio
+async def test_chaos_window_queries_use_composite_indexes(engine, db, user):
+    db.add_all(
+        [Task(title=f"task {i}", user_id=user.id) for i in range(20)]
+        + [Idea(title=f"idea {i}", user_id=user.id) for i in range(20)]
+    )
+    await db.commit()
+
+    service = ChaosDetectionService(db, user.id)
+    plans = await explain_statements(engine, service.get_current_chaos_level)
+
+    assert plans
+    for statement, plan in plans:
+        # scanning the one-row aggregate subquery is fine, scanning a table is not
+        assert "SCAN tasks" not in plan and "SCAN ideas" not in plan, f"sequential scan for {statement!r}: {plan}"
+        assert "INDEX ix_" in plan and "_user_id_" in plan, plan
+
+
+@pytest.mark.asyncio
+async def test_open_mit_query_uses_partial_index(engine, db, user):
+    db.add_all([
+        Task(title="open mit", user_id=user.id, is_mit=True),
+        Task(title="done mit", user_id=user.id, is_mit=True, status=TaskStatus.DONE),
+    ])
+    await db.commit()
+
+    async def open_mits():
+        await db.scalars(
+            select(Task).where(Task.user_id == user.id, Task.is_mit, Task.status != TaskStatus.DONE).limit(3)
+        )
+
+    [(statement, plan)] = await explain_statements(engine, open_mits)
+    assert "ix_tasks_user_id_open_mits" in plan, plan
+
+
+@pytest.mark.asyncio
+async def test_window_counts_are_one_statement_shared_by_patterns(engine, db, user):
+    db.add_all(
+        [Task(title=f"task {i}", user_id=user.id) for i in range(4)]
+        + [Idea(title=f"idea {i}", user_id=user.id) for i in range(3)]
+    )
+    await db.commit()
+
+    service = ChaosDetectionService(db, user.id)
+
+    async def evaluate():
+        await service._calculate_metrics()
+        assert await service.check_idea_capture_pattern() is not None
+        assert await service.check_task_creation_pattern() is not None
+        await service.check_task_switching_pattern()
+
+    plans = await explain_statements(engine, evaluate)
+    count_statements = [statement for statement, _ in plans if "count" in statement.lower() or "sum(" in statement]
+    assert len(count_statements) == 1
+    assert service._window_counts_result["recent_tasks"] == 4
+    assert service._window_counts_result["recent_ideas"] == 3
+
+
+def test_urgency_matcher_counts_whole_words_in_one_pass():
+    matcher = UrgencyMatcher(["urgent", "need to", "fast", "URGENT"])
+
+    assert matcher.keywords == ("need to", "urgent", "fast")
+    assert matcher.count("URGENT: need to ship fast, urgently, breakfast") == 3
+    assert matcher.count_all(["urgent", None, "", "need to need to"]) == 3
+    assert UrgencyMatcher([]).count("urgent") == 0
+
+
+@pytest.mark.asyncio
+async def test_urgency_is_scored_on_write_and_summed_by_chaos(db, user, monkeypatch):
+    task = Task(title="urgent: need to ship", user_id=user.id)
+    idea = Idea(title="idea", description="asap, must try", user_id=user.id)
+    db.add_all([task, idea])
+    await db.commit()
+    assert (task.urgency_score, idea.urgency_score) == (2, 2)
+
+    task.title = "critical deadline, urgent"
+    idea.title = "calm idea"
+    await db.commit()
+    assert task.urgency_score == 3
+
+    scans = []
+    monkeypatch.setattr(UrgencyMatcher, "count_all", lambda self, texts: scans.append(texts) or 0)
+    task.status = TaskStatus.DOING
+    await db.commit()
+    assert scans == [] and task.urgency_score == 3
+    monkeypatch.undo()
+
+    metrics = await ChaosDetectionService(db, user.id)._calculate_metrics()
+    assert metrics["urgency_keywords"] == 5
+
+
+@pytest.mark.asyncio
+async def test_redis_counters_match_database_aggregate(engine, db, user, fake_redis):
+    db.add_all([Task(title="seed urgent", user_id=user.id), Idea(title="seed", user_id=user.id)])
+    await db.commit()
+
+    # cold start: counters are rebuilt from the database, then answer alone
+    service = ChaosDetectionService(db, user.id)
+    assert await service._window_counts() == await service._aggregate_window_counts()
+    assert await fake_redis.exists(activity.ActivityCounters.key(user.id, "primed"))
+
+    task = Task(title="need to ship", user_id=user.id)
+    db.add_all([task, Idea(title="asap idea", user_id=user.id)])
+    await db.commit()
+    task.title = "must ship, urgent"
+    await db.commit()
+    await asyncio.gather(*activity._dispatches)
+
+    service = ChaosDetectionService(db, user.id)
+    plans = await explain_statements(engine, service._window_counts)
+    counts = service._window_counts_result
+    assert plans == []
+    assert counts == await service._aggregate_window_counts()
+    assert (counts["recent_tasks"], counts["recent_ideas"], counts["task_switches"], counts["task_urgency"]) == (2, 2, 1, 2)
+
+
+@pytest.mark.asyncio
+async def test_chaos_falls_back_to_database_when_redis_is_down(db, user, monkeypatch):
+    monkeypatch.setattr(settings, "CHAOS_COUNTERS_ENABLED", True)
+    monkeypatch.setattr(activity, "get_redis", lambda: fakeredis.FakeAsyncRedis(connected=False))
+    db.add(Idea(title="idea", user_id=user.id))
+    await db.commit()
+
+    counts = await ChaosDetectionService(db, user.id)._window_counts()
+    assert counts["recent_ideas"] == 1
+
+
+@pytest.mark.asyncio
+async def test_chaos_level_is_cached_and_persisted_only_on_change(db, user):
+    async def metric_rows():
+        return await db.scalar(select(func.count()).select_from(ChaosMetric).where(ChaosMetric.user_id == user.id))
+
+    first = await ChaosDetectionService(db, user.id).get_current_chaos_level()
+    second = await ChaosDetectionService(db, user.id).get_current_chaos_level()
+    assert second == first
+    assert await metric_rows() == 1
+
+    # a write invalidates the cached level; an unchanged reading is not re-persisted
+    await activity._dispatch([activity.ActivityEvent(user.id, "ideas_updated", user.id, 0.0)])
+    await ChaosDetectionService(db, user.id).get_current_chaos_level()
+    assert await metric_rows() == 1
+
+    db.add_all([Idea(title=f"idea {i}", user_id=user.id) for i in range(3)])
+    await db.commit()
+    await asyncio.gather(*activity._dispatches)
+    changed = await ChaosDetectionService(db, user.id).get_current_chaos_level()
+    assert changed["metrics"]["capture_velocity"] == 3
+    assert await metric_rows() == 2
+
+
+@pytest.mark.asyncio
+async def test_batch_sweep_matches_per_user_evaluation(db):
+    users = [User(username=f"batch{i}", email=f"batch{i}@example.com", hashed_password="x") for i in range(4)]
+    db.add_all(users)
+    await db.commit()
+    busy, calm, done, _idle = users
+    db.add_all(
+        [Idea(title=f"urgent idea {i}", user_id=busy.id) for i in range(6)]
+        + [Task(title="plan", user_id=calm.id)]
+        + [Task(title="ship", user_id=done.id, completed_at=datetime.utcnow())]
+    )
+    await db.commit()
+
+    levels = await BatchChaosEvaluator(db).evaluate()
+
+    rows = (await db.scalars(select(ChaosMetric))).all()
+    assert len(rows) == 4
+    assert sum(levels.values()) == 4
+    for row in rows:
+        expected = await ChaosDetectionService(db, row.user_id)._calculate_metrics()
+        assert row.capture_velocity == expected["capture_velocity"]
+        assert row.completion_ratio == expected["completion_ratio"]
+        assert row.chaos_level == await ChaosDetectionService(db, row.user_id)._determine_chaos_level(expected)
+
+    # unchanged readings inside the heartbeat are not written again, by the sweep or the per-user path
+    statements = []
+    event.listen(db.bind.sync_engine, "before_cursor_execute", lambda *args: statements.append(args[2]))
+    await BatchChaosEvaluator(db).evaluate()
+    assert not [s for s in statements if s.lstrip().upper().startswith(("INSERT", "UPDATE"))]
+    for user in users:
+        await ChaosDetectionService(db, user.id).get_current_chaos_level()
+    assert await db.scalar(select(func.count()).select_from(ChaosMetric)) == 4
+    assert await db.scalar(select(func.sum(ChaosMetricHourly.samples))) == 4
+
+    # a change is persisted for that user only
+    db.add(Idea(title="another", user_id=calm.id))
+    await db.commit()
+    await BatchChaosEvaluator(db).evaluate()
+    assert await db.scalar(select(func.count()).select_from(ChaosMetric).where(ChaosMetric.user_id == calm.id)) == 2
+    assert await db.scalar(select(func.count()).select_from(ChaosMetric)) == 5
+
+
+@pytest.mark.asyncio
+async def test_redis_set_many_pipelines_in_chunks(monkeypatch):
+    client = fakeredis.FakeAsyncRedis(decode_responses=True)
+    monkeypatch.setattr(cache, "get_redis", lambda: client)
+    monkeypatch.setattr(cache, "SET_MANY_CHUNK", 2)
+    pipelines = []
+    pipeline = client.pipeline
+    monkeypatch.setattr(client, "pipeline", lambda **kwargs: pipelines.append(kwargs) or pipeline(**kwargs))
+
+    store = cache.RedisCache("test")
+    await store.set_many({f"user{i}": {"at": i} for i in range(5)}, 60)
+    assert len(pipelines) == 3
+    assert await store.get("user4") == {"at": 4}
+    assert 0 < await client.pttl("test:user0") <= 60000
+
+
+@pytest.mark.asyncio
+async def test_rollups_are_incremental_and_retention_downsamples_raw_rows(db, user):
+    await ChaosDetectionService(db, user.id).get_current_chaos_level()
+    assert (await db.scalar(select(ChaosMetricHourly.samples))) == 1
+    assert (await db.scalar(select(ChaosMetricDaily.samples))) == 1
+
+    old = datetime.utcnow().replace(minute=5) - timedelta(days=40)
+    db.add_all([
+        ChaosMetric(user_id=user.id, created_at=old, chaos_level=ChaosLevel.FOCUSED, capture_velocity=1, completion_ratio=100),
+        ChaosMetric(user_id=user.id, created_at=old, chaos_level=ChaosLevel.SPINNING, capture_velocity=7, completion_ratio=0),
+    ])
+    await db.commit()
+
+    removed = await downsample_raw_metrics(db)
+    assert removed == {"raw": 2, "hourly": 0}
+    assert await db.scalar(select(func.count()).select_from(ChaosMetric)) == 1
+
+    history = ChaosHistoryService(db, user.id)
+    recent = await history.get_history(history.now - timedelta(hours=1), history.now + timedelta(minutes=1))
+    assert recent["resolution"] == "raw" and len(recent["points"]) == 1
+
+    archived = await history.get_history(old - timedelta(hours=12), old + timedelta(hours=12))
+    assert archived["resolution"] == "hour"
+    [point] = archived["points"]
+    assert point["samples"] == 2
+    assert point["levels"] == {"focused": 1, "scattered": 0, "spinning": 1}
+    assert (point["capture_velocity"], point["completion_ratio"]) == (4, 50)
+
+    season = await history.get_history(history.now - timedelta(days=90), history.now)
+    assert season["resolution"] == "day"
+    assert [p["samples"] for p in season["points"]] == [2, 1]
+
+    # an offset-aware start with the default end
+    aware = await get_chaos_history(user.id, start=datetime.now(timezone.utc) - timedelta(days=90), db=db)
+    assert [p["samples"] for p in aware["points"]] == [2, 1]
@@ -0,0 +1,344 @@
+import asyncio
+import time
+import uuid
+
+import fakeredis
+import httpx
+import pytest
+import pytest_asyncio
+from fastapi import FastAPI
+from sqlalchemy import event, select
+
+from api.v1.endpoints import weather, webhooks
+from benchmarks.fake_providers import serve_fake_providers
+from core import cache, http_clients, single_flight
+from core.config import settings
+from core.database import get_db
+from models.database import User, WhoopRecovery, WhoopSleep, WhoopWebhookEvent
+from services import weather as weather_service
+from services.whoop_ingest import WhoopIngestWorker, enqueue_whoop_webhooks, ingest_backlog
+
+DEDHAM = weather_service.locate(settings.DEFAULT_LATITUDE, settings.DEFAULT_LONGITUDE, settings.DEFAULT_LOCATION)
+
+
+@pytest.fixture
+def memory_cache(monkeypatch):
+    monkeypatch.setattr(settings, "CACHE_BACKEND", "memory")
+    monkeypatch.setattr(cache, "_caches", {})
+
+
+def counting_fetch(delay=0.0, fail=False):
+    calls = []
+
+    async def fetch():
+        calls.append(1)
+        await asyncio.sleep(delay)
+        if fail:
+            raise RuntimeError("upstream down")
+        return {"version": len(calls)}
+    fetch.calls = calls
+    return fetch
+
+
+@pytest.mark.asyncio
+async def test_stale_entries_are_served_while_one_refresh_runs(memory_cache):
+    swr = cache.StaleWhileRevalidate("test", ttl=0.05, stale_ttl=60)
+    fetch = counting_fetch(delay=0.05)
+
+    # cold: concurrent misses share one upstream call
+    assert await asyncio.gather(*(swr.get("key", fetch) for _ in range(5))) == [{"version": 1}] * 5
+    assert len(fetch.calls) == 1
+    assert await swr.get("key", fetch) == {"version": 1}
+
+    await asyncio.sleep(0.06)
+    start = time.perf_counter()
+    stale = await asyncio.gather(*(swr.get("key", fetch) for _ in range(5)))
+    assert stale == [{"version": 1}] * 5
+    assert time.perf_counter() - start < 0.03  # nobody waited on the refresh
+    await asyncio.gather(*swr._refreshes)
+    assert len(fetch.calls) == 2 and swr.refreshes == 1 and swr.stale_hits == 5
+    assert await swr.get("key", fetch) == {"version": 2}
+
+
+@pytest.mark.asyncio
+async def test_failed_refresh_keeps_serving_stale(memory_cache):
+    swr = cache.StaleWhileRevalidate("test", ttl=0.01, stale_ttl=60)
+    assert await swr.get("key", counting_fetch()) == {"version": 1}
+    await asyncio.sleep(0.02)
+
+    assert await swr.get("key", counting_fetch(fail=True)) == {"version": 1}
+    await asyncio.gather(*swr._refreshes)
+    assert swr.refresh_failures == 1
+    assert await swr.get("key", counting_fetch(fail=True)) == {"version": 1}
+
+
+@pytest_asyncio.fixture
+async def weather_api(memory_cache, monkeypatch):
+    monkeypatch.setattr(settings, "OPENWEATHER_API_KEY", "test")
+    monkeypatch.setattr(http_clients, "_clients", {})
+    monkeypatch.setattr(http_clients, "_stats", {})
+
+    def use(fake, ttl=60):
+        monkeypatch.setattr(settings, "OPENWEATHER_BASE_URL", f"{fake.url}/data/3.0")
+        monkeypatch.setattr(weather_service, "weather_cache", cache.StaleWhileRevalidate("weather", ttl, 60))
+        monkeypatch.setattr(weather_service, "weather_demand", weather_service.WeatherDemand())
+    yield use
+    await http_clients.close_http_clients()
+
+
+def current_weather(location):
+    return weather.get_current_weather(location, http_clients.get_http_client("openweather"))
+
+
+def weather_forecast(location):
+    return weather.get_weather_forecast(location, http_clients.get_http_client("openweather"))
+
+
+@pytest.mark.asyncio
+async def test_current_and_forecast_share_one_upstream_call(weather_api):
+    async with serve_fake_providers(weather_delay=0.05, weather_temp=70) as fake:
+        weather_api(fake)
+        # a dashboard load asks for both at once
+        current, forecast = await asyncio.gather(current_weather(DEDHAM), weather_forecast(DEDHAM))
+        assert fake.app.state.requests == 1
+        assert current["temperature"] == 70 and current["description"] == "Clear Sky"
+        assert current["daily_high"] == forecast["daily"][0]["high"] == 76
+        assert len(forecast["hourly"]) == 12 and len(forecast["daily"]) == 7
+
+        assert await weather_forecast(DEDHAM) == forecast
+        assert await current_weather(DEDHAM) == current
+        assert fake.app.state.requests == 1
+
+
+@pytest.mark.asyncio
+async def test_current_weather_latency_stays_flat_at_ttl_boundary(weather_api):
+    async with serve_fake_providers(weather_delay=0.2) as fake:
+        weather_api(fake, ttl=0.05)
+        first = await current_weather(DEDHAM)
+        await asyncio.sleep(0.06)
+        start = time.perf_counter()
+        assert await current_weather(DEDHAM) == first
+        assert time.perf_counter() - start < 0.05
+        await asyncio.gather(*weather_service.weather_cache._refreshes)
+        assert (await current_weather(DEDHAM))["last_updated"] > first["last_updated"]
+        assert fake.app.state.requests == 2
+
+
+@pytest.mark.asyncio
+async def test_nearby_locations_share_a_bucket(weather_api):
+    office = weather_service.locate(42.2560, -71.1690, "Office")  # about 1 km from Dedham
+    boston = weather_service.locate(42.3601, -71.0589, "Boston")
+    assert office.bucket == DEDHAM.bucket != boston.bucket
+
+    async with serve_fake_providers(weather_delay=0) as fake:
+        weather_api(fake)
+        home, work = await current_weather(DEDHAM), await current_weather(office)
+        assert fake.app.state.requests == 1
+        assert (home["location"], work["location"]) == ("Dedham, MA", "Office")
+        assert home["temperature"] == work["temperature"]
+        await current_weather(boston)
+        assert fake.app.state.requests == 2
+
+
+@pytest.mark.asyncio
+async def test_weather_requests_reuse_one_pooled_connection(weather_api):
+    async with serve_fake_providers(weather_delay=0) as fake:
+        weather_api(fake)
+        for latitude in (40.0, 41.0, 42.0, 43.0):  # four cells: four upstream calls
+            await current_weather(weather_service.locate(latitude, -71.0))
+        assert fake.app.state.requests == 4
+
+    [stats] = http_clients.http_client_stats()
+    assert stats["name"] == "openweather"
+    assert (stats["requests"], stats["connections"], stats["tls_handshakes"]) == (4, 1, 0)
+    assert stats["reuse_rate"] == 0.75
+
+
+@pytest.mark.asyncio
+async def test_location_comes_from_coordinates_then_user_then_default(db):
+    traveller = User(username="t", email="t@example.com", hashed_password="x",
+                     latitude=51.5072, longitude=-0.1276, location_name="London")
+    homebody = User(username="h", email="h@example.com", hashed_password="x")
+    db.add_all([traveller, homebody])
+    await db.commit()
+
+    assert await weather_service.resolve_location(db, traveller.id) == weather_service.locate(51.5072, -0.1276, "London")
+    assert await weather_service.resolve_location(db, homebody.id) == DEDHAM
+    assert (await weather_service.resolve_location(db, traveller.id, 40.0, -74.0)).name == "40.00, -74.00"
+    assert await weather_service.resolve_location(db, uuid.uuid4()) is None
+
+
+@pytest.mark.asyncio
+async def test_memory_cache_counts_evictions_of_live_entries():
+    lru = cache.MemoryCache("test", max_entries=2)
+    await lru.set("expired", 0, ttl=0)
+    await lru.set("a", 1, ttl=60)
+    await lru.set("b", 2, ttl=60)  # pushes out the expired entry: not an eviction
+    assert lru.evictions == 0
+    await lru.get("a")
+    await lru.set("c", 3, ttl=60)  # least recently used live entry is b
+    assert lru.evictions == 1
+    assert [await lru.peek(key) for key in ("a", "b", "c")] == [1, None, 3]
+    assert lru.stats()["evictions"] == 1
+
+
+@pytest.mark.asyncio
+async def test_prefetch_warms_most_requested_buckets_before_expiry(weather_api, monkeypatch):
+    monkeypatch.setattr(settings, "WEATHER_PREFETCH_BUCKETS", 2)
+    monkeypatch.setattr(settings, "WEATHER_PREFETCH_LEAD", 0.6)
+    hot, warm, cold = (weather_service.locate(lat, -71.0) for lat in (40.0, 41.0, 42.0))
+    async with serve_fake_providers(weather_delay=0) as fake:
+        weather_api(fake, ttl=1.0)
+        for location in (hot, hot, hot, warm, warm, cold):
+            await current_weather(location)
+        assert fake.app.state.requests == 3
+
+        prefetcher = weather_service.WeatherPrefetcher(weather_service.weather_demand)
+        assert await prefetcher.prefetch() == 0  # all fresh for longer than the lead
+        await asyncio.sleep(0.45)
+        assert await prefetcher.prefetch() == 2
+        assert fake.app.state.requests == 5
+        assert prefetcher.stats()["hot_buckets"] == [hot.bucket, warm.bucket]
+
+        # the refreshed buckets are fresh again; the cold one turns stale and waits for a request
+        await asyncio.sleep(0.6)
+        cache_stats = weather_service.weather_cache.stats()
+        await current_weather(hot)
+        await current_weather(cold)
+        assert weather_service.weather_cache.stale_hits == cache_stats["stale_hits"] + 1
+
+
+@pytest.mark.asyncio
+async def test_workers_sharing_redis_make_one_upstream_call(monkeypatch):
+    redis = fakeredis.FakeAsyncRedis(decode_responses=True)
+    monkeypatch.setattr(settings, "CACHE_BACKEND", "redis")
+    monkeypatch.setattr(cache, "_caches", {})
+    monkeypatch.setattr(cache, "get_redis", lambda: redis)
+    monkeypatch.setattr(single_flight, "get_redis", lambda: redis)
+    fetch = counting_fetch(delay=0.05)
+    # one instance per worker; each has its own in-process single-flight
+    workers = [cache.StaleWhileRevalidate("test", ttl=0.1, stale_ttl=60) for _ in range(3)]
+
+    assert await asyncio.gather(*(worker.get("key", fetch) for worker in workers)) == [{"version": 1}] * 3
+    assert len(fetch.calls) == 1
+
+    await asyncio.sleep(0.11)
+    assert await asyncio.gather(*(worker.get("key", fetch) for worker in workers)) == [{"version": 1}] * 3
+    for worker in workers:
+        await asyncio.gather(*worker._refreshes)
+    assert len(fetch.calls) == 2
+    assert await workers[2].get("key", fetch) == {"version": 2}
+
+
+def recovery(user_id, cycle_id, score):
+    return {"type": "recovery.updated", "user_id": user_id,
+            "data": {"cycle_id": cycle_id, "recovery_score": score, "hrv_rmssd": 55.5, "resting_heart_rate": 52}}
+
+
+@pytest.mark.asyncio
+async def test_whoop_webhook_is_queued_and_answered_with_202(sessions):
+    app = FastAPI()
+    app.include_router(webhooks.router)
+
+    async def session():
+        async with sessions() as db:
+            yield db
+    app.dependency_overrides[get_db] = session
+
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+        response = await client.post("/webhooks/whoop", json=recovery(456, 10, 80))
+        assert response.status_code == 202
+        assert (await client.post("/webhooks/whoop", content=b"[1, 2]")).status_code == 400
+        assert (await client.get("/webhooks/whoop/queue")).json()["queued"] == 1
+
+    async with sessions() as db:
+        [queued] = (await db.execute(select(WhoopWebhookEvent))).scalars().all()
+    assert queued.id == response.json()["event_id"]
+    assert (queued.event_type, queued.processed_at) == ("recovery.updated", None)
+    assert queued.payload["data"]["recovery_score"] == 80
+
+
+@pytest.mark.asyncio
+async def test_ingest_worker_upserts_records_in_batches(sessions, monkeypatch):
+    monkeypatch.setattr(settings, "WHOOP_INGEST_BATCH_SIZE", 2)
+    async with sessions() as db:
+        await enqueue_whoop_webhooks(db, [
+            recovery(456, 10, 61),
+            {"type": "sleep.updated", "user_id": 456, "data": {"sleep_id": "abc", "sleep_duration_ms": 27000000}},
+            recovery(456, 10, 74),  # same cycle, later: wins
+            {"type": "body.updated", "user_id": 456, "data": {}},
+            recovery(789, 10, 90),
+        ])
+
+    statements = []
+    event.listen(sessions.kw["bind"].sync_engine, "before_cursor_execute", lambda *args: statements.append(args[2]))
+    progress = await WhoopIngestWorker(sessions).run()
+    assert progress == {"batches": 3, "events": 5, "upserted": 4, "skipped": 1, "failed": 0}
+    assert sum(statement.startswith("INSERT INTO whoop_recoveries") for statement in statements) == 3
+
+    async with sessions() as db:
+        recoveries = (await db.execute(select(WhoopRecovery).order_by(WhoopRecovery.whoop_user_id))).scalars().all()
+        assert [(r.whoop_user_id, r.record_id, r.recovery_score) for r in recoveries] == [("456", "10", 74), ("789", "10", 90)]
+        assert recoveries[0].hrv_rmssd == 55.5
+        [sleep] = (await db.execute(select(WhoopSleep))).scalars().all()
+        assert (sleep.record_id, sleep.sleep_duration_ms, sleep.sleep_efficiency) == ("abc", 27000000, None)
+        skipped = await db.scalar(select(WhoopWebhookEvent).where(WhoopWebhookEvent.event_type == "body.updated"))
+        assert skipped.processed_at is not None and "No body.updated record" in skipped.last_error
+        assert (await ingest_backlog(db))["queued"] == 0
+
+
+@pytest.mark.asyncio
+async def test_failed_ingest_batches_stay_queued_until_max_attempts(sessions, monkeypatch):
+    monkeypatch.setattr(settings, "WHOOP_INGEST_MAX_ATTEMPTS", 2)
+    async with sessions() as db:
+        await enqueue_whoop_webhooks(db, [recovery(456, 10, 61), recovery(456, 11, 70)])
+
+    worker = WhoopIngestWorker(sessions)
+
+    async def broken(session, records):
+        raise RuntimeError("database went away")
+    monkeypatch.setattr(worker, "_upsert", broken)
+    assert (await worker.run())["failed"] == 2
+    async with sessions() as db:
+        assert (await ingest_backlog(db))["queued"] == 2
+    await worker.run()
+    async with sessions() as db:
+        backlog = await ingest_backlog(db)
+        assert (backlog["queued"], backlog["failed"]) == (0, 2)
+        events = (await db.execute(select(WhoopWebhookEvent))).scalars().all()
+        assert {(e.attempts, e.last_error) for e in events} == {(2, "database went away")}
+        assert (await db.execute(select(WhoopRecovery))).scalars().all() == []
+
+    monkeypatch.delattr(worker, "_upsert")
+    assert (await worker.run())["events"] == 0  # given up on: no longer claimed
+
+
+@pytest.mark.asyncio
+async def test_poison_event_is_isolated_from_the_rest_of_its_batch(sessions, monkeypatch):
+    async with sessions() as db:
+        await enqueue_whoop_webhooks(db, [
+            recovery(456, 10, 61),
+            recovery(456, 11, 70),
+            recovery(456, "poison", 0),
+            recovery(456, 12, 80),
+            recovery(456, "x" * 51, 90),  # longer than the record_id column
+        ])
+
+    worker = WhoopIngestWorker(sessions)
+    upsert = worker._upsert
+
+    async def rejects_poison(session, records):
+        if any(row["record_id"] == "poison" for _, row in records):
+            raise ValueError("value too long")
+        await upsert(session, records)
+    monkeypatch.setattr(worker, "_upsert", rejects_poison)
+
+    progress = await worker.run()
+    assert progress == {"batches": 1, "events": 4, "upserted": 3, "skipped": 1, "failed": 1}
+    async with sessions() as db:
+        recoveries = (await db.execute(select(WhoopRecovery))).scalars().all()
+        assert sorted(r.record_id for r in recoveries) == ["10", "11", "12"]
+        events = (await db.execute(select(WhoopWebhookEvent).order_by(WhoopWebhookEvent.id))).scalars().all()
+        assert [e.attempts for e in events] == [0, 0, 1, 0, 0]
+        assert events[2].processed_at is None and events[2].last_error == "value too long"
+        assert events[4].processed_at is not None and "No recovery.updated record" in events[4].last_error